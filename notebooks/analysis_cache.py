@@ -0,0 +1,442 @@
+"""
+ABACO Analysis Cache
+Content-addressed memoization of ``FinancialAnalyzer`` results
+
+A result is stored under a key hashed from the analysis name, its parameters
+and a fingerprint of the input columns it reads. The fingerprint hashes each
+column's raw buffers with BLAKE2b: the values of numeric columns, codes and
+categories for categoricals, the offsets and bytes of Arrow-backed strings,
+and factorized codes plus uniques for object columns. Any change to the data
+gives a new key and stale results are never served. Keys are also salted with
+``CACHE_FORMAT_VERSION`` and a hash of the ``financial_utils`` source, so
+editing the analyzer retires every entry it computed. Nothing has to be
+invalidated by hand.
+
+Hashing a multi-million-row book costs about as much as analyzing it, so each
+cache remembers, per live frame, the digest of every column together with a
+reference to the column it hashed. A digest is reused only while the frame
+still holds that very buffer. Under Copy-on-Write (always on from pandas 3)
+a buffer that is referenced elsewhere is copied rather than written in place,
+so a changed column always shows up as a new buffer and is hashed again.
+Without Copy-on-Write nothing is memoized.
+
+Lookups go through two tiers. The first is an in-process LRU of pickled
+results; each hit unpickles a fresh copy, so callers may mutate what they get
+back. The second is an on-disk directory shared by every process on the host.
+Disk entries are written to a temporary file and renamed into place, which is
+atomic, so readers never see a partial entry. The directory is trimmed to
+``max_disk_bytes`` by least-recent use (file mtime, touched on every hit)
+under an exclusive ``flock``. ``stats`` reports hits per tier and misses.
+"""
+
+import hashlib
+import inspect
+import json
+import logging
+import os
+import pickle
+import tempfile
+import threading
+import weakref
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from financial_utils import FinancialAnalyzer
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = Path(__file__).parent / ".analysis_cache"
+
+# Bump when the key derivation or the pickled result layout changes
+CACHE_FORMAT_VERSION = 2
+
+# Input columns each cached analysis reads; only these are fingerprinted
+ANALYSIS_COLUMNS = {
+    "calculate_portfolio_metrics": [
+        "account_balance",
+        "credit_limit",
+        "loan_amount",
+        "credit_score",
+        "risk_category",
+        "utilization_ratio",
+        "lifetime_value",
+    ],
+    "risk_analysis": [
+        "risk_category",
+        "utilization_ratio",
+        "debt_to_income",
+        "credit_score",
+        "risk_score",
+    ],
+    "profitability_analysis": [
+        "profit_potential",
+        "lifetime_value",
+        "account_type",
+        "risk_category",
+    ],
+    "analyze_all": [
+        "account_balance",
+        "credit_limit",
+        "loan_amount",
+        "credit_score",
+        "utilization_ratio",
+        "debt_to_income",
+        "risk_score",
+        "profit_potential",
+        "lifetime_value",
+        "risk_category",
+        "account_type",
+    ],
+}
+
+
+def fingerprint(
+    df: pd.DataFrame,
+    columns: Optional[Iterable[str]] = None,
+    memo: Optional[Dict[Any, Tuple[pd.Series, Tuple, bytes]]] = None,
+) -> str:
+    """Content hash of ``columns`` (default: all) including names, dtypes and row count
+
+    ``memo`` belongs to one frame and maps each column to the column object it
+    last hashed, that object's buffer token and the digest; the digest is reused
+    while ``df`` still holds the same buffer.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(str(len(df)).encode())
+    for column in sorted(df.columns if columns is None else columns):
+        series = df[column]
+        token = _buffer_token(series) if memo is not None else None
+        entry = memo.get(column) if token is not None else None
+        if entry is not None and entry[1] == token:
+            column_digest = entry[2]
+        else:
+            column_digest = _column_digest(column, series)
+            if token is not None:
+                # Holding the column keeps its buffer alive and makes pandas copy on write
+                memo[column] = (series, token, column_digest)
+        digest.update(column_digest)
+    return digest.hexdigest()
+
+
+def _buffer_token(series: pd.Series) -> Optional[Tuple]:
+    """Identity of the buffer behind a column, or ``None`` when it cannot be trusted"""
+    if not _copy_on_write():
+        return None
+    if isinstance(series.dtype, np.dtype):
+        values = series.to_numpy()
+        interface = values.__array_interface__
+        return ("ndarray", interface["data"][0], values.shape, values.strides, values.dtype.str)
+    return ("extension", id(series.array), len(series))
+
+
+@lru_cache(maxsize=None)
+def _copy_on_write() -> bool:
+    if int(pd.__version__.split(".")[0]) >= 3:
+        return True
+    return pd.options.mode.copy_on_write is True
+
+
+def _column_digest(column, series: pd.Series) -> bytes:
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"\0{column}\0{series.dtype}\0".encode())
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        digest.update(np.ascontiguousarray(series.cat.codes.to_numpy()).data)
+        digest.update(repr(list(series.cat.categories)).encode())
+    elif hasattr(series.array, "__arrow_array__"):
+        _update_arrow(digest, series)
+    else:
+        values = series.to_numpy()
+        if values.dtype.kind in "biufcmM":
+            digest.update(np.ascontiguousarray(values).view(np.uint8).data)
+        else:
+            # Hashing every row is slow; hash each distinct value once instead
+            codes, uniques = pd.factorize(series, use_na_sentinel=True)
+            digest.update(np.ascontiguousarray(codes).data)
+            hashed = pd.util.hash_pandas_object(pd.Series(uniques), index=False).to_numpy()
+            digest.update(np.ascontiguousarray(hashed).data)
+    return digest.digest()
+
+
+def _update_arrow(digest, series: pd.Series) -> None:
+    """Hash an Arrow-backed column's validity, offsets and value bytes without copying"""
+    import pyarrow as pa
+
+    chunked = series.array.__arrow_array__()
+    if isinstance(chunked, pa.Array):
+        chunked = pa.chunked_array([chunked])
+    digest.update(str(chunked.type).encode())
+    for chunk in chunked.chunks:
+        if chunk.null_count:
+            digest.update(np.asarray(chunk.is_null()).view(np.uint8).data)
+        if pa.types.is_string(chunk.type) or pa.types.is_large_string(chunk.type):
+            width = np.int32 if pa.types.is_string(chunk.type) else np.int64
+            _, offsets, data = chunk.buffers()
+            offsets = np.frombuffer(offsets, dtype=width)
+            offsets = offsets[chunk.offset : chunk.offset + len(chunk) + 1]
+            start, stop = int(offsets[0]), int(offsets[-1])
+            digest.update((offsets - start if start else offsets).data)
+            if data is not None:
+                digest.update(memoryview(data)[start:stop])
+        else:
+            values = chunk.to_numpy(zero_copy_only=False)
+            if values.dtype.kind in "biufcmM":
+                digest.update(np.ascontiguousarray(values).view(np.uint8).data)
+            else:
+                hashed = pd.util.hash_pandas_object(pd.Series(values), index=False).to_numpy()
+                digest.update(np.ascontiguousarray(hashed).data)
+
+
+@lru_cache(maxsize=None)
+def analyzer_version() -> str:
+    """Hash of the module defining ``FinancialAnalyzer``, so edits to it change every key"""
+    try:
+        source = inspect.getsource(inspect.getmodule(FinancialAnalyzer))
+    except (OSError, TypeError):
+        # No source on disk (frozen or compiled-only install); fall back to the format version
+        return ""
+    return hashlib.blake2b(source.encode(), digest_size=8).hexdigest()
+
+
+class AnalysisCache:
+    """Two-tier (in-process LRU, shared disk) memoization keyed by input content"""
+
+    def __init__(
+        self,
+        cache_dir: Optional[Union[str, Path]] = DEFAULT_CACHE_DIR,
+        max_memory_entries: int = 128,
+        max_disk_bytes: int = 512 * 1024 * 1024,
+        version: Optional[str] = None,
+    ):
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else None
+        self.version = analyzer_version() if version is None else version
+        # id(frame) -> per-column fingerprint memo, dropped when the frame is collected
+        self._frame_memos: Dict[int, Dict] = {}
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if self.cache_dir is not None:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def key(
+        self,
+        name: str,
+        df: pd.DataFrame,
+        params: Optional[Dict[str, Any]] = None,
+        columns: Optional[Iterable[str]] = None,
+    ) -> str:
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(f"{CACHE_FORMAT_VERSION}\0{self.version}\0{name}".encode())
+        digest.update(json.dumps(params or {}, sort_keys=True, default=str).encode())
+        digest.update(fingerprint(df, columns, self._frame_memo(df)).encode())
+        return digest.hexdigest()
+
+    def get_or_compute(
+        self,
+        name: str,
+        df: pd.DataFrame,
+        compute: Callable[[], Any],
+        params: Optional[Dict[str, Any]] = None,
+        columns: Optional[Iterable[str]] = None,
+        cacheable: Optional[Callable[[Any], bool]] = None,
+    ) -> Any:
+        """Cached result of ``compute()`` for this analysis, parameters and input.
+
+        Results for which ``cacheable`` returns false (e.g. an error placeholder)
+        are returned but not stored.
+        """
+        key = self.key(name, df, params, columns)
+        payload = self._get_memory(key)
+        if payload is not None:
+            return pickle.loads(payload)
+
+        payload = self._get_disk(key)
+        if payload is not None:
+            self._put_memory(key, payload)
+            return pickle.loads(payload)
+
+        with self._lock:
+            self.misses += 1
+        result = compute()
+        if cacheable is not None and not cacheable(result):
+            return result
+        payload = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+        self._put_memory(key, payload)
+        self._put_disk(key, payload)
+        return result
+
+    def stats(self) -> Dict:
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_evictions": self.evictions,
+            }
+
+    def clear(self) -> None:
+        """Drop every entry in both tiers (statistics are kept)"""
+        with self._lock:
+            self._memory.clear()
+        if self.cache_dir is not None:
+            with self._disk_lock():
+                for path in self.cache_dir.glob("*/*.pkl"):
+                    path.unlink(missing_ok=True)
+
+    def _frame_memo(self, df: pd.DataFrame) -> Optional[Dict]:
+        if not _copy_on_write():
+            return None
+        with self._lock:
+            memo = self._frame_memos.get(id(df))
+            if memo is None:
+                memo = self._frame_memos[id(df)] = {}
+                weakref.finalize(df, self._forget_frame, id(df))
+            return memo
+
+    def _forget_frame(self, frame_id: int) -> None:
+        with self._lock:
+            self._frame_memos.pop(frame_id, None)
+
+    def _get_memory(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            payload = self._memory.get(key)
+            if payload is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+            return payload
+
+    def _put_memory(self, key: str, payload: bytes) -> None:
+        with self._lock:
+            self._memory[key] = payload
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+
+    def _get_disk(self, key: str) -> Optional[bytes]:
+        if self.cache_dir is None:
+            return None
+        path = self._path(key)
+        try:
+            payload = path.read_bytes()
+            os.utime(path)
+        except FileNotFoundError:
+            # Never written, or evicted by another process since
+            return None
+        with self._lock:
+            self.disk_hits += 1
+        return payload
+
+    def _put_disk(self, key: str, payload: bytes) -> None:
+        if self.cache_dir is None or len(payload) > self.max_disk_bytes:
+            return
+        path = self._path(key)
+        try:
+            path.parent.mkdir(exist_ok=True)
+            fd, temp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(payload)
+            os.replace(temp, path)
+            self._evict()
+        except OSError as e:
+            # The disk tier is an optimization; a full or read-only disk must not fail analysis
+            logger.warning(f"⚠️ Could not write analysis cache entry {path.name}: {e}")
+
+    def _evict(self) -> None:
+        """Delete least recently used entries until the directory fits ``max_disk_bytes``"""
+        with self._disk_lock():
+            entries = []
+            for path in self.cache_dir.glob("*/*.pkl"):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+            total = sum(size for _, size, _ in entries)
+            if total <= self.max_disk_bytes:
+                return
+            for _, size, path in sorted(entries, key=lambda entry: entry[0]):
+                path.unlink(missing_ok=True)
+                total -= size
+                with self._lock:
+                    self.evictions += 1
+                if total <= self.max_disk_bytes:
+                    break
+
+    def _disk_lock(self):
+        return _FileLock(self.cache_dir / ".lock")
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.pkl"
+
+
+class _FileLock:
+    """Exclusive inter-process lock on a file (POSIX ``flock``; a no-op without ``fcntl``)
+
+    Eviction tolerates entries vanishing underneath it, so on platforms without
+    ``flock`` concurrent trims can only over-evict, never corrupt an entry.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.path, "a")
+        if fcntl is not None:
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+        self._file.close()
+        self._file = None
+
+
+class CachedAnalyzer:
+    """``FinancialAnalyzer`` methods answered from an ``AnalysisCache`` when possible"""
+
+    def __init__(self, cache: Optional[AnalysisCache] = None):
+        self.cache = cache if cache is not None else AnalysisCache()
+
+    def run(self, analysis: str, df: pd.DataFrame) -> Dict:
+        if analysis not in ANALYSIS_COLUMNS:
+            raise ValueError(f"Unknown cacheable analysis: {analysis}")
+        method = getattr(FinancialAnalyzer, analysis)
+        # calculate_portfolio_metrics logs errors and returns {}; never cache that
+        return self.cache.get_or_compute(
+            analysis, df, lambda: method(df), columns=ANALYSIS_COLUMNS[analysis], cacheable=bool
+        )
+
+    def calculate_portfolio_metrics(self, df: pd.DataFrame) -> Dict:
+        return self.run("calculate_portfolio_metrics", df)
+
+    def risk_analysis(self, df: pd.DataFrame) -> Dict:
+        return self.run("risk_analysis", df)
+
+    def profitability_analysis(self, df: pd.DataFrame) -> Dict:
+        return self.run("profitability_analysis", df)
+
+    def analyze_all(self, df: pd.DataFrame) -> Dict:
+        return self.run("analyze_all", df)
+
+    def analyze_many(self, df: pd.DataFrame, analyses: List[str]) -> Dict[str, Dict]:
+        return {analysis: self.run(analysis, df) for analysis in analyses}
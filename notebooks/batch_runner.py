@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+"""
+ABACO Batch Runner
+Nightly load, analysis and export of many client portfolios on a process pool
+
+Portfolios come from a directory (every CSV, Excel and Parquet file in it) or
+from a manifest. Manifest lines are either a file path or a JSON object:
+``{"name": ..., "path": ...}`` for a client file, or
+``{"name": ..., "customers": N, "seed": S}`` for a generated book. An entry
+missing what its kind needs is rejected with its manifest line number. Each
+portfolio runs in a worker process. Its chunks stream from
+``portfolio_ingest`` (or the generator) straight into ``export_analysis_results``
+and are folded into a ``PortfolioAggregate`` on the way, so a worker never
+holds a whole book in memory.
+
+Every finished portfolio is appended to ``batch_state.jsonl`` in the output
+directory, together with its source signature (size and mtime, or the
+generator settings). A rerun skips portfolios already recorded as done with
+an unchanged source, so a crashed night resumes where it stopped; a record
+torn by the crash is ignored and its portfolio runs again. Afterwards
+``batch_summary.csv`` and ``batch_summary.json`` consolidate every completed
+portfolio, including those finished in earlier runs.
+
+Usage:
+    python batch_runner.py --input-dir portfolios/ --output-dir nightly/ --workers 16
+    python batch_runner.py --manifest nightly.jsonl --output-dir nightly/ --format arrow
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import pandas as pd
+
+from financial_utils import FinancialDataGenerator, export_analysis_results
+from portfolio_aggregates import PortfolioAggregate
+from portfolio_ingest import CSV_SUFFIXES, EXCEL_SUFFIXES, PARQUET_SUFFIXES, iter_portfolio
+
+logger = logging.getLogger(__name__)
+
+STATE_FILE = "batch_state.jsonl"
+SUMMARY_CSV = "batch_summary.csv"
+SUMMARY_JSON = "batch_summary.json"
+
+PORTFOLIO_SUFFIXES = CSV_SUFFIXES | EXCEL_SUFFIXES | PARQUET_SUFFIXES
+
+# portfolio_metrics fields that add up across portfolios
+ADDITIVE_METRICS = [
+    "total_customers",
+    "total_assets",
+    "total_credit_exposure",
+    "total_outstanding_loans",
+    "high_risk_customers",
+    "total_lifetime_value",
+]
+
+
+@dataclass(frozen=True)
+class PortfolioJob:
+    """One portfolio to process: a client file, or a generated book"""
+
+    name: str
+    path: Optional[str] = None
+    customers: Optional[int] = None
+    seed: int = 42
+
+    def signature(self) -> str:
+        """Identifies the input version; a changed file is processed again"""
+        if self.path is None:
+            return f"generated:{self.customers}:{self.seed}"
+        stat = os.stat(self.path)
+        return f"file:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def discover_jobs(
+    input_dir: Optional[Path] = None, manifest: Optional[Path] = None
+) -> List[PortfolioJob]:
+    """Jobs for every portfolio file in ``input_dir`` and every manifest line"""
+    jobs: List[PortfolioJob] = []
+    if input_dir is not None:
+        for path in sorted(Path(input_dir).iterdir()):
+            suffixes = {s.lower() for s in path.suffixes}
+            if path.is_file() and suffixes & PORTFOLIO_SUFFIXES and ".rejects" not in suffixes:
+                jobs.append(PortfolioJob(name=_job_name(path), path=str(path)))
+
+    if manifest is not None:
+        base = Path(manifest).parent
+        lines = Path(manifest).read_text(encoding="utf-8").splitlines()
+        for number, line in enumerate(lines, start=1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            where = f"{manifest}:{number}"
+            try:
+                entry = json.loads(line) if line.startswith("{") else {"path": line}
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Invalid manifest entry at {where}: {e}") from e
+            path, customers = entry.get("path"), entry.get("customers")
+            if path is None and customers is None:
+                raise ValueError(f"Manifest entry at {where} needs a 'path' or 'customers'")
+            if path is None and not entry.get("name"):
+                raise ValueError(f"Generated manifest entry at {where} needs a 'name'")
+            if customers is not None and (
+                isinstance(customers, bool) or not isinstance(customers, int) or customers < 0
+            ):
+                raise ValueError(
+                    f"Manifest entry at {where} has invalid 'customers': {customers!r}"
+                )
+            if path is not None and not Path(path).is_absolute():
+                path = str(base / path)
+            name = entry.get("name") or _job_name(Path(path))
+            jobs.append(
+                PortfolioJob(
+                    name=name,
+                    path=path,
+                    customers=customers,
+                    seed=entry.get("seed", 42),
+                )
+            )
+
+    names = [job.name for job in jobs]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"Portfolio names must be unique, duplicated: {duplicates[:5]}")
+    return jobs
+
+
+def run_batch(
+    jobs: List[PortfolioJob],
+    output_dir: Path,
+    max_workers: Optional[int] = None,
+    file_format: str = "parquet",
+    chunk_rows: int = 250_000,
+    resume: bool = True,
+) -> Dict:
+    """Process ``jobs`` on a process pool and write the consolidated summary"""
+    output_dir = Path(output_dir)
+    (output_dir / "exports").mkdir(parents=True, exist_ok=True)
+    (output_dir / "rejects").mkdir(exist_ok=True)
+    state_path = output_dir / STATE_FILE
+
+    done = _completed(state_path) if resume else {}
+    pending = [
+        job for job in jobs if done.get(job.name, {}).get("signature") != _safe_signature(job)
+    ]
+    logger.info(
+        f"Batch: {len(jobs)} portfolios, {len(jobs) - len(pending)} already done, "
+        f"{len(pending)} to run"
+    )
+
+    max_workers = max(1, min(max_workers or os.cpu_count() or 1, len(pending) or 1))
+    failed = 0
+    started = time.perf_counter()
+    with _open_state(state_path) as state:
+        if max_workers == 1:
+            results = (_run_job(job, str(output_dir), file_format, chunk_rows) for job in pending)
+            failed = _record(results, state)
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers) as pool:
+                futures = [
+                    pool.submit(_run_job, job, str(output_dir), file_format, chunk_rows)
+                    for job in pending
+                ]
+                failed = _record((future.result() for future in as_completed(futures)), state)
+
+    run = {
+        "portfolios_run": len(pending),
+        "portfolios_failed": failed,
+        "portfolios_skipped": len(jobs) - len(pending),
+        "workers": max_workers,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+    return write_summary(output_dir, run)
+
+
+def write_summary(output_dir: Path, run: Optional[Dict] = None) -> Dict:
+    """Consolidate the latest successful record of every portfolio"""
+    output_dir = Path(output_dir)
+    records = list(_completed(output_dir / STATE_FILE).values())
+    rows = [
+        {
+            "portfolio": r["name"],
+            "source": r["source"],
+            "rows_loaded": r["rows_loaded"],
+            "rows_rejected": r["rows_rejected"],
+            "seconds": r["seconds"],
+            "data_path": r["data_path"],
+            "finished_at": r["finished_at"],
+            **r["metrics"]["portfolio_metrics"],
+        }
+        for r in records
+    ]
+    table = pd.DataFrame(rows)
+    table.to_csv(output_dir / SUMMARY_CSV, index=False)
+
+    totals = {
+        metric: float(table[metric].sum()) if len(table) else 0.0 for metric in ADDITIVE_METRICS
+    }
+    customers = totals["total_customers"]
+    summary = {
+        "generated_at": datetime.now().isoformat(),
+        "portfolios": len(rows),
+        "totals": totals,
+        "average_balance": totals["total_assets"] / customers if customers else None,
+        "high_risk_share": totals["high_risk_customers"] / customers if customers else None,
+        "rows_rejected": int(table["rows_rejected"].sum()) if len(table) else 0,
+        "run": run,
+    }
+    (output_dir / SUMMARY_JSON).write_text(json.dumps(summary, indent=2, default=str))
+    return summary
+
+
+def _run_job(job: PortfolioJob, output_dir: str, file_format: str, chunk_rows: int) -> Dict:
+    """Process-pool worker: stream one portfolio through analysis and export"""
+    started = time.perf_counter()
+    record = {"name": job.name, "source": job.path or "generator", "status": "failed"}
+    try:
+        record["signature"] = job.signature()
+        state = PortfolioAggregate()
+        ingest: Dict = {}
+        if job.path is not None:
+            chunks = iter_portfolio(
+                job.path,
+                reject_path=Path(output_dir) / "rejects" / f"{job.name}.rejects.csv",
+                chunk_rows=chunk_rows,
+                max_workers=1,
+                stats=ingest,
+            )
+        else:
+            chunks = FinancialDataGenerator(job.seed).iter_customer_data(
+                job.customers, chunk_size=chunk_rows, compact=True
+            )
+
+        data_path = export_analysis_results(
+            _folded(chunks, state),
+            state.result,
+            job.name,
+            file_format=file_format,
+            output_dir=Path(output_dir) / "exports",
+        )
+        record.update(
+            status="done",
+            rows_loaded=state.count,
+            rows_rejected=ingest.get("rows_rejected", 0),
+            data_path=data_path,
+            metrics=state.result(),
+        )
+    except Exception as e:
+        logger.error(f"❌ Portfolio {job.name} failed: {e}")
+        record["error"] = f"{type(e).__name__}: {e}"
+    record["seconds"] = round(time.perf_counter() - started, 3)
+    record["finished_at"] = datetime.now().isoformat()
+    return record
+
+
+def _folded(
+    chunks: Iterator[pd.DataFrame], state: PortfolioAggregate
+) -> Iterator[pd.DataFrame]:
+    """Chunks for the exporter, each folded into ``state`` on its way through"""
+    for chunk in chunks:
+        state.update(chunk)
+        yield chunk
+
+
+def _record(results, state) -> int:
+    """Append each finished portfolio to the state file as soon as it completes"""
+    failed = 0
+    for record in results:
+        state.write(json.dumps(record, default=str) + "\n")
+        state.flush()
+        os.fsync(state.fileno())
+        if record["status"] == "done":
+            logger.info(
+                f"✅ {record['name']}: {record['rows_loaded']:,} rows in {record['seconds']:.1f}s"
+            )
+        else:
+            failed += 1
+    return failed
+
+
+def _open_state(state_path: Path):
+    """Open the state file for appending, after any torn last line a crash left"""
+    with open(state_path, "a+b") as state:
+        if state.tell():
+            state.seek(-1, os.SEEK_END)
+            if state.read(1) != b"\n":
+                # Terminate the torn line so the next record starts on its own
+                state.write(b"\n")
+    return open(state_path, "a", encoding="utf-8")
+
+
+def _completed(state_path: Path) -> Dict[str, Dict]:
+    """Latest successful record per portfolio name"""
+    done: Dict[str, Dict] = {}
+    if not state_path.exists():
+        return done
+    for line in state_path.read_text(encoding="utf-8").splitlines():
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            # A crash can leave a torn last line; that portfolio simply reruns
+            continue
+        if record.get("status") == "done":
+            done[record["name"]] = record
+    return done
+
+
+def _safe_signature(job: PortfolioJob) -> Optional[str]:
+    try:
+        return job.signature()
+    except OSError:
+        return None
+
+
+def _job_name(path: Path) -> str:
+    name = path.name
+    for suffix in reversed(path.suffixes):
+        name = name[: -len(suffix)]
+    return name
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[2])
+    parser.add_argument("--input-dir", type=Path, help="Directory of portfolio files")
+    parser.add_argument(
+        "--manifest", type=Path, help="Manifest of portfolios (paths or JSON lines)"
+    )
+    parser.add_argument("--output-dir", type=Path, required=True)
+    parser.add_argument("--workers", type=int, help="Worker processes (default: all cores)")
+    parser.add_argument(
+        "--format", choices=["parquet", "arrow", "csv"], default="parquet", help="Export format"
+    )
+    parser.add_argument("--chunk-rows", type=int, default=250_000)
+    parser.add_argument(
+        "--no-resume", action="store_true", help="Rerun portfolios finished in earlier runs"
+    )
+    args = parser.parse_args(argv)
+    if args.input_dir is None and args.manifest is None:
+        parser.error("one of --input-dir or --manifest is required")
+
+    jobs = discover_jobs(args.input_dir, args.manifest)
+    summary = run_batch(
+        jobs,
+        args.output_dir,
+        max_workers=args.workers,
+        file_format=args.format,
+        chunk_rows=args.chunk_rows,
+        resume=not args.no_resume,
+    )
+
+    run = summary["run"]
+    print(
+        f"📦 {summary['portfolios']} portfolios summarized "
+        f"({run['portfolios_run']} run, {run['portfolios_skipped']} skipped, "
+        f"{run['portfolios_failed']} failed) in {run['seconds']:.1f}s"
+    )
+    print(f"   Customers: {summary['totals']['total_customers']:,.0f}")
+    print(f"   Summary: {args.output_dir / SUMMARY_JSON}")
+    return 1 if run["portfolios_failed"] else 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+ABACO Financial Utils Benchmarks
+Throughput and peak-memory benchmarks for FinancialDataGenerator and FinancialAnalyzer
+
+Runs every stage at each requested portfolio size and records rows/sec and
+peak traced memory (from one extra traced run per stage, kept out of the
+timings). Each run is appended to a JSON Lines history file; a run can be
+saved as a baseline and later runs compared against it, flagging stages whose
+throughput dropped by more than a threshold. Everything runs offline on a
+plain Linux box.
+
+Usage:
+    python benchmark_financial_utils.py --sizes 1e3 1e4 1e5 1e6 1e7
+    python benchmark_financial_utils.py --save-baseline baseline.json
+    python benchmark_financial_utils.py --compare baseline.json --threshold 0.15
+"""
+
+import argparse
+import gc
+import json
+import logging
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from financial_utils import FinancialAnalyzer, FinancialDataGenerator, export_analysis_results
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000, 10_000_000]
+DEFAULT_HISTORY = Path(__file__).parent / "benchmarks" / "history.jsonl"
+
+GENERATOR_STAGES = [
+    "_generate_account_balances",
+    "_generate_credit_limits",
+    "_generate_monthly_spending",
+    "_generate_credit_scores",
+    "_generate_risk_categories",
+    "_generate_monthly_income",
+    "_generate_loan_amounts",
+]
+
+ANALYZER_STAGES = [
+    "calculate_portfolio_metrics",
+    "risk_analysis",
+    "profitability_analysis",
+    "analyze_all",
+]
+
+DERIVED_COLUMNS = [
+    "utilization_ratio",
+    "debt_to_income",
+    "risk_score",
+    "profit_potential",
+    "lifetime_value",
+]
+
+
+def measure(stage: str, rows: int, func: Callable[[], object], repeat: int = 1) -> Dict:
+    """Best untraced wall time over ``repeat`` runs, plus peak memory of one traced run.
+
+    Memory comes from ``tracemalloc`` and covers Python and NumPy allocations;
+    buffers from Arrow's own memory pool are not traced.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "stage": stage,
+        "rows": rows,
+        "seconds": best,
+        "rows_per_sec": rows / best if best > 0 else float("inf"),
+        "peak_bytes": peak,
+    }
+
+
+def benchmark_size(n: int, repeat: int, formats: List[str]) -> List[Dict]:
+    """Run every stage once for a portfolio of ``n`` customers"""
+    results = []
+    generator = FinancialDataGenerator(seed=42)
+
+    for stage in GENERATOR_STAGES:
+        draw = getattr(generator, stage)
+        results.append(measure(stage, n, lambda: draw(n), repeat))
+
+    df = generator.generate_customer_data(n)
+    base = df.drop(columns=DERIVED_COLUMNS)
+    results.append(
+        measure(
+            "_calculate_financial_metrics",
+            n,
+            lambda: generator._calculate_financial_metrics(base.copy()),
+            repeat,
+        )
+    )
+
+    for stage in ANALYZER_STAGES:
+        method = getattr(FinancialAnalyzer, stage)
+        results.append(measure(stage, n, lambda: method(df), repeat))
+
+    metrics = FinancialAnalyzer.analyze_all(df)
+    with tempfile.TemporaryDirectory() as output_dir:
+        for file_format in formats:
+            results.append(
+                measure(
+                    f"export_analysis_results[{file_format}]",
+                    n,
+                    lambda: export_analysis_results(
+                        df, metrics, "benchmark", file_format=file_format, output_dir=output_dir
+                    ),
+                    repeat,
+                )
+            )
+    return results
+
+
+def run_benchmarks(sizes: List[int], repeat: int = 3, formats: Optional[List[str]] = None) -> Dict:
+    """Benchmark all stages at every size and return a history record"""
+    formats = formats or _available_formats()
+    results = []
+    for n in sizes:
+        logger.info(f"Benchmarking {n:,} customers")
+        results.extend(benchmark_size(n, repeat, formats))
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git_revision": _git_revision(),
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "machine": platform.machine(),
+            "system": platform.system(),
+        },
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def compare(current: Dict, baseline: Dict, threshold: float = 0.15) -> List[Dict]:
+    """Stages whose rows/sec fell more than ``threshold`` below the baseline"""
+    reference = {(r["stage"], r["rows"]): r for r in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        previous = reference.get((result["stage"], result["rows"]))
+        if previous is None:
+            continue
+        change = result["rows_per_sec"] / previous["rows_per_sec"] - 1
+        if change < -threshold:
+            regressions.append(
+                {
+                    "stage": result["stage"],
+                    "rows": result["rows"],
+                    "baseline_rows_per_sec": previous["rows_per_sec"],
+                    "rows_per_sec": result["rows_per_sec"],
+                    "change": change,
+                }
+            )
+    return regressions
+
+
+def append_history(record: Dict, history_path: Path) -> None:
+    history_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(history_path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record) + "\n")
+
+
+def format_results(record: Dict) -> str:
+    lines = [f"{'stage':<40} {'rows':>12} {'rows/sec':>14} {'peak MB':>10}"]
+    for r in record["results"]:
+        lines.append(
+            f"{r['stage']:<40} {r['rows']:>12,} {r['rows_per_sec']:>14,.0f} "
+            f"{r['peak_bytes'] / 1e6:>10.1f}"
+        )
+    return "\n".join(lines)
+
+
+def _available_formats() -> List[str]:
+    formats = ["csv"]
+    try:
+        import pyarrow  # noqa: F401
+
+        formats += ["parquet", "arrow"]
+    except ImportError:
+        pass
+    return formats
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[2])
+    parser.add_argument(
+        "--sizes",
+        nargs="+",
+        type=lambda value: int(float(value)),
+        default=DEFAULT_SIZES,
+        help="Portfolio sizes to benchmark (e.g. 1e3 1e6)",
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per stage; best time wins")
+    parser.add_argument("--formats", nargs="+", help="Export formats (default: all available)")
+    parser.add_argument("--history", type=Path, default=DEFAULT_HISTORY)
+    parser.add_argument("--save-baseline", type=Path, help="Write this run as a baseline file")
+    parser.add_argument("--compare", type=Path, help="Baseline file to compare against")
+    parser.add_argument(
+        "--threshold", type=float, default=0.15, help="Allowed throughput drop (0.15 = 15%%)"
+    )
+    args = parser.parse_args(argv)
+
+    record = run_benchmarks(args.sizes, args.repeat, args.formats)
+    append_history(record, args.history)
+    print(format_results(record))
+
+    if args.save_baseline:
+        args.save_baseline.write_text(json.dumps(record, indent=2), encoding="utf-8")
+        print(f"\n💾 Baseline saved to {args.save_baseline}")
+
+    if args.compare:
+        baseline = json.loads(args.compare.read_text(encoding="utf-8"))
+        regressions = compare(record, baseline, args.threshold)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+            for r in regressions:
+                print(
+                    f"  {r['stage']} @ {r['rows']:,} rows: "
+                    f"{r['baseline_rows_per_sec']:,.0f} -> {r['rows_per_sec']:,.0f} rows/sec "
+                    f"({r['change']:+.1%})"
+                )
+            return 1
+        print(f"\n✅ No regressions beyond {args.threshold:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
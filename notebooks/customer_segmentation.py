@@ -0,0 +1,245 @@
+"""
+ABACO Customer Segmentation
+Mini-batch k-means segmentation and distance-based anomaly scoring
+
+``CustomerSegmenter`` clusters customers on ``SEGMENT_FEATURES`` (balance,
+utilization, debt-to-income, credit score and income; balance and income on a
+log scale) after standardizing them with running moments. Training is
+mini-batch k-means: each batch is assigned to its nearest centers and every
+center moves toward the batch mean with a per-center learning rate of
+``batch count / total count``, so ``partial_fit`` can keep absorbing new chunks
+(the nightly pipeline feeds it each day's customers) and memory never depends on
+the number of customers seen.
+
+Centers are kept in unscaled feature units, so the standardization can keep
+updating without invalidating them. A customer's anomaly score is its distance
+to the nearest center divided by that cluster's RMS radius. Scores seen during
+training feed a ``QuantileSketch``, which turns a ``contamination`` share into
+a score threshold without storing the scores.
+"""
+
+import logging
+from typing import Iterable, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import instrumented
+from portfolio_aggregates import ColumnMoments, QuantileSketch
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_FEATURES = [
+    "account_balance",
+    "utilization_ratio",
+    "debt_to_income",
+    "credit_score",
+    "monthly_income",
+]
+
+# Heavy-tailed money columns are clustered as log1p(value)
+LOG_FEATURES = {"account_balance", "monthly_income"}
+
+DEFAULT_CONTAMINATION = 0.05
+
+# Rows scored at once when predicting, to bound the distance matrix
+PREDICT_CHUNK_ROWS = 1_000_000
+
+
+class CustomerSegmenter:
+    """Incremental k-means segments with per-cluster anomaly scores"""
+
+    def __init__(
+        self,
+        n_clusters: int = 5,
+        batch_size: int = 4096,
+        features: Sequence[str] = SEGMENT_FEATURES,
+        seed: int = 42,
+        relative_accuracy: float = 0.01,
+    ):
+        self.n_clusters = n_clusters
+        self.batch_size = batch_size
+        self.features = list(features)
+        self.moments = {feature: ColumnMoments() for feature in self.features}
+        self.centers: Optional[np.ndarray] = None  # clusters x features, unscaled
+        self.counts = np.zeros(n_clusters, dtype=np.int64)
+        self.mean_sq_radius = np.zeros(n_clusters)  # mean squared scaled distance
+        self.scores = QuantileSketch(relative_accuracy)
+        self._rng = np.random.default_rng(seed)
+
+    @property
+    def n_seen(self) -> int:
+        return int(self.counts.sum())
+
+    def partial_fit(self, df: pd.DataFrame) -> "CustomerSegmenter":
+        """Update the scaler and centers with one chunk of customers"""
+        return self._partial_fit_values(self._values(df))
+
+    def _partial_fit_values(self, values: np.ndarray) -> "CustomerSegmenter":
+        if len(values) == 0:
+            return self
+        for j, feature in enumerate(self.features):
+            self.moments[feature].update(values[:, j])
+        if self.centers is None:
+            self.centers = self._initial_centers(values)
+
+        mean, scale = self._scaling()
+        centers = (self.centers - mean) / scale
+        for start in range(0, len(values), self.batch_size):
+            batch = (values[start : start + self.batch_size] - mean) / scale
+            distances = _squared_distances(batch, centers)
+            labels = distances.argmin(axis=1)
+            nearest = distances[np.arange(len(batch)), labels]
+
+            radius = self.mean_sq_radius[labels]
+            seen = radius > 0
+            self.scores.update(np.sqrt(nearest[seen] / radius[seen]))
+
+            n = np.bincount(labels, minlength=self.n_clusters)
+            hit = n > 0
+            self.counts += n
+            rate = np.where(hit, n / np.maximum(self.counts, 1), 0.0)
+            sums = np.stack(
+                [
+                    np.bincount(labels, weights=batch[:, j], minlength=self.n_clusters)
+                    for j in range(batch.shape[1])
+                ],
+                axis=1,
+            )
+            batch_means = np.divide(sums, n[:, None], out=centers.copy(), where=hit[:, None])
+            centers += rate[:, None] * (batch_means - centers)
+            batch_radius = np.bincount(labels, weights=nearest, minlength=self.n_clusters)
+            batch_radius = np.divide(batch_radius, n, out=self.mean_sq_radius.copy(), where=hit)
+            self.mean_sq_radius += rate * (batch_radius - self.mean_sq_radius)
+
+        self.centers = centers * scale + mean
+        return self
+
+    @instrumented("segment_fit")
+    def fit(
+        self, data: Union[pd.DataFrame, Iterable[pd.DataFrame]], n_epochs: int = 1
+    ) -> "CustomerSegmenter":
+        """Train on a frame (shuffled, ``n_epochs`` passes) or one pass over chunks"""
+        try:
+            if isinstance(data, pd.DataFrame):
+                # Shuffle the feature matrix, not the frame, so epochs never copy the columns
+                values = self._values(data)
+                for _ in range(n_epochs):
+                    self._partial_fit_values(values[self._rng.permutation(len(values))])
+            else:
+                for chunk in data:
+                    self.partial_fit(chunk)
+            logger.info(
+                f"✅ Segmented {self.n_seen:,} customer rows into {self.n_clusters} clusters"
+            )
+            return self
+
+        except Exception as e:
+            logger.error(f"❌ Error fitting customer segments: {e}")
+            raise
+
+    def predict(self, df: pd.DataFrame) -> np.ndarray:
+        """Nearest segment of every customer"""
+        return self._nearest(df)[0]
+
+    def anomaly_scores(self, df: pd.DataFrame) -> np.ndarray:
+        """Distance to the nearest center in units of that cluster's RMS radius"""
+        return self._scores(*self._nearest(df))
+
+    def threshold(self, contamination: float = DEFAULT_CONTAMINATION) -> float:
+        """Anomaly score exceeded by about ``contamination`` of the training rows"""
+        return self.scores.quantile(1 - contamination)
+
+    def segment(
+        self,
+        df: pd.DataFrame,
+        contamination: float = DEFAULT_CONTAMINATION,
+        threshold: Optional[float] = None,
+    ) -> pd.DataFrame:
+        """``segment``, ``anomaly_score`` and ``is_anomaly`` per customer, on ``df.index``"""
+        labels, nearest = self._nearest(df)
+        scores = self._scores(labels, nearest)
+        threshold = self.threshold(contamination) if threshold is None else threshold
+        return pd.DataFrame(
+            {"segment": labels, "anomaly_score": scores, "is_anomaly": scores > threshold},
+            index=df.index,
+        )
+
+    def profiles(self) -> pd.DataFrame:
+        """Segment centers in original feature units, with sizes and RMS radius"""
+        self._check_fitted()
+        centers = self.centers.copy()
+        for j, feature in enumerate(self.features):
+            if feature in LOG_FEATURES:
+                centers[:, j] = np.expm1(centers[:, j])
+        profile = pd.DataFrame(centers, columns=self.features)
+        profile.insert(0, "customers", self.counts)
+        profile.insert(1, "share", self.counts / max(self.n_seen, 1))
+        profile["rms_radius"] = np.sqrt(self.mean_sq_radius)
+        profile.index.name = "segment"
+        return profile
+
+    def _nearest(self, df: pd.DataFrame):
+        self._check_fitted()
+        values = self._values(df)
+        mean, scale = self._scaling()
+        centers = (self.centers - mean) / scale
+        labels = np.empty(len(values), dtype=np.int16)
+        nearest = np.empty(len(values))
+        for start in range(0, len(values), PREDICT_CHUNK_ROWS):
+            stop = start + PREDICT_CHUNK_ROWS
+            distances = _squared_distances((values[start:stop] - mean) / scale, centers)
+            labels[start:stop] = distances.argmin(axis=1)
+            nearest[start:stop] = distances.min(axis=1)
+        return labels, nearest
+
+    def _scores(self, labels: np.ndarray, nearest: np.ndarray) -> np.ndarray:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.sqrt(nearest / self.mean_sq_radius[labels]).astype(np.float32)
+
+    def _values(self, df: pd.DataFrame) -> np.ndarray:
+        """Feature matrix (rows x features) with log-scaled money columns"""
+        values = np.empty((len(df), len(self.features)))
+        for j, feature in enumerate(self.features):
+            column = df[feature].to_numpy(dtype=np.float64)
+            values[:, j] = np.log1p(np.maximum(column, 0)) if feature in LOG_FEATURES else column
+        return values
+
+    def _scaling(self):
+        mean = np.array([self.moments[f].mean for f in self.features])
+        scale = np.array([self.moments[f].std for f in self.features])
+        scale = np.where(np.isfinite(scale) & (scale > 0), scale, 1.0)
+        return mean, scale
+
+    def _initial_centers(self, values: np.ndarray) -> np.ndarray:
+        """k-means++ seeding on a sample of the first chunk"""
+        if len(values) < self.n_clusters:
+            raise ValueError(
+                f"Need at least {self.n_clusters} customers to seed {self.n_clusters} segments"
+            )
+        sample = values[self._rng.choice(len(values), min(len(values), 10_000), replace=False)]
+        mean, scale = self._scaling()
+        scaled = (sample - mean) / scale
+
+        chosen = [int(self._rng.integers(len(scaled)))]
+        closest = _squared_distances(scaled, scaled[chosen]).ravel()
+        for _ in range(1, self.n_clusters):
+            total = closest.sum()
+            if total > 0:
+                pick = int(self._rng.choice(len(scaled), p=closest / total))
+            else:
+                pick = int(self._rng.integers(len(scaled)))
+            chosen.append(pick)
+            closest = np.minimum(closest, _squared_distances(scaled, scaled[[pick]]).ravel())
+        return sample[chosen].copy()
+
+    def _check_fitted(self) -> None:
+        if self.centers is None:
+            raise ValueError("CustomerSegmenter has not been fitted")
+
+
+def _squared_distances(points: np.ndarray, centers: np.ndarray) -> np.ndarray:
+    """Squared Euclidean distances (rows x centers) via the dot-product expansion"""
+    distances = np.einsum("ij,ij->i", points, points)[:, None] - 2 * points @ centers.T
+    distances += np.einsum("ij,ij->i", centers, centers)[None, :]
+    return np.maximum(distances, 0.0)
@@ -0,0 +1,417 @@
+"""
+ABACO Customer Store
+Memory-mapped columnar customer store with zone-map filtering
+
+A store is a directory holding one raw binary file per column, a
+``manifest.json`` describing dtypes and categories, and ``zonemaps.npz`` with
+per-block statistics: min, max and null count for numeric columns and a bitmap
+of the categories present for categorical ones. Segment queries consult the
+zone maps first, skip blocks that cannot match, count blocks that match in
+full without reading them, and memory-map only the touched columns of the
+remaining blocks. Pruning pays off most on columns that are clustered in
+row order (IDs, ingestion dates, pre-sorted books); on randomly ordered
+columns the block scan is still a cheap sequential read of a single column.
+
+Filters use the same ``(column, op, value)`` tuples as
+``financial_utils.load_analysis_results``; a list of tuples is a conjunction.
+"""
+
+import json
+import logging
+import os
+import shutil
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+ZONE_BLOCK_SIZE = 65_536
+
+# Categorical columns with more distinct values than this get no block bitmap
+MAX_BITMAP_CATEGORIES = 64
+
+MANIFEST_FILE = "manifest.json"
+ZONEMAP_FILE = "zonemaps.npz"
+
+Filter = Tuple[str, str, object]
+
+_COMPARISONS = {
+    "==": np.equal,
+    "=": np.equal,
+    "!=": np.not_equal,
+    "<": np.less,
+    "<=": np.less_equal,
+    ">": np.greater,
+    ">=": np.greater_equal,
+}
+
+
+class CustomerStore:
+    """Read side of an on-disk customer store; build one with ``CustomerStore.build``"""
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        with open(self.path / MANIFEST_FILE, encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        self.n_rows: int = self.manifest["n_rows"]
+        self.block_size: int = self.manifest["block_size"]
+        self.columns: Dict[str, Dict] = self.manifest["columns"]
+        with np.load(self.path / ZONEMAP_FILE) as zones:
+            self.zones = {name: zones[name] for name in zones.files}
+        self._memmaps: Dict[str, np.ndarray] = {}
+
+    @property
+    def n_blocks(self) -> int:
+        return -(-self.n_rows // self.block_size)
+
+    @classmethod
+    def open(cls, path: Union[str, Path]) -> "CustomerStore":
+        return cls(path)
+
+    @classmethod
+    def build(
+        cls,
+        path: Union[str, Path],
+        data: Union[pd.DataFrame, Iterable[pd.DataFrame]],
+        block_size: int = ZONE_BLOCK_SIZE,
+        overwrite: bool = False,
+    ) -> "CustomerStore":
+        """Write a frame or an iterable of chunks (e.g. ``iter_customer_data``) to a store"""
+        try:
+            path = Path(path)
+            if path.exists():
+                if not overwrite:
+                    raise FileExistsError(f"Customer store already exists: {path}")
+                shutil.rmtree(path)
+            (path / "columns").mkdir(parents=True)
+
+            writer = _StoreWriter(path)
+            for chunk in [data] if isinstance(data, pd.DataFrame) else data:
+                writer.append(chunk)
+            writer.finish(block_size)
+
+            logger.info(f"✅ Customer store built at {path} ({writer.n_rows:,} rows)")
+            return cls(path)
+
+        except Exception as e:
+            logger.error(f"❌ Error building customer store: {e}")
+            raise
+
+    def column(self, name: str) -> np.ndarray:
+        """Memory-mapped raw values of one column (category codes for categoricals)"""
+        if name not in self.columns:
+            raise KeyError(f"Unknown column: {name}")
+        if name not in self._memmaps:
+            spec = self.columns[name]
+            if self.n_rows == 0:
+                self._memmaps[name] = np.empty(0, dtype=spec["storage"])
+            else:
+                self._memmaps[name] = np.memmap(
+                    self.path / "columns" / f"{name}.bin",
+                    dtype=spec["storage"],
+                    mode="r",
+                    shape=(self.n_rows,),
+                )
+        return self._memmaps[name]
+
+    def plan(self, filters: Sequence[Filter]) -> Tuple[np.ndarray, np.ndarray]:
+        """Zone-map pass: masks of blocks that fully match and that need a scan"""
+        full = np.ones(self.n_blocks, dtype=bool)
+        possible = np.ones(self.n_blocks, dtype=bool)
+        for column, op, value in filters:
+            block_full, block_possible = self._classify(column, op, value)
+            full &= block_full
+            possible &= block_possible
+        return full & possible, possible & ~full
+
+    def count(self, filters: Sequence[Filter] = ()) -> int:
+        """Number of customers matching all ``filters``"""
+        full, partial = self.plan(filters)
+        total = int(self._block_rows(np.flatnonzero(full)).sum())
+        for start, stop in self._block_ranges(partial):
+            total += int(np.count_nonzero(self._row_mask(filters, start, stop)))
+        return total
+
+    def select(
+        self, filters: Sequence[Filter] = (), columns: Optional[List[str]] = None
+    ) -> pd.DataFrame:
+        """Matching rows, reading only ``columns`` and the filter columns"""
+        columns = list(self.columns) if columns is None else columns
+        full, partial = self.plan(filters)
+        parts = []
+        for start, stop in self._block_ranges(full | partial):
+            mask = self._row_mask(filters, start, stop)
+            if mask.any():
+                rows = start + np.flatnonzero(mask)
+                parts.append(self._frame(columns, rows))
+        if not parts:
+            return self._frame(columns, np.empty(0, dtype=np.int64))
+        return pd.concat(parts, ignore_index=True)
+
+    def sum(self, column: str, filters: Sequence[Filter] = ()) -> float:
+        """Sum of a numeric column over matching customers"""
+        full, partial = self.plan(filters)
+        values = self.column(column)
+        total = 0.0
+        for start, stop in self._block_ranges(full):
+            total += float(np.sum(values[start:stop], dtype=np.float64))
+        for start, stop in self._block_ranges(partial):
+            mask = self._row_mask(filters, start, stop)
+            total += float(np.sum(values[start:stop][mask], dtype=np.float64))
+        return total
+
+    def _classify(self, column: str, op: str, value) -> Tuple[np.ndarray, np.ndarray]:
+        """Per block: does every row match, and can any row match"""
+        spec = self.columns.get(column)
+        if spec is None:
+            raise KeyError(f"Unknown column: {column}")
+
+        no_nulls = self.zones[f"{column}__nulls"] == 0
+        if spec["kind"] == "category":
+            bitmap = self.zones.get(f"{column}__bitmap")
+            if bitmap is None:
+                unknown = np.ones(self.n_blocks, dtype=bool)
+                return ~unknown, unknown
+            wanted = np.uint64(0)
+            for code in self._category_codes(column, op, value):
+                wanted |= np.uint64(1) << np.uint64(code)
+            possible = (bitmap & wanted) != 0
+            full = ((bitmap & ~wanted) == 0) & no_nulls
+            return full, possible
+
+        low = self.zones[f"{column}__min"]
+        high = self.zones[f"{column}__max"]
+        value = self._storage_value(column, value)
+        if op in ("==", "="):
+            possible = (low <= value) & (value <= high)
+            full = (low == value) & (high == value)
+        elif op == "!=":
+            possible = ~((low == value) & (high == value))
+            full = (value < low) | (value > high)
+        elif op == "<":
+            possible, full = low < value, high < value
+        elif op == "<=":
+            possible, full = low <= value, high <= value
+        elif op == ">":
+            possible, full = high > value, low > value
+        elif op == ">=":
+            possible, full = high >= value, low >= value
+        elif op in ("in", "not in"):
+            unknown = np.ones(self.n_blocks, dtype=bool)
+            return ~unknown, unknown
+        else:
+            raise ValueError(f"Unsupported filter operator: {op}")
+        # All-null blocks have NaN bounds and never match
+        return full & no_nulls, possible
+
+    def _row_mask(self, filters: Sequence[Filter], start: int, stop: int) -> np.ndarray:
+        mask = np.ones(stop - start, dtype=bool)
+        for column, op, value in filters:
+            values = self.column(column)[start:stop]
+            if self.columns[column]["kind"] == "category":
+                codes = self._category_codes(column, op, value)
+                mask &= np.isin(values, codes)
+            elif op in ("in", "not in"):
+                hits = np.isin(values, [self._storage_value(column, v) for v in value])
+                mask &= hits if op == "in" else ~hits
+            else:
+                mask &= _COMPARISONS[op](values, self._storage_value(column, value))
+        return mask
+
+    def _category_codes(self, column: str, op: str, value) -> List[int]:
+        """Codes selected by a categorical predicate"""
+        categories = self.columns[column]["categories"]
+        if op in ("==", "="):
+            chosen = {value}
+        elif op == "in":
+            chosen = set(value)
+        elif op == "!=":
+            chosen = set(categories) - {value}
+        elif op == "not in":
+            chosen = set(categories) - set(value)
+        else:
+            raise ValueError(f"Operator {op} is not supported on categorical column {column}")
+        return [code for code, label in enumerate(categories) if label in chosen]
+
+    def _storage_value(self, column: str, value):
+        spec = self.columns[column]
+        if spec["kind"] == "datetime":
+            return pd.Timestamp(value).value
+        if spec["kind"] == "id" and isinstance(value, str):
+            return int(value[len(spec["prefix"]) :])
+        return value
+
+    def _block_rows(self, blocks: np.ndarray) -> np.ndarray:
+        return np.minimum(self.block_size, self.n_rows - blocks * self.block_size)
+
+    def _block_ranges(self, blocks: np.ndarray) -> List[Tuple[int, int]]:
+        """Row ranges of the selected blocks, with adjacent blocks coalesced"""
+        selected = np.flatnonzero(blocks)
+        if len(selected) == 0:
+            return []
+        breaks = np.flatnonzero(np.diff(selected) != 1) + 1
+        ranges = []
+        for run in np.split(selected, breaks):
+            start = int(run[0]) * self.block_size
+            stop = min(int(run[-1] + 1) * self.block_size, self.n_rows)
+            ranges.append((start, stop))
+        return ranges
+
+    def _frame(self, columns: List[str], rows: np.ndarray) -> pd.DataFrame:
+        data = {}
+        for name in columns:
+            spec = self.columns[name]
+            values = np.asarray(self.column(name)[rows])
+            if spec["kind"] == "category":
+                values = pd.Categorical.from_codes(values, categories=spec["categories"])
+            elif spec["kind"] == "datetime":
+                values = values.view("datetime64[ns]")
+            elif spec["kind"] == "id":
+                values = _format_ids(values, spec["prefix"], spec["width"])
+            data[name] = values
+        return pd.DataFrame(data)
+
+
+class _StoreWriter:
+    """Appends chunks to per-column files, then writes manifest and zone maps"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.n_rows = 0
+        self.columns: Dict[str, Dict] = {}
+        self._category_lookup: Dict[str, Dict[str, int]] = {}
+
+    def append(self, chunk: pd.DataFrame) -> None:
+        if not self.columns:
+            self.columns = {name: _column_spec(chunk[name]) for name in chunk.columns}
+        for name, spec in self.columns.items():
+            values = self._encode(name, spec, chunk[name])
+            with open(self.path / "columns" / f"{name}.bin", "ab") as f:
+                f.write(np.ascontiguousarray(values, dtype=spec["storage"]).tobytes())
+        self.n_rows += len(chunk)
+
+    def finish(self, block_size: int) -> None:
+        for name, spec in self.columns.items():
+            if spec["kind"] == "category":
+                spec["categories"] = list(self._category_lookup[name])
+                spec["storage"] = _code_dtype(len(spec["categories"]))
+                self._narrow_codes(name, spec)
+
+        zones = self._zone_maps(block_size)
+        np.savez(self.path / ZONEMAP_FILE, **zones)
+
+        manifest = {"n_rows": self.n_rows, "block_size": block_size, "columns": self.columns}
+        tmp_path = self.path / f"{MANIFEST_FILE}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, self.path / MANIFEST_FILE)
+
+    def _encode(self, name: str, spec: Dict, series: pd.Series) -> np.ndarray:
+        if spec["kind"] == "category":
+            lookup = self._category_lookup.setdefault(name, {})
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                for label in series.cat.categories:
+                    lookup.setdefault(label, len(lookup))
+            codes, labels = pd.factorize(series.astype(object))
+            for label in labels:
+                lookup.setdefault(label, len(lookup))
+            remap = np.array([lookup[label] for label in labels] + [-1], dtype=np.int32)
+            # factorize marks missing values with -1, which indexes the trailing -1
+            return remap[codes]
+        if spec["kind"] == "id":
+            return series.str.slice(len(spec["prefix"])).astype(np.uint64).to_numpy()
+        if spec["kind"] == "datetime":
+            return series.to_numpy(dtype="datetime64[ns]").view(np.int64)
+        return series.to_numpy()
+
+    def _narrow_codes(self, name: str, spec: Dict) -> None:
+        """Rewrite int32 codes collected while streaming in the final code dtype"""
+        column_path = self.path / "columns" / f"{name}.bin"
+        tmp_path = column_path.with_suffix(".tmp")
+        with open(column_path, "rb") as source, open(tmp_path, "wb") as target:
+            while True:
+                codes = np.fromfile(source, dtype=np.int32, count=ZONE_BLOCK_SIZE * 16)
+                if len(codes) == 0:
+                    break
+                target.write(codes.astype(spec["storage"]).tobytes())
+        os.replace(tmp_path, column_path)
+
+    def _zone_maps(self, block_size: int) -> Dict[str, np.ndarray]:
+        """Per-block statistics, computed one block at a time from the column files"""
+        zones: Dict[str, np.ndarray] = {}
+        n_blocks = -(-self.n_rows // block_size)
+        for name, spec in self.columns.items():
+            values = (
+                np.memmap(self.path / "columns" / f"{name}.bin", dtype=spec["storage"], mode="r")
+                if self.n_rows
+                else np.empty(0, dtype=spec["storage"])
+            )
+            nulls = np.zeros(n_blocks, dtype=np.int64)
+
+            if spec["kind"] == "category":
+                with_bitmap = len(spec["categories"]) <= MAX_BITMAP_CATEGORIES
+                bitmap = np.zeros(n_blocks, dtype=np.uint64)
+                for block in range(n_blocks):
+                    codes = np.unique(values[block * block_size : (block + 1) * block_size])
+                    nulls[block] = int(codes[0] < 0) if len(codes) else 0
+                    if with_bitmap:
+                        present = codes[codes >= 0].astype(np.uint64)
+                        bitmap[block] = np.bitwise_or.reduce(np.uint64(1) << present)
+                zones[f"{name}__nulls"] = nulls
+                if with_bitmap:
+                    zones[f"{name}__bitmap"] = bitmap
+                continue
+
+            low = np.empty(n_blocks, dtype=values.dtype)
+            high = np.empty(n_blocks, dtype=values.dtype)
+            for block in range(n_blocks):
+                block_values = values[block * block_size : (block + 1) * block_size]
+                if values.dtype.kind == "f":
+                    nulls[block] = int(np.count_nonzero(np.isnan(block_values)))
+                    low[block] = np.fmin.reduce(block_values)
+                    high[block] = np.fmax.reduce(block_values)
+                else:
+                    low[block] = block_values.min()
+                    high[block] = block_values.max()
+            zones[f"{name}__min"] = low
+            zones[f"{name}__max"] = high
+            zones[f"{name}__nulls"] = nulls
+        return zones
+
+
+def _column_spec(series: pd.Series) -> Dict:
+    """Storage kind and dtype for a column, decided from the first chunk"""
+    dtype = series.dtype
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return {"kind": "datetime", "storage": "int64"}
+    if pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_numeric_dtype(dtype):
+        return {"kind": "numeric", "storage": np.dtype(dtype).str}
+    if not isinstance(dtype, pd.CategoricalDtype):
+        # Unique zero-padded IDs such as "CUST_000123" are stored as integers
+        parts = series.astype(object).str.extract(r"^(\D*)(\d+)$")
+        if len(series) and parts[1].notna().all() and parts[0].nunique() == 1:
+            widths = parts[1].str.len()
+            if series.is_unique and widths.nunique() == 1:
+                return {
+                    "kind": "id",
+                    "storage": "uint64",
+                    "prefix": parts[0].iloc[0],
+                    "width": int(widths.iloc[0]),
+                }
+    # Strings and categoricals are dictionary-encoded; codes start as int32
+    return {"kind": "category", "storage": "int32"}
+
+
+def _format_ids(values: np.ndarray, prefix: str, width: int) -> np.ndarray:
+    return np.char.add(prefix, np.char.zfill(values.astype(str), width)).astype(object)
+
+
+def _code_dtype(n_categories: int) -> str:
+    if n_categories <= np.iinfo(np.int8).max:
+        return "int8"
+    if n_categories <= np.iinfo(np.int16).max:
+        return "int16"
+    return "int32"
@@ -4,63 +4,205 @@ Reusable financial analysis functions and data generators
 """
 
 import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
 import numpy as np
 import pandas as pd
 
+from instrumentation import instrumented
+from portfolio_aggregates import PortfolioAggregate
+
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+ACCOUNT_TYPES = ["Checking", "Savings", "Credit", "Investment", "Business"]
+RISK_CATEGORIES = ["Low", "Medium", "High"]
+EMPLOYMENT_STATUSES = ["Employed", "Self-Employed", "Unemployed", "Retired"]
+
+# Opt-in compact schema: integer IDs, categorical enums, float32 scores and
+# ratios and the smallest integer types that hold each column's range. Money
+# columns stay float64: float32 has only ~7 significant digits and would drop
+# cents on large balances. ``created_at`` and ``last_updated`` are scalars per
+# run and move to ``DataFrame.attrs``.
+COMPACT_DTYPES = {
+    "customer_id": np.uint32,
+    "account_balance": np.float64,
+    "credit_limit": np.float64,
+    "monthly_spending": np.float64,
+    "credit_score": np.int16,
+    "account_type": pd.CategoricalDtype(ACCOUNT_TYPES),
+    "risk_category": pd.CategoricalDtype(RISK_CATEGORIES),
+    "years_with_bank": np.uint8,
+    "monthly_income": np.float64,
+    "loan_amount": np.float64,
+    "payment_history_score": np.float32,
+    "age": np.uint8,
+    "employment_status": pd.CategoricalDtype(EMPLOYMENT_STATUSES),
+    "utilization_ratio": np.float32,
+    "debt_to_income": np.float32,
+    "risk_score": np.float32,
+    "profit_potential": np.float64,
+    "lifetime_value": np.float64,
+}
+
 
 class FinancialDataGenerator:
     """Generate realistic financial datasets for analysis"""
 
+    # Rows are drawn in fixed-size blocks, each from its own seeded stream, so
+    # output for a seed does not depend on how the caller chunks it. Every
+    # generation call (single-shot, streamed or parallel) draws the next
+    # portfolio of the seed's sequence: repeated calls on one generator return
+    # different customers, and the n-th call of any generator with the same
+    # seed returns the same ones.
+    BLOCK_SIZE = 65_536
+
     def __init__(self, seed: int = 42):
         # Use modern numpy.random.Generator instead of deprecated RandomState
         self.rng = np.random.default_rng(seed)
         self.seed = seed
+        self._calls = 0
+
+    @instrumented("generate_customer_data")
+    def generate_customer_data(
+        self, n_customers: int = 1000, as_of: Optional[datetime] = None, compact: bool = False
+    ) -> pd.DataFrame:
+        """Generate comprehensive customer financial data.
 
-    def generate_customer_data(self, n_customers: int = 1000) -> pd.DataFrame:
-        """Generate comprehensive customer financial data"""
+        With ``compact=True`` the frame uses ``COMPACT_DTYPES`` and carries the
+        timestamps in ``df.attrs`` instead of per-row columns.
+        """
         try:
             logger.info(f"Generating financial data for {n_customers:,} customers")
 
-            # Basic customer information
-            customer_data = {
-                "customer_id": [f"CUST_{i:06d}" for i in range(1, n_customers + 1)],
-                "account_balance": self._generate_account_balances(n_customers),
-                "credit_limit": self._generate_credit_limits(n_customers),
-                "monthly_spending": self._generate_monthly_spending(n_customers),
-                "credit_score": self._generate_credit_scores(n_customers),
-                "account_type": self.rng.choice(
-                    ["Checking", "Savings", "Credit", "Investment", "Business"],
-                    n_customers,
-                    p=[0.3, 0.25, 0.2, 0.15, 0.1],
-                ),
-                "risk_category": self._generate_risk_categories(n_customers),
-                "years_with_bank": self.rng.integers(1, 25, n_customers),
-                "monthly_income": self._generate_monthly_income(n_customers),
-                "loan_amount": self._generate_loan_amounts(n_customers),
-                "payment_history_score": self.rng.beta(8, 2, n_customers),
-                "age": self.rng.integers(18, 80, n_customers),
-                "employment_status": self.rng.choice(
-                    ["Employed", "Self-Employed", "Unemployed", "Retired"],
-                    n_customers,
-                    p=[0.6, 0.2, 0.1, 0.1],
-                ),
-            }
+            as_of = as_of or datetime.now()
+            call = self._next_call()
+            blocks = list(self._iter_blocks(n_customers, as_of, compact=compact, call=call))
+            if not blocks:
+                blocks = [self._empty_block(as_of, compact)]
+            df = blocks[0] if len(blocks) == 1 else pd.concat(blocks)
+            if compact:
+                df.attrs.update(created_at=as_of, last_updated=as_of)
+                logger.info(f"Compact frame: {bytes_per_customer(df):.1f} bytes per customer")
+
+            logger.info("✅ Customer data generated successfully")
+            return df
 
-            df = pd.DataFrame(customer_data)
+        except Exception as e:
+            logger.error(f"❌ Error generating customer data: {e}")
+            raise
+
+    def iter_customer_data(
+        self,
+        n_customers: int,
+        chunk_size: int = 100_000,
+        as_of: Optional[datetime] = None,
+        compact: bool = False,
+    ) -> Iterator[pd.DataFrame]:
+        """Stream customer data as DataFrame chunks of ``chunk_size`` rows.
+
+        Rows are drawn block by block, so peak memory is bounded by one chunk
+        plus one block regardless of ``n_customers``. Each chunk keeps its
+        global row positions as index, and ``pd.concat`` of all chunks equals
+        ``generate_customer_data`` for the same seed, call number and ``as_of``.
+        """
+        if chunk_size <= 0:
+            raise ValueError("chunk_size must be positive")
 
-            # Calculate derived financial metrics
-            df = self._calculate_financial_metrics(df)
+        logger.info(
+            f"Streaming financial data for {n_customers:,} customers "
+            f"in chunks of {chunk_size:,}"
+        )
+        # Take the call number now, not when iteration starts
+        blocks = self._iter_blocks(
+            n_customers, as_of or datetime.now(), compact=compact, call=self._next_call()
+        )
+        return self._rechunk(blocks, chunk_size)
+
+    @staticmethod
+    def _rechunk(blocks: Iterator[pd.DataFrame], chunk_size: int) -> Iterator[pd.DataFrame]:
+        """Regroup ``BLOCK_SIZE`` blocks into ``chunk_size`` row chunks"""
+        pending: List[pd.DataFrame] = []
+        pending_rows = 0
 
-            # Add timestamp
-            df["created_at"] = datetime.now()
-            df["last_updated"] = datetime.now()
+        for block in blocks:
+            pending.append(block)
+            pending_rows += len(block)
+
+            while pending_rows >= chunk_size:
+                frame = pending[0] if len(pending) == 1 else pd.concat(pending)
+                yield frame.iloc[:chunk_size]
+                pending = [frame.iloc[chunk_size:]]
+                pending_rows -= chunk_size
+
+        if pending_rows:
+            yield pending[0] if len(pending) == 1 else pd.concat(pending)
+
+    def _next_call(self) -> int:
+        """Number of this generation call on the generator, starting at 0"""
+        call, self._calls = self._calls, self._calls + 1
+        return call
+
+    def _block_rng(self, block_index: int, call: int = 0) -> np.random.Generator:
+        """Independent random stream for one block of rows of the ``call``-th portfolio.
+
+        Block 0 of the first call uses the root seed directly, so portfolios of
+        up to ``BLOCK_SIZE`` customers match the original single-stream output.
+        """
+        if call == 0 and block_index == 0:
+            return np.random.default_rng(self.seed)
+        spawn_key = (block_index,) if call == 0 else (block_index, call)
+        return np.random.default_rng(np.random.SeedSequence(self.seed, spawn_key=spawn_key))
+
+    @instrumented("generate_customer_data_parallel")
+    def generate_customer_data_parallel(
+        self,
+        n_customers: int,
+        n_shards: Optional[int] = None,
+        max_workers: Optional[int] = None,
+        as_of: Optional[datetime] = None,
+        compact: bool = False,
+    ) -> pd.DataFrame:
+        """Generate customer data on a process pool.
+
+        The portfolio is split into ``n_shards`` contiguous runs of blocks.
+        Every block draws from its own spawned seed stream, so shards are
+        independent and merging them in shard order reproduces
+        ``generate_customer_data`` bit for bit, whatever the shard count.
+        """
+        try:
+            max_workers = max_workers or os.cpu_count() or 1
+            n_blocks = -(-n_customers // self.BLOCK_SIZE)
+            n_shards = max(1, min(n_shards or max_workers, n_blocks))
+            as_of = as_of or datetime.now()
+            call = self._next_call()
+
+            logger.info(
+                f"Generating financial data for {n_customers:,} customers "
+                f"in {n_shards} shards on {max_workers} workers"
+            )
+
+            bounds = np.linspace(0, n_blocks, n_shards + 1).astype(int)
+            shards = [
+                (self.seed, n_customers, lo, hi, as_of, compact, call)
+                for lo, hi in zip(bounds, bounds[1:])
+            ]
+
+            if max_workers == 1 or n_shards == 1:
+                frames = [_generate_shard(*shard) for shard in shards]
+            else:
+                with ProcessPoolExecutor(max_workers=max_workers) as pool:
+                    # map() returns results in submission order
+                    frames = list(pool.map(_generate_shard, *zip(*shards)))
+
+            df = frames[0] if len(frames) == 1 else pd.concat(frames)
+            if compact:
+                df.attrs.update(created_at=as_of, last_updated=as_of)
 
             logger.info("✅ Customer data generated successfully")
             return df
@@ -69,41 +211,137 @@ class FinancialDataGenerator:
             logger.error(f"❌ Error generating customer data: {e}")
             raise
 
-    def _generate_account_balances(self, n: int) -> np.ndarray:
+    def _iter_blocks(
+        self,
+        n_customers: int,
+        as_of: datetime,
+        blocks: Optional[range] = None,
+        compact: bool = False,
+        call: int = 0,
+    ) -> Iterator[pd.DataFrame]:
+        """Yield the portfolio (or the given block range) as ``BLOCK_SIZE`` row blocks"""
+        if blocks is None:
+            blocks = range(-(-n_customers // self.BLOCK_SIZE))
+        for block_index in blocks:
+            start = block_index * self.BLOCK_SIZE
+            n = min(self.BLOCK_SIZE, n_customers - start)
+            rng = self._block_rng(block_index, call)
+            yield self._generate_block(rng, start, n, as_of, compact)
+
+    def _empty_block(self, as_of: datetime, compact: bool = False) -> pd.DataFrame:
+        """Zero-row frame with the full (or compact) schema, for empty portfolios"""
+        block = self._generate_block(self._block_rng(0), 0, 0, as_of, compact)
+        if not compact:
+            # An empty ID list would otherwise infer a float column
+            block["customer_id"] = block["customer_id"].astype(str)
+        return block
+
+    @instrumented("generate_block")
+    def _generate_block(
+        self, rng: np.random.Generator, start: int, n: int, as_of: datetime, compact: bool = False
+    ) -> pd.DataFrame:
+        """Draw ``n`` customers starting at global row ``start``"""
+        # Basic customer information
+        customer_data = {
+            "customer_id": (
+                np.arange(start + 1, start + n + 1)
+                if compact
+                else [f"CUST_{i:06d}" for i in range(start + 1, start + n + 1)]
+            ),
+            "account_balance": self._generate_account_balances(n, rng),
+            "credit_limit": self._generate_credit_limits(n, rng),
+            "monthly_spending": self._generate_monthly_spending(n, rng),
+            "credit_score": self._generate_credit_scores(n, rng),
+            "account_type": rng.choice(
+                ACCOUNT_TYPES,
+                n,
+                p=[0.3, 0.25, 0.2, 0.15, 0.1],
+            ),
+            "risk_category": self._generate_risk_categories(n, rng),
+            "years_with_bank": rng.integers(1, 25, n),
+            "monthly_income": self._generate_monthly_income(n, rng),
+            "loan_amount": self._generate_loan_amounts(n, rng),
+            "payment_history_score": rng.beta(8, 2, n),
+            "age": rng.integers(18, 80, n),
+            "employment_status": rng.choice(
+                EMPLOYMENT_STATUSES,
+                n,
+                p=[0.6, 0.2, 0.1, 0.1],
+            ),
+        }
+
+        df = pd.DataFrame(customer_data, index=pd.RangeIndex(start, start + n))
+
+        # Calculate derived financial metrics
+        df = self._calculate_financial_metrics(df)
+
+        if compact:
+            df = df.astype(COMPACT_DTYPES)
+            df.attrs.update(created_at=as_of, last_updated=as_of)
+            return df
+
+        # Add timestamp
+        df["created_at"] = as_of
+        df["last_updated"] = as_of
+        return df
+
+    def _generate_account_balances(
+        self, n: int, rng: Optional[np.random.Generator] = None
+    ) -> np.ndarray:
         """Generate realistic account balances using log-normal distribution"""
-        return np.round(self.rng.lognormal(mean=8, sigma=1.5, size=n), 2)
+        rng = self.rng if rng is None else rng
+        return np.round(rng.lognormal(mean=8, sigma=1.5, size=n), 2)
 
-    def _generate_credit_limits(self, n: int) -> np.ndarray:
+    def _generate_credit_limits(
+        self, n: int, rng: Optional[np.random.Generator] = None
+    ) -> np.ndarray:
         """Generate credit limits based on income tiers"""
-        limits = self.rng.uniform(1000, 50000, n)
+        rng = self.rng if rng is None else rng
+        limits = rng.uniform(1000, 50000, n)
         return np.round(limits, 2)
 
-    def _generate_monthly_spending(self, n: int) -> np.ndarray:
+    def _generate_monthly_spending(
+        self, n: int, rng: Optional[np.random.Generator] = None
+    ) -> np.ndarray:
         """Generate monthly spending patterns"""
-        return np.round(self.rng.gamma(2, 800, n), 2)
+        rng = self.rng if rng is None else rng
+        return np.round(rng.gamma(2, 800, n), 2)
 
-    def _generate_credit_scores(self, n: int) -> np.ndarray:
+    def _generate_credit_scores(
+        self, n: int, rng: Optional[np.random.Generator] = None
+    ) -> np.ndarray:
         """Generate realistic credit score distribution"""
-        scores = self.rng.choice(
+        rng = self.rng if rng is None else rng
+        scores = rng.choice(
             [350, 450, 550, 650, 720, 780, 820],
             n,
             p=[0.05, 0.1, 0.2, 0.3, 0.2, 0.1, 0.05],
         )
         return scores
 
-    def _generate_risk_categories(self, n: int) -> np.ndarray:
+    def _generate_risk_categories(
+        self, n: int, rng: Optional[np.random.Generator] = None
+    ) -> np.ndarray:
         """Generate risk categories with realistic distribution"""
-        return self.rng.choice(["Low", "Medium", "High"], n, p=[0.6, 0.3, 0.1])
+        rng = self.rng if rng is None else rng
+        return rng.choice(RISK_CATEGORIES, n, p=[0.6, 0.3, 0.1])
 
-    def _generate_monthly_income(self, n: int) -> np.ndarray:
+    def _generate_monthly_income(
+        self, n: int, rng: Optional[np.random.Generator] = None
+    ) -> np.ndarray:
         """Generate monthly income with realistic distribution"""
-        return np.round(self.rng.lognormal(mean=9.5, sigma=0.8, size=n), 2)
+        rng = self.rng if rng is None else rng
+        return np.round(rng.lognormal(mean=9.5, sigma=0.8, size=n), 2)
 
-    def _generate_loan_amounts(self, n: int) -> np.ndarray:
+    def _generate_loan_amounts(
+        self, n: int, rng: Optional[np.random.Generator] = None
+    ) -> np.ndarray:
         """Generate loan amounts correlated with income"""
-        amounts = self.rng.exponential(scale=25000, size=n)
+        rng = self.rng if rng is None else rng
+        amounts = rng.exponential(scale=25000, size=n)
         return np.round(np.clip(amounts, 0, 500000), 2)
 
+    @instrumented("calculate_financial_metrics")
     def _calculate_financial_metrics(self, df: pd.DataFrame) -> pd.DataFrame:
         """Calculate derived financial metrics"""
         try:
@@ -145,10 +383,37 @@ class FinancialDataGenerator:
             raise
 
 
+def _generate_shard(
+    seed: int,
+    n_customers: int,
+    first_block: int,
+    last_block: int,
+    as_of: datetime,
+    compact: bool = False,
+    call: int = 0,
+) -> pd.DataFrame:
+    """Process-pool worker: generate blocks ``[first_block, last_block)`` of one call"""
+    generator = FinancialDataGenerator(seed)
+    blocks = list(
+        generator._iter_blocks(n_customers, as_of, range(first_block, last_block), compact, call)
+    )
+    if not blocks:
+        return generator._empty_block(as_of, compact)
+    return blocks[0] if len(blocks) == 1 else pd.concat(blocks)
+
+
+def bytes_per_customer(df: pd.DataFrame) -> float:
+    """Deep in-memory size of a customer frame divided by its row count"""
+    if len(df) == 0:
+        return 0.0
+    return float(df.memory_usage(deep=True, index=False).sum()) / len(df)
+
+
 class FinancialAnalyzer:
     """Advanced financial analysis functions"""
 
     @staticmethod
+    @instrumented("calculate_portfolio_metrics")
     def calculate_portfolio_metrics(df: pd.DataFrame) -> Dict:
         """Calculate comprehensive portfolio metrics"""
         try:
@@ -171,6 +436,7 @@ class FinancialAnalyzer:
             return {}
 
     @staticmethod
+    @instrumented("risk_analysis")
     def risk_analysis(df: pd.DataFrame) -> Dict:
         """Perform comprehensive risk analysis"""
         analysis_metrics = {}
@@ -202,6 +468,7 @@ class FinancialAnalyzer:
         return analysis_metrics
 
     @staticmethod
+    @instrumented("profitability_analysis")
     def profitability_analysis(df: pd.DataFrame) -> Dict:
         """Analyze customer profitability"""
         profitability_metrics = {
@@ -219,34 +486,571 @@ class FinancialAnalyzer:
         }
         return profitability_metrics
 
+    @staticmethod
+    @instrumented("analyze_all")
+    def analyze_all(df: pd.DataFrame) -> Dict:
+        """Portfolio, risk and profitability metrics in one fused pass.
+
+        Each column is pulled out once as a NumPy array and reduced directly:
+        category counts and per-category profit come from ``np.bincount`` over
+        the category codes, the medians and the top-decile lifetime value from
+        ``np.partition`` instead of a sort. No filtered frames are built. The
+        result holds the same dicts as ``calculate_portfolio_metrics``,
+        ``risk_analysis`` and ``profitability_analysis`` and expects complete
+        (non-null) columns, as produced by ``FinancialDataGenerator``.
+        """
+        try:
+            n = len(df)
+            balance = df["account_balance"].to_numpy()
+            credit_score = df["credit_score"].to_numpy()
+            utilization = df["utilization_ratio"].to_numpy()
+            risk_score = df["risk_score"].to_numpy()
+            profit = df["profit_potential"].to_numpy()
+            lifetime_value = df["lifetime_value"].to_numpy()
+
+            risk_codes, risk_labels = _category_codes(df["risk_category"])
+            account_codes, account_labels = _category_codes(df["account_type"])
+
+            risk_counts = np.bincount(risk_codes, minlength=len(risk_labels))
+            profit_by_risk = np.bincount(risk_codes, weights=profit, minlength=len(risk_labels))
+            profit_by_account = np.bincount(
+                account_codes, weights=profit, minlength=len(account_labels)
+            )
+            account_counts = np.bincount(account_codes, minlength=len(account_labels))
+
+            total_balance = _fsum(balance)
+            total_profit = float(profit_by_risk.sum())
+            high_risk = int(risk_counts[risk_labels.index("High")]) if "High" in risk_labels else 0
+
+            top_n = int(n * 0.1)
+            top_lifetime_value = (
+                _fsum(np.partition(lifetime_value, n - top_n)[n - top_n :]) if top_n else 0.0
+            )
+
+            # risk_distribution follows value_counts ordering: most frequent first
+            risk_order = np.argsort(-risk_counts, kind="stable")
+
+            return {
+                "portfolio_metrics": {
+                    "total_customers": n,
+                    "total_assets": total_balance,
+                    "average_balance": total_balance / n if n else float("nan"),
+                    "median_balance": _median(balance),
+                    "total_credit_exposure": _fsum(df["credit_limit"].to_numpy()),
+                    "total_outstanding_loans": _fsum(df["loan_amount"].to_numpy()),
+                    "average_credit_score": _fsum(credit_score) / n if n else float("nan"),
+                    "high_risk_customers": high_risk,
+                    "average_utilization": _fsum(utilization) / n if n else float("nan"),
+                    "total_lifetime_value": _fsum(lifetime_value),
+                },
+                "risk_analysis": {
+                    "risk_distribution": {
+                        risk_labels[i]: risk_counts[i] / n for i in risk_order if risk_counts[i]
+                    },
+                    "high_risk_indicators": {
+                        "high_utilization_count": int(np.count_nonzero(utilization > 0.8)),
+                        "high_debt_income_count": int(
+                            np.count_nonzero(df["debt_to_income"].to_numpy() > 0.4)
+                        ),
+                        "low_credit_score_count": int(np.count_nonzero(credit_score < 600)),
+                    },
+                    "risk_score_stats": {
+                        "mean": _fsum(risk_score) / n if n else float("nan"),
+                        "median": _median(risk_score),
+                        "std": float(risk_score.std(ddof=1, dtype=np.float64))
+                        if n > 1
+                        else float("nan"),
+                        "min": float(risk_score.min()) if n else float("nan"),
+                        "max": float(risk_score.max()) if n else float("nan"),
+                    },
+                },
+                "profitability_analysis": {
+                    "total_profit_potential": total_profit,
+                    "average_profit_per_customer": total_profit / n if n else float("nan"),
+                    "top_10_percent_customers": top_lifetime_value,
+                    "profit_by_account_type": {
+                        label: float(total)
+                        for label, total, count in zip(
+                            account_labels, profit_by_account, account_counts
+                        )
+                        if count
+                    },
+                    "profit_by_risk_category": {
+                        label: float(total)
+                        for label, total, count in zip(risk_labels, profit_by_risk, risk_counts)
+                        if count
+                    },
+                },
+            }
+
+        except Exception as e:
+            logger.error(f"❌ Error running fused portfolio analysis: {e}")
+            raise
+
+    @staticmethod
+    def partial_aggregate(df: pd.DataFrame, relative_accuracy: float = 0.005) -> PortfolioAggregate:
+        """Mergeable metric state for one chunk or shard of a portfolio.
+
+        States from different chunks or worker processes combine with
+        ``PortfolioAggregate.merge``; ``result()`` gives the ``analyze_all``
+        dict shape.
+        """
+        return PortfolioAggregate(relative_accuracy).update(df)
+
+    @staticmethod
+    @instrumented("analyze_chunks")
+    def analyze_chunks(chunks: Iterable[pd.DataFrame], relative_accuracy: float = 0.005) -> Dict:
+        """``analyze_all`` over a chunked portfolio that need not fit in memory.
+
+        Medians and the top-10% lifetime value are sketch estimates within
+        ``relative_accuracy`` of the exact values; everything else is exact.
+        """
+        try:
+            return PortfolioAggregate.from_chunks(chunks, relative_accuracy).result()
+
+        except Exception as e:
+            logger.error(f"❌ Error running chunked portfolio analysis: {e}")
+            raise
+
 
-def export_analysis_results(df: pd.DataFrame, analysis_metrics: Dict, output_filename: str) -> str:
-    """Export analysis results to files"""
+class IncrementalPortfolio:
+    """Portfolio metrics maintained under insert, update and delete batches.
+
+    Only the rows in a batch have their derived columns recomputed, and the
+    ``PortfolioAggregate`` behind the metrics is adjusted by subtracting the
+    old rows and merging the new ones. Inserted rows are appended to a small
+    side list and deleted rows are tombstoned; both are folded into the main
+    book once they exceed ``compaction_ratio`` of it, so the book upkeep is
+    amortised O(batch) as well. The book is indexed by ``customer_id``.
+
+    The portfolio owns its book: the frame passed in is copied, and ``book``
+    hands out a copy, because batches write into the book in place.
+    """
+
+    def __init__(
+        self,
+        df: Optional[pd.DataFrame] = None,
+        relative_accuracy: float = 0.005,
+        compaction_ratio: float = 0.1,
+    ):
+        self._generator = FinancialDataGenerator()
+        self.compaction_ratio = compaction_ratio
+        self.state = PortfolioAggregate(relative_accuracy)
+        self._main = pd.DataFrame()
+        self._appended: List[pd.DataFrame] = []
+        self._appended_rows = 0
+        self._deleted: set = set()
+        self._extremes_stale = False
+        if df is not None:
+            self._main = self._index(df).copy()
+            self.state.update(self._main)
+
+    def __len__(self) -> int:
+        return self.state.count
+
+    @property
+    def book(self) -> pd.DataFrame:
+        """Copy of the current customer rows, indexed by ``customer_id``"""
+        self._compact()
+        return self._main.copy()
+
+    def insert(self, rows: pd.DataFrame) -> None:
+        """Add new customers; ``rows`` need only the generator's base columns"""
+        rows = self._derive(self._index(rows))
+        if rows.index.has_duplicates or self._locate(rows.index).any():
+            raise ValueError("Inserted customer_id values must be new and unique")
+
+        self.state.update(rows)
+        self._appended.append(rows)
+        self._appended_rows += len(rows)
+        self._maybe_compact()
+
+    def update(self, rows: pd.DataFrame) -> None:
+        """Change existing customers; ``rows`` holds ``customer_id`` plus changed columns"""
+        changes = self._index(rows)
+        old = self._lookup(changes.index)
+        changes = changes[changes.columns.intersection(old.columns)]
+        new = old.copy()
+        new.update(changes.astype(old.dtypes[changes.columns]))
+        new = self._derive(new)
+
+        self._retract(old)
+        self.state.update(new)
+        self._store(new, old)
+
+    def delete(self, customer_ids: Iterable) -> None:
+        """Remove customers by ``customer_id``"""
+        ids = pd.Index(customer_ids)
+        old = self._lookup(ids)
+        self._retract(old)
+
+        for frame_number, frame in enumerate(self._appended):
+            positions = _positions(frame, ids)
+            if (positions >= 0).any():
+                self._appended[frame_number] = frame.drop(frame.index[positions[positions >= 0]])
+                self._appended_rows -= int((positions >= 0).sum())
+        self._deleted.update(ids[self._main_positions(ids) >= 0])
+        self._maybe_compact()
+
+    def result(self) -> Dict:
+        """Current metrics in the ``FinancialAnalyzer.analyze_all`` shape"""
+        if self._extremes_stale:
+            self._compact()
+            risk_score = self._main["risk_score"].to_numpy()
+            moments = self.state.moments["risk_score"]
+            if len(risk_score):
+                moments.minimum = float(risk_score.min())
+                moments.maximum = float(risk_score.max())
+            self._extremes_stale = False
+        return self.state.result()
+
+    def _index(self, rows: pd.DataFrame) -> pd.DataFrame:
+        return rows.set_index("customer_id") if "customer_id" in rows.columns else rows
+
+    def _derive(self, rows: pd.DataFrame) -> pd.DataFrame:
+        """Recompute derived columns for just these rows, keeping the book's dtypes"""
+        rows = self._generator._calculate_financial_metrics(rows.copy())
+        if "last_updated" in rows.columns:
+            rows["last_updated"] = datetime.now()
+        if len(self._main.columns):
+            rows = rows.astype(self._main.dtypes[rows.columns.intersection(self._main.columns)])
+        return rows
+
+    def _main_positions(self, ids: pd.Index) -> np.ndarray:
+        """Row positions of live (not tombstoned) ``ids`` in the main book, -1 if absent"""
+        positions = _positions(self._main, ids)
+        if self._deleted:
+            positions[ids.isin(list(self._deleted))] = -1
+        return positions
+
+    def _locate(self, ids: pd.Index) -> np.ndarray:
+        """Mask of ``ids`` currently present in the book"""
+        found = self._main_positions(ids) >= 0
+        for frame in self._appended:
+            found |= _positions(frame, ids) >= 0
+        return found
+
+    def _lookup(self, ids: pd.Index) -> pd.DataFrame:
+        """Current rows for ``ids``, in order; raises ``KeyError`` for unknown IDs"""
+        if ids.has_duplicates:
+            raise ValueError("customer_id values in a batch must be unique")
+        missing = ids[~self._locate(ids)]
+        if len(missing):
+            raise KeyError(f"Unknown customer_id values: {list(missing[:5])}")
+
+        parts = []
+        for frame, positions in self._placements(ids):
+            parts.append(frame.iloc[positions[positions >= 0]])
+        return pd.concat(parts).loc[ids]
+
+    def _store(self, rows: pd.DataFrame, old: pd.DataFrame) -> None:
+        """Write back, in place, only the cells that differ from ``old``.
+
+        Unchanged columns are never touched. This matters for the Arrow-backed
+        string columns, which cannot be modified in place: any write to one
+        rebuilds the whole column.
+        """
+        placements = self._placements(rows.index)
+        for column in rows.columns:
+            differs = rows[column].ne(old[column]).to_numpy(dtype=bool, na_value=True)
+            if not differs.any():
+                continue
+            values = rows[column].to_numpy()
+            for frame, positions in placements:
+                target = differs & (positions >= 0)
+                if target.any():
+                    frame.iloc[positions[target], frame.columns.get_loc(column)] = values[target]
+
+    def _placements(self, ids: pd.Index) -> List[Tuple[pd.DataFrame, np.ndarray]]:
+        """Each book frame with the positions of ``ids`` in it (-1 where absent)"""
+        placements = [(self._main, self._main_positions(ids))]
+        placements += [(frame, _positions(frame, ids)) for frame in self._appended]
+        return placements
+
+    def _retract(self, old: pd.DataFrame) -> None:
+        removed = PortfolioAggregate(self.state.relative_accuracy).update(old)
+        risk = self.state.moments["risk_score"]
+        if len(old) and (
+            removed.moments["risk_score"].minimum <= risk.minimum
+            or removed.moments["risk_score"].maximum >= risk.maximum
+        ):
+            self._extremes_stale = True
+        self.state.subtract(removed)
+
+    def _maybe_compact(self) -> None:
+        pending = self._appended_rows + len(self._deleted)
+        if pending > self.compaction_ratio * max(len(self._main), 1):
+            self._compact()
+
+    def _compact(self) -> None:
+        if not self._appended and not self._deleted:
+            return
+        main = self._main
+        if self._deleted:
+            main = main[~main.index.isin(list(self._deleted))]
+        self._main = pd.concat([main] + self._appended) if len(main.columns) else pd.concat(
+            self._appended
+        )
+        self._appended, self._appended_rows = [], 0
+        self._deleted.clear()
+
+
+def _positions(frame: pd.DataFrame, ids: pd.Index) -> np.ndarray:
+    """Row positions of ``ids`` in a frame's unique index, -1 where absent"""
+    if len(frame) == 0:
+        return np.full(len(ids), -1, dtype=np.intp)
+    return frame.index.get_indexer(ids)
+
+
+def _category_codes(series: pd.Series) -> Tuple[np.ndarray, List[str]]:
+    """Integer codes and sorted labels for a categorical or string column"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.cat.codes.to_numpy(), list(series.cat.categories)
+    codes, labels = pd.factorize(series, sort=True)
+    return codes, list(labels)
+
+
+def _fsum(values: np.ndarray) -> float:
+    """Sum accumulated in float64, so float32 compact columns keep precision"""
+    return float(np.sum(values, dtype=np.float64))
+
+
+def _median(values: np.ndarray) -> float:
+    """Median by partial partition (O(n)) rather than a full sort"""
+    return float(np.median(values)) if len(values) else float("nan")
+
+
+COLUMNAR_FORMATS = {"parquet": "parquet", "arrow": "ipc"}
+
+# Schema metadata key carrying DataFrame.attrs (e.g. compact-frame timestamps)
+ATTRS_METADATA_KEY = b"abaco_attrs"
+
+
+@instrumented("export_analysis_results")
+def export_analysis_results(
+    df: Union[pd.DataFrame, Iterable[pd.DataFrame]],
+    analysis_metrics: Union[Dict, Callable[[], Dict]],
+    output_filename: str,
+    file_format: str = "csv",
+    partition_cols: Optional[List[str]] = None,
+    compression: str = "zstd",
+    output_dir: Optional[Path] = None,
+) -> str:
+    """Export analysis results to files.
+
+    ``file_format`` is ``"csv"`` (the default), ``"parquet"`` or ``"arrow"``
+    (Arrow IPC). ``df`` may be an iterable of chunks, such as
+    ``iter_customer_data``; every format writes them one at a time. With
+    ``partition_cols`` (e.g. ``["risk_category", "account_type"]``) they
+    write a hive-partitioned directory. Files go to ``output_dir``, which
+    defaults to ``EXPORTS_DIR``. ``analysis_metrics`` may be a callable; it is
+    called after the data is written, so metrics accumulated from the
+    streamed chunks can be exported with them.
+    """
     try:
-        from abaco_config import EXPORTS_DIR
+        if output_dir is None:
+            from abaco_config import EXPORTS_DIR
+
+            output_dir = EXPORTS_DIR
+        output_dir = Path(output_dir)
 
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
 
         # Export main dataset
-        csv_path = EXPORTS_DIR / f"{output_filename}_{timestamp}.csv"
-        df.to_csv(csv_path, index=False)
+        if file_format == "csv":
+            data_path = output_dir / f"{output_filename}_{timestamp}.csv"
+            _write_csv([df] if isinstance(df, pd.DataFrame) else df, data_path)
+        elif file_format in COLUMNAR_FORMATS:
+            chunks = [df] if isinstance(df, pd.DataFrame) else df
+            data_path = output_dir / f"{output_filename}_{timestamp}.{file_format}"
+            _write_columnar(chunks, data_path, file_format, partition_cols, compression)
+        else:
+            raise ValueError(f"Unsupported export format: {file_format}")
 
         # Export metrics summary
-        metrics_path = EXPORTS_DIR / f"{output_filename}_metrics_{timestamp}.json"
+        if callable(analysis_metrics):
+            analysis_metrics = analysis_metrics()
+        metrics_path = output_dir / f"{output_filename}_metrics_{timestamp}.json"
         import json
 
         with open(metrics_path, "w", encoding="utf-8") as f:
             json.dump(analysis_metrics, f, indent=2, default=str)
 
-        logger.info(f"✅ Analysis results exported to {EXPORTS_DIR}")
-        return str(csv_path)
+        logger.info(f"✅ Analysis results exported to {output_dir}")
+        return str(data_path)
 
     except Exception as e:
         logger.error(f"❌ Error exporting analysis results: {e}")
         raise
 
 
+def load_analysis_results(
+    path: Union[str, Path],
+    columns: Optional[List[str]] = None,
+    filters=None,
+    memory_map: bool = True,
+) -> pd.DataFrame:
+    """Read a Parquet or Arrow export back into a DataFrame.
+
+    ``columns`` projects the read to those columns only. ``filters`` takes a
+    ``pyarrow.dataset`` expression or a DNF list such as
+    ``[("risk_category", "=", "High")]`` and prunes partitions and row
+    groups. With ``memory_map`` the files are mapped rather than read, so
+    uncompressed Arrow exports load without copying.
+    """
+    dataset = _columnar_dataset(path, memory_map)
+    table = dataset.to_table(columns=columns, filter=_filter_expression(filters))
+    df = table.to_pandas()
+    df.attrs.update(_attrs_from_metadata(dataset.schema.metadata))
+    return df
+
+
+def iter_analysis_results(
+    path: Union[str, Path],
+    columns: Optional[List[str]] = None,
+    filters=None,
+    batch_size: int = 100_000,
+    memory_map: bool = True,
+) -> Iterator[pd.DataFrame]:
+    """Stream a Parquet or Arrow export as DataFrame chunks"""
+    dataset = _columnar_dataset(path, memory_map)
+    attrs = _attrs_from_metadata(dataset.schema.metadata)
+    for batch in dataset.to_batches(
+        columns=columns, filter=_filter_expression(filters), batch_size=batch_size
+    ):
+        if batch.num_rows:
+            df = batch.to_pandas()
+            df.attrs.update(attrs)
+            yield df
+
+
+def _write_csv(chunks: Iterable[pd.DataFrame], data_path: Path) -> None:
+    """Append chunks to one CSV file; only the first writes the header"""
+    with open(data_path, "w", encoding="utf-8", newline="") as f:
+        header = True
+        for chunk in chunks:
+            chunk.to_csv(f, index=False, header=header)
+            header = False
+        if header:
+            pd.DataFrame().to_csv(f, index=False)
+
+
+def _write_columnar(
+    chunks: Iterable[pd.DataFrame],
+    data_path: Path,
+    file_format: str,
+    partition_cols: Optional[List[str]],
+    compression: str,
+) -> None:
+    """Write chunks to one columnar file, or a partitioned directory, one at a time"""
+    import json
+
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+
+    schema = None
+    writer = None
+    try:
+        for chunk_number, chunk in enumerate(chunks):
+            attrs, chunk = chunk.attrs, chunk.copy(deep=False)
+            chunk.attrs = {}
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if schema is None:
+                metadata = dict(table.schema.metadata or {})
+                if attrs:
+                    metadata[ATTRS_METADATA_KEY] = json.dumps(attrs, default=str).encode()
+                schema = table.schema.with_metadata(metadata)
+            table = table.cast(schema)
+
+            if partition_cols:
+                options = _columnar_write_options(file_format, compression)
+                ds.write_dataset(
+                    table,
+                    data_path,
+                    format=COLUMNAR_FORMATS[file_format],
+                    partitioning=partition_cols,
+                    partitioning_flavor="hive",
+                    basename_template=f"chunk-{chunk_number:06d}-{{i}}.{file_format}",
+                    existing_data_behavior="overwrite_or_ignore",
+                    file_options=options,
+                )
+                continue
+
+            if writer is None:
+                if file_format == "parquet":
+                    writer = pq.ParquetWriter(data_path, schema, compression=compression)
+                else:
+                    writer = pa.ipc.new_file(
+                        str(data_path),
+                        schema,
+                        options=pa.ipc.IpcWriteOptions(compression=compression),
+                    )
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def _columnar_write_options(file_format: str, compression: str):
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    if file_format == "parquet":
+        return ds.ParquetFileFormat().make_write_options(compression=compression)
+    return ds.IpcFileFormat().make_write_options(compression=pa.Codec(compression))
+
+
+def _columnar_dataset(path: Union[str, Path], memory_map: bool):
+    """Open an export as a ``pyarrow.dataset``, inferring the format from its suffix"""
+    import pyarrow.dataset as ds
+    import pyarrow.fs as pafs
+
+    path = Path(path)
+    file_format = COLUMNAR_FORMATS.get(path.suffix.lstrip("."))
+    if file_format is None:
+        raise ValueError(f"Not a Parquet or Arrow export: {path}")
+    return ds.dataset(
+        str(path),
+        format=file_format,
+        partitioning="hive",
+        filesystem=pafs.LocalFileSystem(use_mmap=memory_map),
+    )
+
+
+def _attrs_from_metadata(metadata: Optional[Dict[bytes, bytes]]) -> Dict:
+    """Restore ``DataFrame.attrs`` written by ``_write_columnar``"""
+    import json
+
+    if not metadata or ATTRS_METADATA_KEY not in metadata:
+        return {}
+    attrs = json.loads(metadata[ATTRS_METADATA_KEY])
+    for key, value in attrs.items():
+        if isinstance(value, str):
+            try:
+                attrs[key] = datetime.fromisoformat(value)
+            except ValueError:
+                pass
+    return attrs
+
+
+def _filter_expression(filters):
+    if filters is None or not isinstance(filters, list):
+        return filters
+    import pyarrow.parquet as pq
+
+    return pq.filters_to_expression(filters)
+
+
 if __name__ == "__main__":
+    import sys
+
+    # With arguments, run the nightly batch over many portfolios
+    if len(sys.argv) > 1:
+        from batch_runner import main
+
+        sys.exit(main(sys.argv[1:]))
+
     # Example usage
     try:
         generator = FinancialDataGenerator()
@@ -0,0 +1,227 @@
+"""
+ABACO Instrumentation
+Stage-level timing and memory hooks for the financial analysis pipeline
+
+Functions decorated with ``instrumented`` report a ``StageEvent`` (wall time,
+row count, RSS memory delta, parent stage) to every registered hook. With no
+hooks registered the decorator calls straight through, so instrumentation
+costs nothing beyond one empty-list check when disabled.
+
+``MetricsCollector`` is a ready-made hook that aggregates events per stage and
+writes them as Prometheus text (for the node_exporter textfile collector) or
+JSON. Hooks run in the calling process only; stages executed inside process
+pool workers are reported as the enclosing call.
+"""
+
+import contextvars
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Union
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+Hook = Callable[["StageEvent"], None]
+
+_HOOKS: List[Hook] = []
+_current_stage: contextvars.ContextVar = contextvars.ContextVar("abaco_stage", default=None)
+
+
+@dataclass
+class StageEvent:
+    """One completed (or failed) call of an instrumented stage"""
+
+    stage: str
+    seconds: float
+    rows: Optional[int]
+    memory_delta_bytes: int
+    started_at: str
+    parent: Optional[str] = None
+    error: Optional[str] = None
+
+
+def add_hook(hook: Hook) -> Hook:
+    """Register a callback receiving every ``StageEvent``; returns it for convenience"""
+    _HOOKS.append(hook)
+    return hook
+
+
+def remove_hook(hook: Hook) -> None:
+    if hook in _HOOKS:
+        _HOOKS.remove(hook)
+
+
+@contextmanager
+def instrument(*hooks: Hook) -> Iterator[None]:
+    """Enable ``hooks`` for the duration of a ``with`` block"""
+    for hook in hooks:
+        add_hook(hook)
+    try:
+        yield
+    finally:
+        for hook in hooks:
+            remove_hook(hook)
+
+
+def instrumented(stage: str) -> Callable:
+    """Decorator reporting each call of the wrapped function as ``stage``"""
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _HOOKS:
+                return func(*args, **kwargs)
+            return _run_instrumented(stage, func, args, kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def _run_instrumented(stage: str, func: Callable, args: tuple, kwargs: dict):
+    parent = _current_stage.get()
+    token = _current_stage.set(stage)
+    started_at = datetime.now().isoformat(timespec="milliseconds")
+    rss_before = _rss_bytes()
+    start = time.perf_counter()
+    result = None
+    error = None
+    try:
+        result = func(*args, **kwargs)
+        return result
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        _current_stage.reset(token)
+        event = StageEvent(
+            stage=stage,
+            seconds=seconds,
+            rows=_row_count(result, args, kwargs),
+            memory_delta_bytes=_rss_bytes() - rss_before,
+            started_at=started_at,
+            parent=parent,
+            error=error,
+        )
+        for hook in list(_HOOKS):
+            hook(event)
+
+
+def _row_count(result, args: tuple, kwargs: dict) -> Optional[int]:
+    """Rows produced, or else rows consumed by the first DataFrame argument"""
+    if isinstance(result, pd.DataFrame):
+        return len(result)
+    for value in list(args) + list(kwargs.values()):
+        if isinstance(value, pd.DataFrame):
+            return len(value)
+    return None
+
+
+def _rss_bytes() -> int:
+    """Current resident set size; peak RSS off Linux, 0 where neither is available"""
+    try:
+        with open("/proc/self/statm", encoding="ascii") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        if resource is None:
+            return 0
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+@dataclass
+class _StageTotals:
+    calls: int = 0
+    errors: int = 0
+    seconds: float = 0.0
+    max_seconds: float = 0.0
+    rows: int = 0
+    memory_delta_bytes_max: int = 0
+    parents: List[str] = field(default_factory=list)
+
+
+class MetricsCollector:
+    """Hook that aggregates stage events and exports them to a local file"""
+
+    def __init__(self, keep_events: bool = False):
+        self.keep_events = keep_events
+        self.events: List[StageEvent] = []
+        self.stages: Dict[str, _StageTotals] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, event: StageEvent) -> None:
+        with self._lock:
+            totals = self.stages.setdefault(event.stage, _StageTotals())
+            totals.calls += 1
+            totals.errors += event.error is not None
+            totals.seconds += event.seconds
+            totals.max_seconds = max(totals.max_seconds, event.seconds)
+            totals.rows += event.rows or 0
+            totals.memory_delta_bytes_max = max(
+                totals.memory_delta_bytes_max, event.memory_delta_bytes
+            )
+            if event.parent and event.parent not in totals.parents:
+                totals.parents.append(event.parent)
+            if self.keep_events:
+                self.events.append(event)
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            return {
+                "stages": {name: asdict(totals) for name, totals in self.stages.items()},
+                "events": [asdict(event) for event in self.events],
+            }
+
+    def to_prometheus(self, prefix: str = "abaco_stage") -> str:
+        """Prometheus text exposition format, one series per stage"""
+        series = [
+            ("calls_total", "counter", "Number of calls of each pipeline stage", "calls"),
+            ("errors_total", "counter", "Number of failed calls of each stage", "errors"),
+            ("seconds_total", "counter", "Wall time spent in each stage", "seconds"),
+            ("max_seconds", "gauge", "Longest single call of each stage", "max_seconds"),
+            ("rows_total", "counter", "Rows produced or processed by each stage", "rows"),
+            (
+                "memory_delta_bytes_max",
+                "gauge",
+                "Largest RSS growth over one call of each stage",
+                "memory_delta_bytes_max",
+            ),
+        ]
+        lines = []
+        with self._lock:
+            for suffix, metric_type, help_text, attribute in series:
+                name = f"{prefix}_{suffix}"
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for stage, totals in sorted(self.stages.items()):
+                    lines.append(f'{name}{{stage="{stage}"}} {getattr(totals, attribute)}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: Union[str, Path]) -> Path:
+        return _write_atomic(Path(path), self.to_prometheus())
+
+    def write_json(self, path: Union[str, Path]) -> Path:
+        return _write_atomic(Path(path), json.dumps(self.to_dict(), indent=2))
+
+
+def _write_atomic(path: Path, text: str) -> Path:
+    """Write via a temp file and rename, so scrapers never see a partial file"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    tmp_path.write_text(text, encoding="utf-8")
+    os.replace(tmp_path, path)
+    return path
@@ -10,6 +10,7 @@ Requirements:
 import os
 import sys
 from datetime import datetime, timedelta
+from pathlib import Path
 from typing import Optional
 
 import pandas as pd
@@ -19,14 +20,31 @@ import requests
 import streamlit as st
 from supabase import create_client
 
+from ml_data_access import MLDataAccess
+from model_evaluation import evaluate
+from ml_rollups import MLRollups, open_backend
+from model_monitoring import ModelMonitor
+from score_drift import ScoreHistogram, drift_report
+
 # Configuration
 SUPABASE_URL = os.environ.get("SUPABASE_URL") or st.secrets.get("SUPABASE_URL")
 SUPABASE_KEY = os.environ.get("SUPABASE_SERVICE_ROLE_KEY") or st.secrets.get("SUPABASE_SERVICE_ROLE_KEY")
 NEXT_API_URL = os.environ.get("NEXT_API_URL", "http://localhost:3000")
 
+# The mirror keeps the longest window the views can ask for: the 90-day slider
+# plus the day the score-drift baseline is offset by
+MIRROR_RETENTION = timedelta(days=91)
+
+
+@st.cache_resource(show_spinner=False)
+def get_supabase_client():
+    """One client per server process; its HTTP connection pool is shared by all sessions"""
+    return create_client(SUPABASE_URL, SUPABASE_KEY)
+
+
 # Initialize Supabase client
 if SUPABASE_URL and SUPABASE_KEY:
-    supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+    supabase = get_supabase_client()
 else:
     supabase = None
 
@@ -65,80 +83,108 @@ if not supabase:
     st.error("❌ Supabase not configured. Set SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY")
     st.stop()
 
+@st.cache_resource
+def get_data_access() -> MLDataAccess:
+    """One incremental mirror per server process, kept across reruns"""
+    return MLDataAccess(
+        supabase,
+        cache_dir=os.environ.get("ML_DASHBOARD_CACHE_DIR"),
+        retention=MIRROR_RETENTION,
+    )
+
+
+@st.cache_resource
+def get_monitor() -> ModelMonitor:
+    """Sliding-window metrics fed with each new prediction and feedback row"""
+    monitor = ModelMonitor()
+    data_access = get_data_access()
+    data_access.subscribe("predictions", monitor.ingest_predictions)
+    data_access.subscribe("feedback", monitor.ingest_feedback)
+    return monitor
+
+
+@st.cache_resource
+def get_score_histogram() -> ScoreHistogram:
+    """Hourly score histograms per model version, fed with each new prediction row"""
+    histogram = ScoreHistogram()
+    get_data_access().subscribe("predictions", histogram.update)
+    return histogram
+
+
+@st.cache_resource
+def get_rollups() -> MLRollups:
+    """Hourly/daily rollups (SQLite locally, Postgres when ML_ROLLUP_DATABASE_URL is set)"""
+    target = os.environ.get("ML_ROLLUP_DATABASE_URL") or Path(__file__).parent / "ml_rollups.sqlite"
+    rollups = MLRollups(open_backend(target))
+    get_data_access().subscribe("predictions", rollups.fold_predictions)
+    get_data_access().subscribe("feedback", rollups.fold_feedback)
+    return rollups
+
+
 try:
-    # Fetch predictions
-    response = supabase.from_("ml.predictions").select("*").order("created_at", desc=True).limit(1000).execute()
-    predictions_data = response.data
-    
-    # Fetch feedback
-    response = supabase.from_("ml.feedback").select("*").order("created_at", desc=True).execute()
-    feedback_data = response.data
-    
-    # Fetch metrics
-    response = supabase.from_("ml.learning_metrics").select("*").order("created_at", desc=True).limit(100).execute()
-    metrics_data = response.data
-    
-    # Convert to DataFrames
-    predictions_df = pd.DataFrame(predictions_data) if predictions_data else pd.DataFrame()
-    feedback_df = pd.DataFrame(feedback_data) if feedback_data else pd.DataFrame()
-    metrics_df = pd.DataFrame(metrics_data) if metrics_data else pd.DataFrame()
+    monitor = get_monitor()
+    score_histogram = get_score_histogram()
+    rollups = get_rollups()
+
+    # Load all tables concurrently; each is refreshed at most once per refresh
+    # interval across every session, pulling only rows newer than its watermark
+    data = get_data_access().load(
+        window_days=window_days,
+        ttl=refresh_interval,
+        limits={"predictions": 1000, "learning_metrics": 100},
+    )
+
+    predictions_df = data["predictions"]
+    feedback_df = data["feedback"]
+    metrics_df = data["learning_metrics"]
+
+    monitor.advance()
     
 except Exception as e:
     st.error(f"Error fetching data: {str(e)}")
     st.stop()
 
-# Top metrics
+# Top metrics (full history, from the rollup tables)
+totals = rollups.totals()
 col1, col2, col3, col4 = st.columns(4)
 
 with col1:
-    total_predictions = len(predictions_df)
-    st.metric("Total Predictions", total_predictions, delta=None)
+    st.metric("Total Predictions", totals["predictions"], delta=None)
 
 with col2:
-    total_feedback = len(feedback_df)
-    st.metric("Feedback Received", total_feedback, delta=None)
+    st.metric("Feedback Received", totals["feedback"], delta=None)
 
 with col3:
-    if len(feedback_df) > 0:
-        accuracy = (feedback_df["correct"].sum() / len(feedback_df)) * 100
-        st.metric("Overall Accuracy", f"{accuracy:.1f}%", delta=None)
+    if totals["feedback"] > 0:
+        st.metric("Overall Accuracy", f"{totals['accuracy'] * 100:.1f}%", delta=None)
     else:
         st.metric("Overall Accuracy", "—", delta=None)
 
 with col4:
-    if len(feedback_df) > 0:
-        brier_scores = []
-        for _, row in feedback_df.iterrows():
-            pred_id = row.get("prediction_id")
-            if pred_id and not predictions_df.empty:
-                pred = predictions_df[predictions_df["id"] == pred_id]
-                if not pred.empty:
-                    score = float(pred.iloc[0]["score"])
-                    actual = 1.0 if row.get("correct") else 0.0
-                    brier_scores.append((score - actual) ** 2)
-        
-        if brier_scores:
-            avg_brier = sum(brier_scores) / len(brier_scores)
-            st.metric("Avg Brier Score", f"{avg_brier:.3f}", delta=None)
-        else:
-            st.metric("Avg Brier Score", "—", delta=None)
+    if totals["feedback"] > 0:
+        st.metric("Avg Brier Score", f"{totals['brier']:.3f}", delta=None)
     else:
         st.metric("Avg Brier Score", "—", delta=None)
 
+# Join feedback to predictions once; all calibration metrics reuse the join
+evaluation = evaluate(predictions_df, feedback_df)
+
 st.divider()
 
 # Prediction score distribution
 col1, col2 = st.columns(2)
 
 with col1:
-    if not predictions_df.empty:
+    if totals["predictions"] > 0:
         st.subheader("Prediction Score Distribution")
         
-        # Create histogram
+        # Full-history histogram from the rollup score bins
+        score_bins = rollups.score_histogram()
         fig = go.Figure()
-        fig.add_trace(go.Histogram(
-            x=predictions_df["score"],
-            nbinsx=20,
+        fig.add_trace(go.Bar(
+            x=(score_bins["bin_lower"] + score_bins["bin_upper"]) / 2,
+            y=score_bins["count"],
+            width=score_bins["bin_upper"] - score_bins["bin_lower"],
             marker=dict(color="rgba(0, 100, 200, 0.7)"),
             name="Score"
         ))
@@ -151,10 +197,10 @@ with col1:
         st.plotly_chart(fig, use_container_width=True)
 
 with col2:
-    if not predictions_df.empty:
+    if totals["predictions"] > 0:
         st.subheader("Prediction Label Distribution")
         
-        label_counts = predictions_df["label"].value_counts()
+        label_counts = rollups.label_counts()
         colors = {"HIGH": "#d62728", "MEDIUM": "#ff7f0e", "LOW": "#2ca02c"}
         
         fig = go.Figure(data=[
@@ -169,27 +215,65 @@ with col2:
 
 st.divider()
 
+# Score drift: last 24 hours against the preceding metrics window
+now = pd.Timestamp.now(tz="UTC")
+current_window = (now - timedelta(days=1), None)
+baseline_window = (now - timedelta(days=1 + window_days), now - timedelta(days=1))
+drift = drift_report(score_histogram, baseline_window, current_window)
+
+if not drift.empty:
+    st.subheader(f"Score Drift (last 24h vs previous {window_days} days)")
+
+    drifted = drift[drift["drift"]]
+    if not drifted.empty:
+        st.warning(
+            "⚠️ Score distribution drift detected for model version(s): "
+            + ", ".join(f"{row.model_version} ({row.reasons})" for row in drifted.itertuples())
+        )
+    st.dataframe(drift.round(4), use_container_width=True)
+    st.caption("Thresholds: PSI > 0.2, KS > 0.1, JS distance > 0.1, with at least 500 scores per window")
+
+st.divider()
+
+# Sliding-window metrics
+window_metrics = monitor.snapshot()
+st.subheader("Rolling Windows")
+
+# The slider window is summed on demand; registering one per slider value
+# would keep every value ever chosen maintained on the shared monitor
+window_metrics.setdefault(f"{window_days}d", monitor.metrics_over(timedelta(days=window_days)))
+window_names = list(dict.fromkeys(["1d", "7d", "30d", f"{window_days}d"]))
+window_table = pd.DataFrame(
+    [
+        {
+            "window": name,
+            "predictions": window_metrics[name]["predictions"],
+            "feedback": window_metrics[name]["feedback"],
+            "accuracy": window_metrics[name]["accuracy"],
+            "brier": window_metrics[name]["brier"],
+            **{
+                f"share {label}": share
+                for label, share in window_metrics[name]["label_mix"].items()
+            },
+        }
+        for name in window_names
+    ]
+)
+st.dataframe(window_table.round(3), use_container_width=True)
+
 # Accuracy over time
-if not feedback_df.empty and not predictions_df.empty:
+accuracy_history = monitor.history("7d")
+accuracy_history = accuracy_history[accuracy_history["feedback"] > 0]
+if not accuracy_history.empty:
     st.subheader("Accuracy Trend (7-day rolling window)")
     
-    # Create time series
-    feedback_df_copy = feedback_df.copy()
-    feedback_df_copy["created_at"] = pd.to_datetime(feedback_df_copy["created_at"])
-    feedback_df_copy = feedback_df_copy.sort_values("created_at")
-    
-    # Calculate rolling accuracy
-    feedback_df_copy["correct_int"] = feedback_df_copy["correct"].astype(int)
-    feedback_df_copy["rolling_acc"] = feedback_df_copy["correct_int"].rolling(window=7, min_periods=1).mean() * 100
-    
     fig = go.Figure()
     fig.add_trace(go.Scatter(
-        x=feedback_df_copy["created_at"],
-        y=feedback_df_copy["rolling_acc"],
-        mode="lines+markers",
+        x=accuracy_history["timestamp"],
+        y=accuracy_history["accuracy"] * 100,
+        mode="lines",
         name="Accuracy",
-        line=dict(color="rgb(31, 119, 180)", width=2),
-        marker=dict(size=4)
+        line=dict(color="rgb(31, 119, 180)", width=2)
     ))
     fig.update_layout(
         xaxis_title="Date",
@@ -200,8 +284,83 @@ if not feedback_df.empty and not predictions_df.empty:
     )
     st.plotly_chart(fig, use_container_width=True)
 
+# Daily accuracy and Brier score over the full history
+daily = rollups.accuracy_trend("day")
+if not daily.empty:
+    st.subheader("Daily Accuracy and Brier Score (full history)")
+
+    fig = go.Figure()
+    fig.add_trace(go.Bar(
+        x=daily["bucket_start"],
+        y=daily["accuracy"] * 100,
+        name="Accuracy (%)",
+        marker=dict(color="rgba(31, 119, 180, 0.7)"),
+        customdata=daily["feedback"],
+        hovertemplate="%{y:.1f}% of %{customdata} feedback"
+    ))
+    fig.add_trace(go.Scatter(
+        x=daily["bucket_start"],
+        y=daily["brier"],
+        name="Brier Score",
+        yaxis="y2",
+        mode="lines+markers",
+        line=dict(color="rgb(214, 39, 40)", width=2)
+    ))
+    fig.update_layout(
+        xaxis_title="Date",
+        yaxis=dict(title="Accuracy (%)"),
+        yaxis2=dict(title="Brier Score", overlaying="y", side="right"),
+        height=400,
+        template="plotly_white",
+        hovermode="x unified"
+    )
+    st.plotly_chart(fig, use_container_width=True)
+
 st.divider()
 
+# Calibration
+if evaluation["n_matched"] > 0:
+    st.subheader("Calibration")
+
+    col1, col2 = st.columns(2)
+
+    with col1:
+        reliability = evaluation["reliability"]
+        reliability = reliability[reliability["count"] > 0]
+
+        fig = go.Figure()
+        fig.add_trace(go.Scatter(
+            x=[0, 1],
+            y=[0, 1],
+            mode="lines",
+            name="Perfect calibration",
+            line=dict(color="#999", dash="dash")
+        ))
+        fig.add_trace(go.Scatter(
+            x=reliability["mean_score"],
+            y=reliability["observed_rate"],
+            mode="lines+markers",
+            name="Observed",
+            text=reliability["count"],
+            line=dict(color="rgb(31, 119, 180)", width=2)
+        ))
+        fig.update_layout(
+            title="Reliability Curve",
+            xaxis_title="Mean predicted score",
+            yaxis_title="Observed rate",
+            height=350,
+            template="plotly_white"
+        )
+        st.plotly_chart(fig, use_container_width=True)
+
+    with col2:
+        st.markdown("**By model version**")
+        st.dataframe(evaluation["by_model_version"].round(3), use_container_width=True)
+        st.markdown("**Accuracy by label**")
+        st.dataframe(evaluation["by_label"].round(3), use_container_width=True)
+
+    st.divider()
+
 # Recent predictions table
 st.subheader("Recent Predictions")
 
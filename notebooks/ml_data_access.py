@@ -0,0 +1,493 @@
+"""
+ABACO ML Data Access
+Incremental, watermark-based fetching of ML tables with a local cache
+
+Each table keeps the rows it has already seen and, on ``refresh``, asks
+Supabase only for rows at or after its ``created_at`` watermark, page by page
+and with just the columns the dashboard views use. A short lookback overlap
+catches rows committed slightly out of timestamp order; rows fetched twice are
+dropped by ``id``. Rows are append-only here: later edits to an already
+cached row are not picked up.
+
+The mirror holds only a retention horizon: with ``retention`` the first
+fetch starts that far back instead of at the beginning of the table, and
+rows that age past it are dropped, as are rows beyond ``max_rows``. The
+cached frame is kept sorted newest first; each refresh sorts only its new
+rows and the overlap they land in, so a tick costs O(new rows + lookback)
+rather than a re-sort of everything seen.
+
+``MLDataAccess.load`` serves many concurrent sessions from one mirror: the
+tables refresh in parallel on a thread pool, at most once per TTL, and the
+windowed frames are kept in a ``TTLCache`` keyed by query and window.
+
+``InMemorySupabaseClient`` implements the subset of the supabase-py query
+builder used here, so the layer can be exercised without a database.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple, Union
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class TableSpec:
+    """A table to mirror locally and the columns to select from it"""
+
+    name: str
+    columns: List[str]
+    watermark_column: str = "created_at"
+    key_column: str = "id"
+
+
+PREDICTIONS = TableSpec(
+    "ml.predictions", ["id", "loan_id", "score", "label", "model_version", "created_at"]
+)
+FEEDBACK = TableSpec(
+    "ml.feedback",
+    ["id", "prediction_id", "loan_id", "outcome_label", "correct", "comments", "created_at"],
+)
+LEARNING_METRICS = TableSpec(
+    "ml.learning_metrics",
+    ["id", "model_name", "model_version", "window", "metrics", "created_at"],
+)
+
+
+class IncrementalTable:
+    """Local mirror of one table, advanced by a ``created_at``/``id`` watermark"""
+
+    def __init__(
+        self,
+        client,
+        spec: TableSpec,
+        page_size: int = 1000,
+        lookback: timedelta = timedelta(seconds=5),
+        cache_path: Optional[Path] = None,
+        retention: Optional[timedelta] = None,
+        max_rows: Optional[int] = None,
+    ):
+        self.client = client
+        self.spec = spec
+        self.page_size = page_size
+        self.lookback = lookback
+        self.cache_path = cache_path
+        self.retention = retention
+        self.max_rows = max_rows
+        # Every retained row, newest first
+        self._frame = pd.DataFrame(columns=spec.columns)
+        self.watermark: Optional[pd.Timestamp] = None
+        # Keys of rows inside the lookback window, to drop re-fetched rows
+        self._recent_keys: Dict[Any, pd.Timestamp] = {}
+        self.refreshed_at: Optional[float] = None
+        self._listeners: List[Callable[[pd.DataFrame], None]] = []
+        self._lock = threading.RLock()
+        if cache_path is not None and Path(cache_path).exists():
+            self._load_cache()
+
+    def refresh(self, max_age: Optional[float] = None) -> int:
+        """Pull rows newer than the watermark; returns how many were new.
+
+        With ``max_age`` (seconds), a table refreshed more recently than that
+        is left alone. Concurrent callers wait for one refresh instead of each
+        issuing their own.
+        """
+        with self._lock:
+            if (
+                max_age is not None
+                and self.refreshed_at is not None
+                and time.monotonic() - self.refreshed_at < max_age
+            ):
+                return 0
+            new_rows = self._fetch_new_rows()
+            self.refreshed_at = time.monotonic()
+            return new_rows
+
+    def subscribe(self, listener: Callable[[pd.DataFrame], None]) -> None:
+        """Call ``listener`` with every page of new rows, starting with the cached rows"""
+        with self._lock:
+            self._listeners.append(listener)
+            if not self._frame.empty:
+                listener(self.frame)
+
+    def _fetch_new_rows(self) -> int:
+        if self.watermark is not None:
+            since = self.watermark - self.lookback
+        else:
+            since = self._horizon()
+        pages: List[pd.DataFrame] = []
+        offset = 0
+        while True:
+            query = self.client.from_(self.spec.name).select(",".join(self.spec.columns))
+            if since is not None:
+                query = query.gte(self.spec.watermark_column, since.isoformat())
+            response = (
+                query.order(self.spec.watermark_column)
+                .order(self.spec.key_column)
+                .range(offset, offset + self.page_size - 1)
+                .execute()
+            )
+            rows = response.data or []
+            page = self._ingest(rows)
+            if page is not None:
+                pages.append(page)
+            if len(rows) < self.page_size:
+                break
+            offset += self.page_size
+
+        new_rows = sum(len(page) for page in pages)
+        if new_rows:
+            self._merge(pd.concat(pages, ignore_index=True) if len(pages) > 1 else pages[0])
+            if self.cache_path is not None:
+                self._save_cache()
+        logger.info(f"{self.spec.name}: {new_rows} new rows")
+        return new_rows
+
+    @property
+    def frame(self) -> pd.DataFrame:
+        """All retained rows, newest first (the order the dashboard views expect)"""
+        with self._lock:
+            return self._frame
+
+    def latest(
+        self, limit: Optional[int] = None, since: Optional[pd.Timestamp] = None
+    ) -> pd.DataFrame:
+        """Copy of the newest ``limit`` rows (all rows by default), safe to modify.
+
+        ``since`` keeps only rows whose watermark column is at or after it.
+        """
+        frame = self.frame
+        if since is not None and not frame.empty:
+            frame = frame[frame[self.spec.watermark_column] >= since]
+        if limit is not None:
+            frame = frame.head(limit)
+        return frame.copy()
+
+    def _ingest(self, rows: List[Dict]) -> Optional[pd.DataFrame]:
+        """New rows of one fetched page, after notifying the listeners"""
+        if not rows:
+            return None
+        page = pd.DataFrame(rows, columns=self.spec.columns)
+        page[self.spec.watermark_column] = pd.to_datetime(
+            page[self.spec.watermark_column], utc=True, format="ISO8601"
+        )
+        page = page[~page[self.spec.key_column].isin(self._recent_keys.keys())]
+        if page.empty:
+            return None
+
+        latest = page[self.spec.watermark_column].max()
+        if self.watermark is None or latest > self.watermark:
+            self.watermark = latest
+        self._remember_recent(page)
+        for listener in self._listeners:
+            listener(page)
+        return page
+
+    def _merge(self, rows: pd.DataFrame) -> None:
+        """Merge new rows into the sorted frame, then drop rows past the retention.
+
+        New rows are at most ``lookback`` older than the watermark, so only the
+        frame's newest rows (those at or after the oldest new row) are re-sorted
+        with them; the older remainder is appended as it is.
+        """
+        stamp = self.spec.watermark_column
+        order = [stamp, self.spec.key_column]
+        frame = self._frame
+        if frame.empty:
+            merged = rows.sort_values(order, ascending=False)
+        else:
+            overlap = _count_at_or_after(frame, stamp, rows[stamp].min())
+            head = pd.concat([rows, frame.iloc[:overlap]], ignore_index=True)
+            merged = pd.concat([head.sort_values(order, ascending=False), frame.iloc[overlap:]])
+        self._frame = self._trim(merged.reset_index(drop=True))
+
+    def _trim(self, frame: pd.DataFrame) -> pd.DataFrame:
+        """Keep the rows inside the retention horizon and ``max_rows`` of a sorted frame"""
+        horizon, stamp = self._horizon(), self.spec.watermark_column
+        if horizon is not None and len(frame) and frame[stamp].iloc[-1] < horizon:
+            frame = frame.iloc[: _count_at_or_after(frame, stamp, horizon)]
+        if self.max_rows is not None and len(frame) > self.max_rows:
+            frame = frame.iloc[: self.max_rows]
+        return frame
+
+    def _horizon(self) -> Optional[pd.Timestamp]:
+        if self.retention is None:
+            return None
+        return pd.Timestamp.now(tz="UTC") - self.retention
+
+    def _remember_recent(self, page: pd.DataFrame) -> None:
+        cutoff = self.watermark - self.lookback
+        recent = page[page[self.spec.watermark_column] >= cutoff]
+        self._recent_keys.update(
+            zip(recent[self.spec.key_column], recent[self.spec.watermark_column])
+        )
+        self._recent_keys = {
+            key: stamp for key, stamp in self._recent_keys.items() if stamp >= cutoff
+        }
+
+    def _save_cache(self) -> None:
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        self.frame.to_pickle(self.cache_path)
+
+    def _load_cache(self) -> None:
+        cached = pd.read_pickle(self.cache_path)
+        if cached.empty:
+            return
+        # The watermark comes from the whole cache, so trimmed rows are not re-fetched
+        self.watermark = cached[self.spec.watermark_column].max()
+        self._remember_recent(cached)
+        self._frame = self._trim(
+            cached.sort_values(
+                [self.spec.watermark_column, self.spec.key_column], ascending=False
+            ).reset_index(drop=True)
+        )
+
+
+def _count_at_or_after(frame: pd.DataFrame, column: str, stamp: pd.Timestamp) -> int:
+    """Leading rows of a frame sorted newest first whose ``column`` is at or after ``stamp``"""
+    ascending = frame[column].iloc[::-1]
+    return len(frame) - int(ascending.searchsorted(stamp, side="left"))
+
+
+class TTLCache:
+    """Thread-safe mapping whose entries expire ``ttl`` seconds after loading.
+
+    ``get_or_load`` runs the loader at most once per key at a time: callers
+    arriving while a value is being loaded wait for it rather than repeating
+    the work.
+    """
+
+    def __init__(self):
+        self._entries: Dict[Hashable, Tuple[float, Any]] = {}
+        self._key_locks: Dict[Hashable, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_load(self, key: Hashable, ttl: float, loader: Callable[[], Any]) -> Any:
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            now = time.monotonic()
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] > now:
+                    self.hits += 1
+                    return entry[1]
+                self.misses += 1
+            value = loader()
+            with self._lock:
+                self._entries[key] = (now + ttl, value)
+                self._evict_expired(now)
+            return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def _evict_expired(self, now: float) -> None:
+        expired = [key for key, (expires, _) in self._entries.items() if expires <= now]
+        for key in expired:
+            del self._entries[key]
+
+
+class MLDataAccess:
+    """Incremental mirrors of ``ml.predictions``, ``ml.feedback`` and ``ml.learning_metrics``"""
+
+    def __init__(
+        self,
+        client,
+        page_size: int = 1000,
+        cache_dir: Optional[Union[str, Path]] = None,
+        retention: Optional[timedelta] = None,
+        max_rows: Optional[int] = None,
+    ):
+        def table(spec: TableSpec) -> IncrementalTable:
+            cache_path = None
+            if cache_dir is not None:
+                cache_path = Path(cache_dir) / f"{spec.name}.pkl"
+            return IncrementalTable(
+                client,
+                spec,
+                page_size,
+                cache_path=cache_path,
+                retention=retention,
+                max_rows=max_rows,
+            )
+
+        self.tables = {
+            "predictions": table(PREDICTIONS),
+            "feedback": table(FEEDBACK),
+            "learning_metrics": table(LEARNING_METRICS),
+        }
+        self.cache = TTLCache()
+        self._executor = ThreadPoolExecutor(
+            max_workers=len(self.tables), thread_name_prefix="ml-data-access"
+        )
+
+    def subscribe(self, table: str, listener: Callable[[pd.DataFrame], None]) -> None:
+        """Feed new rows of ``table`` to ``listener`` (see ``IncrementalTable.subscribe``)"""
+        self.tables[table].subscribe(listener)
+
+    def refresh(self, max_age: Optional[float] = None) -> Dict[str, int]:
+        """Refresh every table concurrently; returns the number of new rows per table"""
+        names = list(self.tables)
+        counts = self._executor.map(lambda name: self.tables[name].refresh(max_age), names)
+        return dict(zip(names, counts))
+
+    def load(
+        self,
+        window_days: Optional[int] = None,
+        ttl: float = 10.0,
+        limits: Optional[Dict[str, int]] = None,
+    ) -> Dict[str, pd.DataFrame]:
+        """Frames for every table, restricted to the last ``window_days`` days.
+
+        Each table is refreshed at most once per ``ttl`` seconds no matter how
+        many sessions call this, and the windowed frame for a given
+        ``(table, window_days, limit)`` is reused until it expires. The
+        tables load concurrently; each returned frame is a private copy.
+        """
+        limits = limits or {}
+
+        def load_table(name: str) -> pd.DataFrame:
+            key = (name, window_days, limits.get(name))
+            frame = self.cache.get_or_load(
+                key, ttl, lambda: self._windowed(name, window_days, limits.get(name), ttl)
+            )
+            return frame.copy()
+
+        names = list(self.tables)
+        return dict(zip(names, self._executor.map(load_table, names)))
+
+    def _windowed(
+        self, name: str, window_days: Optional[int], limit: Optional[int], ttl: float
+    ) -> pd.DataFrame:
+        table = self.tables[name]
+        table.refresh(max_age=ttl)
+        since = None
+        if window_days is not None:
+            since = pd.Timestamp.now(tz="UTC") - pd.Timedelta(days=window_days)
+        return table.latest(limit, since=since)
+
+    def predictions(self, limit: Optional[int] = None) -> pd.DataFrame:
+        return self.tables["predictions"].latest(limit)
+
+    def feedback(self, limit: Optional[int] = None) -> pd.DataFrame:
+        return self.tables["feedback"].latest(limit)
+
+    def learning_metrics(self, limit: Optional[int] = None) -> pd.DataFrame:
+        return self.tables["learning_metrics"].latest(limit)
+
+
+class InMemorySupabaseClient:
+    """Stand-in for a supabase-py client backed by lists of row dicts.
+
+    Supports ``from_(table).select(cols).gte(col, value).order(col, desc=...)
+    .range(start, end).limit(n).execute()``, which is everything the data
+    access layer issues. ``calls`` records each executed query for assertions.
+    """
+
+    def __init__(self, tables: Optional[Dict[str, List[Dict]]] = None):
+        self.tables: Dict[str, List[Dict]] = tables or {}
+        self.calls: List[Dict] = []
+
+    def from_(self, table: str) -> "_InMemoryQuery":
+        return _InMemoryQuery(self, table)
+
+    table = from_
+
+    def insert(self, table: str, rows: List[Dict]) -> None:
+        """Append rows, stamping ``created_at`` when missing"""
+        for row in rows:
+            row.setdefault("created_at", datetime.now(timezone.utc).isoformat())
+            self.tables.setdefault(table, []).append(dict(row))
+
+
+@dataclass
+class _InMemoryResponse:
+    data: List[Dict]
+    count: Optional[int] = None
+
+
+class _InMemoryQuery:
+    def __init__(self, client: InMemorySupabaseClient, table: str):
+        self.client = client
+        self.table = table
+        self.columns: Optional[List[str]] = None
+        self.filters: List = []
+        self.orders: List = []
+        self.bounds: Optional[tuple] = None
+        self.max_rows: Optional[int] = None
+
+    def select(self, columns: str = "*") -> "_InMemoryQuery":
+        self.columns = None if columns == "*" else [c.strip() for c in columns.split(",")]
+        return self
+
+    def gte(self, column: str, value) -> "_InMemoryQuery":
+        self.filters.append((column, ">=", value))
+        return self
+
+    def gt(self, column: str, value) -> "_InMemoryQuery":
+        self.filters.append((column, ">", value))
+        return self
+
+    def eq(self, column: str, value) -> "_InMemoryQuery":
+        self.filters.append((column, "==", value))
+        return self
+
+    def order(self, column: str, desc: bool = False) -> "_InMemoryQuery":
+        self.orders.append((column, desc))
+        return self
+
+    def range(self, start: int, end: int) -> "_InMemoryQuery":
+        self.bounds = (start, end)
+        return self
+
+    def limit(self, count: int) -> "_InMemoryQuery":
+        self.max_rows = count
+        return self
+
+    def execute(self) -> _InMemoryResponse:
+        rows = list(self.client.tables.get(self.table, []))
+        for column, op, value in self.filters:
+            rows = [row for row in rows if _compare(row.get(column), op, value)]
+        for column, desc in reversed(self.orders):
+            rows.sort(key=lambda row: _sort_key(row.get(column)), reverse=desc)
+        if self.bounds is not None:
+            rows = rows[self.bounds[0] : self.bounds[1] + 1]
+        if self.max_rows is not None:
+            rows = rows[: self.max_rows]
+        if self.columns is not None:
+            rows = [{column: row.get(column) for column in self.columns} for row in rows]
+        self.client.calls.append(
+            {"table": self.table, "filters": self.filters, "range": self.bounds, "rows": len(rows)}
+        )
+        return _InMemoryResponse(data=rows)
+
+
+def _sort_key(value):
+    if isinstance(value, str):
+        try:
+            return (0, pd.Timestamp(value).value, "")
+        except ValueError:
+            return (1, 0, value)
+    return (0, value, "")
+
+
+def _compare(left, op: str, right) -> bool:
+    if left is None:
+        return False
+    left, right = _sort_key(left), _sort_key(right)
+    if op == ">=":
+        return left >= right
+    if op == ">":
+        return left > right
+    return left == right
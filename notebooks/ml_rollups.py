@@ -0,0 +1,671 @@
+"""
+ABACO ML Rollups
+Hourly and daily pre-aggregates of ML predictions and feedback
+
+Raw prediction and feedback rows are folded, as they arrive, into two small
+additive tables keyed by granularity, bucket start, ``model_version`` and
+``label``:
+
+- ``prediction_rollups``: prediction count, score sum and fixed score-bin counts
+- ``feedback_rollups``: feedback count, correct count and Brier score sums
+
+Every measure is a sum, so folding is an additive upsert and any period or
+version filter is answered by summing rollup rows instead of scanning raw rows.
+Storage sits behind ``RollupBackend``: ``SQLiteRollupBackend`` for local use
+and ``PostgresRollupBackend`` for production (tables from
+``supabase/migrations/20251101_ml_rollups.sql``).
+
+Folding is idempotent under re-delivered rows. Each source keeps a watermark
+in ``rollup_state`` and the ids of recently folded rows in ``rollup_folded``.
+A row is skipped if it is older than the watermark minus ``lookback`` (the
+data access mirror re-fetches that overlap to catch late commits) or if its
+id was already folded. The dedupe check, the upserts and the state update run
+in one transaction that locks the sources' state rows, so several dashboard
+processes can fold into one Postgres database without double counting.
+Feedback is attributed to the ``model_version``, ``label`` and score of its
+prediction. Folding a prediction also stores that attribution in
+``rollup_predictions`` (kept for ``attribution_retention``), so feedback
+arriving months later, in another process or after a restart, still finds it.
+Feedback whose prediction has not been folded yet waits in memory, and the
+feedback watermark stops short of the oldest waiting row, so after a restart
+the replayed rows are parked again instead of being lost. A row still
+unmatched ``feedback_wait`` after newer feedback has arrived is an orphan (its
+prediction is older than the retention or was never mirrored): it is folded
+under ``model_version`` and ``label`` "—" with no score, so it neither waits
+forever nor holds the watermark back.
+"""
+
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from datetime import timedelta
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterator, List, Optional, Sequence, Set, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+GRANULARITIES = {"hour": "h", "day": "D"}
+N_SCORE_BINS = 20
+BIN_COLUMNS = [f"bin_{i:02d}" for i in range(N_SCORE_BINS)]
+KEY_COLUMNS = ["granularity", "bucket_start", "model_version", "label"]
+PREDICTION_MEASURES = ["predictions", "score_sum"] + BIN_COLUMNS
+FEEDBACK_MEASURES = ["feedback", "correct", "scored", "brier_sum"]
+TABLES = {
+    "prediction_rollups": PREDICTION_MEASURES,
+    "feedback_rollups": FEEDBACK_MEASURES,
+}
+
+# Watermark of a source that has never been folded
+EPOCH = pd.Timestamp("1970-01-01", tz="UTC")
+
+# Matches IncrementalTable's default re-fetch overlap in ml_data_access
+DEFAULT_LOOKBACK = timedelta(seconds=5)
+
+# How far behind the newest feedback a row may wait for its prediction
+DEFAULT_FEEDBACK_WAIT = timedelta(hours=1)
+
+# Prediction attribution is kept this long; feedback lags predictions by up to 90 days
+DEFAULT_ATTRIBUTION_RETENTION = timedelta(days=120)
+
+# Attribution for feedback whose prediction cannot be found
+UNKNOWN = "—"
+
+# Ids per attribution lookup statement
+LOOKUP_BATCH = 500
+
+
+class RollupBackend:
+    """Additive rollup storage over a DB-API connection.
+
+    Subclasses set the connection, the parameter ``placeholder`` and the SQL
+    column types; the statements themselves (``INSERT ... ON CONFLICT DO
+    UPDATE``) are shared by SQLite and Postgres.
+    """
+
+    placeholder = "?"
+    table_prefix = ""
+    key_types = {
+        "granularity": "TEXT",
+        "bucket_start": "TEXT",
+        "model_version": "TEXT",
+        "label": "TEXT",
+    }
+    count_type = "INTEGER"
+    sum_type = "REAL"
+    # Statement that starts a transaction holding the write lock, if needed
+    begin_exclusive: Optional[str] = None
+    # Suffix that row-locks the selected state rows, if supported
+    lock_rows = ""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self._lock = threading.Lock()
+
+    def create_tables(self) -> None:
+        statements = [
+            f"CREATE TABLE IF NOT EXISTS {self.table_prefix}rollup_state "
+            "(source TEXT PRIMARY KEY, watermark TEXT NOT NULL)",
+            f"CREATE TABLE IF NOT EXISTS {self.table_prefix}rollup_folded "
+            "(source TEXT NOT NULL, row_id TEXT NOT NULL, created_at TEXT NOT NULL, "
+            "PRIMARY KEY (source, row_id))",
+            f"CREATE TABLE IF NOT EXISTS {self.table_prefix}rollup_predictions "
+            "(prediction_id TEXT PRIMARY KEY, created_at TEXT NOT NULL, "
+            f"model_version TEXT NOT NULL, label TEXT NOT NULL, score {self.sum_type} NOT NULL)",
+            "CREATE INDEX IF NOT EXISTS rollup_predictions_created_at "
+            f"ON {self.table_prefix}rollup_predictions (created_at)",
+        ]
+        for table, measures in TABLES.items():
+            columns = [f"{key} {self.key_types[key]} NOT NULL" for key in KEY_COLUMNS]
+            for measure in measures:
+                sql_type = self.sum_type if measure.endswith("_sum") else self.count_type
+                columns.append(f"{measure} {sql_type} NOT NULL DEFAULT 0")
+            columns.append(f"PRIMARY KEY ({', '.join(KEY_COLUMNS)})")
+            statements.append(
+                f"CREATE TABLE IF NOT EXISTS {self.table_prefix}{table} ({', '.join(columns)})"
+            )
+        with self._transaction() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+
+    @contextmanager
+    def folding(
+        self, sources: Sequence[str], lookback: timedelta = DEFAULT_LOOKBACK
+    ) -> Iterator["FoldTransaction"]:
+        """One transaction holding the fold state of ``sources`` exclusively.
+
+        Other folders of the same sources, in this or another process, wait
+        until it commits and then see everything it folded.
+        """
+        with self._transaction() as cursor:
+            if self.begin_exclusive:
+                cursor.execute(self.begin_exclusive)
+            yield FoldTransaction(self, cursor, sources, lookback)
+
+    def _upsert(self, cursor, table: str, rows: pd.DataFrame) -> None:
+        """Add ``rows`` (key columns plus measures) onto existing rollup rows"""
+        if rows.empty:
+            return
+        measures = TABLES[table]
+        columns = KEY_COLUMNS + measures
+        updates = ", ".join(
+            f"{m} = {self.table_prefix}{table}.{m} + excluded.{m}" for m in measures
+        )
+        statement = (
+            f"INSERT INTO {self.table_prefix}{table} ({', '.join(columns)}) "
+            f"VALUES ({', '.join([self.placeholder] * len(columns))}) "
+            f"ON CONFLICT ({', '.join(KEY_COLUMNS)}) DO UPDATE SET {updates}"
+        )
+        values = [tuple(_plain(v) for v in row) for row in rows[columns].itertuples(index=False)]
+        cursor.executemany(statement, values)
+
+    @contextmanager
+    def _transaction(self) -> Iterator[Any]:
+        with self._lock:
+            try:
+                yield self.connection.cursor()
+                self.connection.commit()
+            except Exception:
+                self.connection.rollback()
+                raise
+
+    def query(
+        self,
+        table: str,
+        granularity: str,
+        start: Optional[pd.Timestamp] = None,
+        end: Optional[pd.Timestamp] = None,
+        model_version: Optional[str] = None,
+    ) -> pd.DataFrame:
+        """Rollup rows of one granularity, bucket start in ``[start, end)``"""
+        conditions = [f"granularity = {self.placeholder}"]
+        params: List[Any] = [granularity]
+        if start is not None:
+            conditions.append(f"bucket_start >= {self.placeholder}")
+            params.append(_bucket_text(start))
+        if end is not None:
+            conditions.append(f"bucket_start < {self.placeholder}")
+            params.append(_bucket_text(end))
+        if model_version is not None:
+            conditions.append(f"model_version = {self.placeholder}")
+            params.append(model_version)
+        columns = KEY_COLUMNS + TABLES[table]
+        statement = (
+            f"SELECT {', '.join(columns)} FROM {self.table_prefix}{table} "
+            f"WHERE {' AND '.join(conditions)} ORDER BY bucket_start"
+        )
+        # Reads commit too, so Postgres is never left idle in a transaction between folds
+        with self._transaction() as cursor:
+            cursor.execute(statement, params)
+            rows = cursor.fetchall()
+        frame = pd.DataFrame(rows, columns=columns)
+        frame["bucket_start"] = pd.to_datetime(frame["bucket_start"], utc=True, format="ISO8601")
+        return frame
+
+    def get_watermark(self, source: str) -> Optional[pd.Timestamp]:
+        with self._transaction() as cursor:
+            cursor.execute(
+                f"SELECT watermark FROM {self.table_prefix}rollup_state "
+                f"WHERE source = {self.placeholder}",
+                (source,),
+            )
+            row = cursor.fetchone()
+        if row is None or pd.Timestamp(row[0]) == EPOCH:
+            return None
+        return pd.Timestamp(row[0])
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+class SQLiteRollupBackend(RollupBackend):
+    """Rollups in a local SQLite file (or ``":memory:"``)"""
+
+    begin_exclusive = "BEGIN IMMEDIATE"
+
+    def __init__(self, path: Union[str, Path] = ":memory:"):
+        import sqlite3
+
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        super().__init__(sqlite3.connect(str(path), check_same_thread=False))
+        self.create_tables()
+
+
+class PostgresRollupBackend(RollupBackend):
+    """Rollups in the ``ml`` schema of a Postgres database (psycopg 3)"""
+
+    placeholder = "%s"
+    table_prefix = "ml."
+    key_types = {
+        "granularity": "text",
+        "bucket_start": "timestamptz",
+        "model_version": "text",
+        "label": "text",
+    }
+    count_type = "bigint"
+    sum_type = "double precision"
+    lock_rows = " FOR UPDATE"
+
+    def __init__(self, dsn: str):
+        try:
+            import psycopg
+        except ImportError as e:
+            raise ImportError(
+                "Postgres rollups require psycopg: pip install 'psycopg[binary]'"
+            ) from e
+        super().__init__(psycopg.connect(dsn))
+
+
+class FoldTransaction:
+    """Fold state read and written inside one ``RollupBackend.folding`` transaction"""
+
+    def __init__(
+        self, backend: RollupBackend, cursor, sources: Sequence[str], lookback: timedelta
+    ):
+        self.backend = backend
+        self.cursor = cursor
+        self.lookback = lookback
+        self.watermarks: Dict[str, pd.Timestamp] = {}
+        self._folded: Dict[str, Set[str]] = {}
+        # A fixed lock order keeps concurrent folders from deadlocking
+        for source in sorted(sources):
+            self.watermarks[source] = self._lock(source)
+
+    def unfolded(self, source: str, rows: pd.DataFrame) -> pd.DataFrame:
+        """``rows`` (with ``id`` and parsed ``created_at``) not folded into ``source`` yet"""
+        horizon = self.watermarks[source] - self.lookback
+        rows = rows[rows["created_at"] >= horizon].drop_duplicates("id")
+        if source not in self._folded:
+            self._folded[source] = self._folded_ids(source, horizon)
+        return rows[~rows["id"].astype(str).isin(self._folded[source])]
+
+    def upsert(self, upserts: List[Tuple[str, pd.DataFrame]]) -> None:
+        for table, rows in upserts:
+            self.backend._upsert(self.cursor, table, rows)
+
+    def mark_folded(self, source: str, rows: pd.DataFrame, watermark: pd.Timestamp) -> None:
+        """Record ``rows`` as folded and move the watermark up to ``watermark``.
+
+        Only ids that stay inside the lookback horizon are kept; older rows are
+        already excluded by the watermark.
+        """
+        backend, p = self.backend, self.backend.placeholder
+        watermark = max(self.watermarks[source], watermark)
+        horizon = watermark - self.lookback
+        kept = rows[rows["created_at"] >= horizon]
+        ids = kept["id"].astype(str).tolist()
+        self.cursor.executemany(
+            f"INSERT INTO {backend.table_prefix}rollup_folded (source, row_id, created_at) "
+            f"VALUES ({p}, {p}, {p}) ON CONFLICT (source, row_id) DO NOTHING",
+            [(source, row_id, _stamp_text(at)) for row_id, at in zip(ids, kept["created_at"])],
+        )
+        self._folded.setdefault(source, set()).update(ids)
+        if watermark > self.watermarks[source]:
+            self.cursor.execute(
+                f"UPDATE {backend.table_prefix}rollup_state SET watermark = {p} "
+                f"WHERE source = {p}",
+                (_stamp_text(watermark), source),
+            )
+            self.cursor.execute(
+                f"DELETE FROM {backend.table_prefix}rollup_folded "
+                f"WHERE source = {p} AND created_at < {p}",
+                (source, _stamp_text(horizon)),
+            )
+            self.watermarks[source] = watermark
+
+    def remember_predictions(self, rows: pd.DataFrame, retention: timedelta) -> None:
+        """Store the attribution of folded predictions and forget what aged past ``retention``"""
+        backend, p = self.backend, self.backend.placeholder
+        self.cursor.executemany(
+            f"INSERT INTO {backend.table_prefix}rollup_predictions "
+            "(prediction_id, created_at, model_version, label, score) "
+            f"VALUES ({p}, {p}, {p}, {p}, {p}) ON CONFLICT (prediction_id) DO NOTHING",
+            [
+                (str(pid), _stamp_text(at), version, label, float(score))
+                for pid, at, (version, label, score) in zip(
+                    rows["id"], rows["created_at"], _attribution(rows)
+                )
+            ],
+        )
+        self.cursor.execute(
+            f"DELETE FROM {backend.table_prefix}rollup_predictions WHERE created_at < {p}",
+            (_stamp_text(self.watermarks["predictions"] - retention),),
+        )
+
+    def predictions(self, ids: Sequence[str]) -> Dict[str, Tuple[str, str, float]]:
+        """Stored ``(model_version, label, score)`` of the given prediction ids"""
+        backend, found = self.backend, {}
+        for start in range(0, len(ids), LOOKUP_BATCH):
+            batch = list(ids[start : start + LOOKUP_BATCH])
+            self.cursor.execute(
+                f"SELECT prediction_id, model_version, label, score "
+                f"FROM {backend.table_prefix}rollup_predictions "
+                f"WHERE prediction_id IN ({', '.join([backend.placeholder] * len(batch))})",
+                batch,
+            )
+            found.update(
+                (pid, (version, label, score))
+                for pid, version, label, score in self.cursor.fetchall()
+            )
+        return found
+
+    def _lock(self, source: str) -> pd.Timestamp:
+        backend, p = self.backend, self.backend.placeholder
+        self.cursor.execute(
+            f"INSERT INTO {backend.table_prefix}rollup_state (source, watermark) "
+            f"VALUES ({p}, {p}) ON CONFLICT (source) DO NOTHING",
+            (source, _stamp_text(EPOCH)),
+        )
+        self.cursor.execute(
+            f"SELECT watermark FROM {backend.table_prefix}rollup_state "
+            f"WHERE source = {p}{backend.lock_rows}",
+            (source,),
+        )
+        return _utc(self.cursor.fetchone()[0])
+
+    def _folded_ids(self, source: str, horizon: pd.Timestamp) -> Set[str]:
+        p = self.backend.placeholder
+        self.cursor.execute(
+            f"SELECT row_id FROM {self.backend.table_prefix}rollup_folded "
+            f"WHERE source = {p} AND created_at >= {p}",
+            (source, _stamp_text(horizon)),
+        )
+        return {row[0] for row in self.cursor.fetchall()}
+
+
+def open_backend(target: Union[str, Path]) -> RollupBackend:
+    """Postgres for ``postgres://``/``postgresql://`` URLs, otherwise a SQLite path"""
+    if str(target).startswith(("postgres://", "postgresql://")):
+        return PostgresRollupBackend(str(target))
+    return SQLiteRollupBackend(target)
+
+
+class MLRollups:
+    """Folds raw ML rows into rollups and answers dashboard queries from them"""
+
+    def __init__(
+        self,
+        backend: RollupBackend,
+        granularities: Sequence[str] = ("hour", "day"),
+        max_tracked_predictions: int = 5_000_000,
+        max_pending_feedback: int = 100_000,
+        lookback: timedelta = DEFAULT_LOOKBACK,
+        feedback_wait: timedelta = DEFAULT_FEEDBACK_WAIT,
+        attribution_retention: timedelta = DEFAULT_ATTRIBUTION_RETENTION,
+    ):
+        self.backend = backend
+        self.granularities = list(granularities)
+        # At least the mirror's re-fetch overlap, so late-committed rows are folded
+        self.lookback = lookback
+        self.feedback_wait = feedback_wait
+        self.attribution_retention = attribution_retention
+        # str(prediction_id) -> (model_version, label, score), oldest evicted first;
+        # a cache in front of rollup_predictions
+        self._predictions: Dict[str, Tuple[str, str, float]] = {}
+        self._prediction_order: Deque[Any] = deque()
+        self._max_tracked = max_tracked_predictions
+        self._max_pending = max_pending_feedback
+        self._pending_feedback = pd.DataFrame()
+        self.dropped_feedback = 0
+        self.orphaned_feedback = 0
+        self._lock = threading.RLock()
+
+    def fold_predictions(self, df: pd.DataFrame) -> int:
+        """Fold ``ml.predictions`` rows; returns how many were new to the rollups"""
+        if df.empty:
+            return 0
+        df = _parse_created_at(df)
+        with self._lock:
+            self._track(df)
+            with self.backend.folding(["predictions", "feedback"], self.lookback) as fold:
+                fresh = fold.unfolded("predictions", df)
+                if not fresh.empty:
+                    scores = pd.to_numeric(fresh["score"], errors="coerce").fillna(0.0).to_numpy()
+                    measures = pd.DataFrame(
+                        {
+                            "predictions": 1,
+                            "score_sum": scores,
+                            "score_bin": np.clip(
+                                (scores * N_SCORE_BINS).astype(np.int64), 0, N_SCORE_BINS - 1
+                            ),
+                        }
+                    )
+                    fold.upsert(self._fold("prediction_rollups", fresh, measures))
+                    fold.mark_folded("predictions", fresh, fresh["created_at"].max())
+                    fold.remember_predictions(fresh, self.attribution_retention)
+
+                pending = self._pending_feedback
+                if not pending.empty:
+                    # Another process may have folded some parked rows meanwhile
+                    pending = self._fold_feedback(fold, fold.unfolded("feedback", pending))
+            self._pending_feedback = pending
+            return len(fresh)
+
+    def fold_feedback(self, df: pd.DataFrame) -> int:
+        """Fold ``ml.feedback`` rows; returns how many were new to the rollups"""
+        if df.empty:
+            return 0
+        df = _parse_created_at(df)
+        with self._lock:
+            with self.backend.folding(["feedback"], self.lookback) as fold:
+                fresh = fold.unfolded("feedback", df)
+                pending = self._pending_feedback
+                if not pending.empty:
+                    pending = fold.unfolded("feedback", pending)
+                pending = self._fold_feedback(fold, fresh, pending)
+            self._pending_feedback = pending
+            return len(fresh)
+
+    def totals(
+        self, start: Optional[pd.Timestamp] = None, model_version: Optional[str] = None
+    ) -> Dict:
+        """Prediction and feedback totals since ``start`` (all history by default)"""
+        predictions = self.backend.query("prediction_rollups", "day", start, None, model_version)
+        feedback = self.backend.query("feedback_rollups", "day", start, None, model_version)
+        n_feedback = int(feedback["feedback"].sum())
+        n_scored = int(feedback["scored"].sum())
+        correct = float(feedback["correct"].sum())
+        brier_sum = float(feedback["brier_sum"].sum())
+        return {
+            "predictions": int(predictions["predictions"].sum()),
+            "feedback": n_feedback,
+            "accuracy": correct / n_feedback if n_feedback else float("nan"),
+            "brier": brier_sum / n_scored if n_scored else float("nan"),
+        }
+
+    def label_counts(
+        self,
+        granularity: str = "day",
+        start: Optional[pd.Timestamp] = None,
+        end: Optional[pd.Timestamp] = None,
+        model_version: Optional[str] = None,
+    ) -> pd.Series:
+        rows = self.backend.query("prediction_rollups", granularity, start, end, model_version)
+        return rows.groupby("label")["predictions"].sum().sort_values(ascending=False)
+
+    def score_histogram(
+        self,
+        granularity: str = "day",
+        start: Optional[pd.Timestamp] = None,
+        end: Optional[pd.Timestamp] = None,
+        model_version: Optional[str] = None,
+    ) -> pd.DataFrame:
+        """Counts per score bin, with ``bin_lower``/``bin_upper`` edges"""
+        rows = self.backend.query("prediction_rollups", granularity, start, end, model_version)
+        edges = np.linspace(0.0, 1.0, N_SCORE_BINS + 1)
+        return pd.DataFrame(
+            {
+                "bin_lower": edges[:-1],
+                "bin_upper": edges[1:],
+                "count": rows[BIN_COLUMNS].sum().to_numpy(dtype=np.int64),
+            }
+        )
+
+    def accuracy_trend(
+        self,
+        granularity: str = "day",
+        start: Optional[pd.Timestamp] = None,
+        end: Optional[pd.Timestamp] = None,
+        model_version: Optional[str] = None,
+    ) -> pd.DataFrame:
+        """Feedback count, accuracy and Brier score per bucket"""
+        rows = self.backend.query("feedback_rollups", granularity, start, end, model_version)
+        trend = rows.groupby("bucket_start")[FEEDBACK_MEASURES].sum().reset_index()
+        with np.errstate(invalid="ignore", divide="ignore"):
+            trend["accuracy"] = trend["correct"] / trend["feedback"]
+            trend["brier"] = trend["brier_sum"] / trend["scored"]
+        return trend
+
+    def _fold_feedback(
+        self, fold: FoldTransaction, df: pd.DataFrame, parked: Optional[pd.DataFrame] = None
+    ) -> pd.DataFrame:
+        """Fold feedback with a known prediction; returns the rows still parked.
+
+        Predictions missing from the in-memory cache are looked up in
+        ``rollup_predictions``. Parked rows are not marked as folded, and the
+        feedback watermark stops at the oldest of them, so they are replayed and
+        parked again after a restart. Rows unmatched ``feedback_wait`` behind the
+        newest feedback are folded as orphans; only rows dropped over
+        ``max_pending_feedback`` are given up.
+        """
+        parts = [frame for frame in (parked, df) if frame is not None and not frame.empty]
+        if not parts:
+            return pd.DataFrame()
+        # A replay after a restart re-delivers rows that are already parked
+        rows = pd.concat(parts, ignore_index=True).drop_duplicates(
+            "id", keep="last", ignore_index=True
+        )
+        keys = rows["prediction_id"].astype(str)
+        missing = [key for key in keys.unique() if key not in self._predictions]
+        # Used directly as well as cached: the cache may evict them straight away
+        resolved = fold.predictions(missing) if missing else {}
+        self._remember(resolved)
+        known = np.fromiter(
+            (key in self._predictions or key in resolved for key in keys),
+            dtype=bool,
+            count=len(keys),
+        )
+
+        newest = max(fold.watermarks["feedback"], rows["created_at"].max())
+        orphaned = ~known & (rows["created_at"] < newest - self.feedback_wait).to_numpy()
+        if orphaned.any():
+            logger.warning(
+                f"Folding {int(orphaned.sum())} feedback rows whose predictions are unknown"
+            )
+            self.orphaned_feedback += int(orphaned.sum())
+
+        parked = rows[~known & ~orphaned].reset_index(drop=True)
+        if len(parked) > self._max_pending:
+            dropped = len(parked) - self._max_pending
+            logger.warning(f"Dropping {dropped} feedback rows whose predictions never arrived")
+            self.dropped_feedback += dropped
+            parked = parked.iloc[-self._max_pending :].reset_index(drop=True)
+
+        matched = rows[known | orphaned]
+        if matched.empty:
+            return parked
+
+        version, label, score = zip(
+            *(
+                self._predictions.get(key) or resolved.get(key, (UNKNOWN, UNKNOWN, np.nan))
+                for key in keys[known | orphaned]
+            )
+        )
+        score = np.asarray(score, dtype=float)
+        scored = ~np.isnan(score)
+        outcome = matched["correct"].fillna(False).astype(bool).to_numpy(dtype=float)
+        keyed = matched.assign(model_version=list(version), label=list(label))
+        measures = pd.DataFrame(
+            {
+                "feedback": 1,
+                "correct": outcome.astype(np.int64),
+                "scored": scored.astype(np.int64),
+                "brier_sum": np.where(scored, (score - outcome) ** 2, 0.0),
+            }
+        )
+        fold.upsert(self._fold("feedback_rollups", keyed, measures))
+        watermark = matched["created_at"].max()
+        if not parked.empty:
+            watermark = min(watermark, parked["created_at"].min())
+        fold.mark_folded("feedback", matched, watermark)
+        return parked
+
+    def _fold(
+        self, table: str, rows: pd.DataFrame, measures: pd.DataFrame
+    ) -> List[Tuple[str, pd.DataFrame]]:
+        """Sums of ``measures`` per key, one rollup frame per granularity.
+
+        A ``score_bin`` measure column is expanded into per-bin counts.
+        """
+        keys = ["bucket_start", "model_version", "label"]
+        upserts = []
+        frame = measures.reset_index(drop=True)
+        frame["model_version"] = rows["model_version"].fillna(UNKNOWN).astype(str).to_numpy()
+        frame["label"] = rows["label"].fillna(UNKNOWN).astype(str).to_numpy()
+        for granularity in self.granularities:
+            buckets = rows["created_at"].dt.floor(GRANULARITIES[granularity])
+            frame["bucket_start"] = buckets.to_numpy()
+            if "score_bin" in frame:
+                sums = frame.drop(columns="score_bin").groupby(keys, sort=False).sum()
+                bins = (
+                    frame.groupby(keys + ["score_bin"], sort=False)
+                    .size()
+                    .unstack("score_bin", fill_value=0)
+                    .reindex(columns=range(N_SCORE_BINS), fill_value=0)
+                )
+                bins.columns = BIN_COLUMNS
+                sums = sums.join(bins)
+            else:
+                sums = frame.groupby(keys, sort=False).sum()
+            sums = sums.reset_index()
+            sums["bucket_start"] = [_bucket_text(b) for b in sums["bucket_start"]]
+            sums.insert(0, "granularity", granularity)
+            upserts.append((table, sums))
+        return upserts
+
+    def _track(self, df: pd.DataFrame) -> None:
+        self._remember(dict(zip(df["id"].astype(str), _attribution(df))))
+
+    def _remember(self, attribution: Dict[str, Tuple[str, str, float]]) -> None:
+        self._prediction_order.extend(pid for pid in attribution if pid not in self._predictions)
+        self._predictions.update(attribution)
+        while len(self._prediction_order) > self._max_tracked:
+            self._predictions.pop(self._prediction_order.popleft(), None)
+
+
+def _attribution(df: pd.DataFrame) -> List[Tuple[str, str, float]]:
+    """``(model_version, label, score)`` of each prediction row"""
+    versions = df["model_version"].fillna(UNKNOWN).astype(str)
+    labels = df["label"].fillna(UNKNOWN).astype(str)
+    scores = pd.to_numeric(df["score"], errors="coerce").fillna(0.0).astype(float)
+    return list(zip(versions, labels, scores))
+
+
+def _parse_created_at(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.assign(created_at=pd.to_datetime(df["created_at"], utc=True, format="ISO8601"))
+    return df.reset_index(drop=True)
+
+
+def _utc(timestamp) -> pd.Timestamp:
+    timestamp = pd.Timestamp(timestamp)
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.tz_localize("UTC")
+    return timestamp.tz_convert("UTC")
+
+
+def _stamp_text(timestamp) -> str:
+    """Fixed-width UTC text, so stored stamps compare correctly as strings"""
+    return _utc(timestamp).strftime("%Y-%m-%dT%H:%M:%S.%f+00:00")
+
+
+def _bucket_text(timestamp) -> str:
+    return _utc(timestamp).isoformat()
+
+
+def _plain(value):
+    """NumPy scalars to Python scalars for DB-API drivers"""
+    return value.item() if isinstance(value, np.generic) else value
@@ -0,0 +1,135 @@
+"""
+ABACO Model Evaluation
+Vectorized calibration and accuracy metrics for ML predictions and feedback
+
+Feedback rows are joined to their predictions once (``ml.feedback.prediction_id``
+-> ``ml.predictions.id``); every metric is then a vectorized reduction over
+that joined frame. The observed outcome follows the dashboard's definition:
+1.0 when feedback marks the prediction ``correct``, else 0.0.
+"""
+
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+PREDICTION_COLUMNS = ["id", "score", "label", "model_version"]
+
+# Clip probabilities away from 0 and 1 so log loss stays finite
+LOG_LOSS_EPS = 1e-15
+
+
+def join_feedback(predictions_df: pd.DataFrame, feedback_df: pd.DataFrame) -> pd.DataFrame:
+    """Feedback rows with their prediction's score, label and model version.
+
+    Feedback without a matching prediction is dropped. The result has
+    ``score`` (float), ``outcome`` (0.0/1.0) and ``correct`` (bool) columns.
+    """
+    if predictions_df.empty or feedback_df.empty or "prediction_id" not in feedback_df:
+        return pd.DataFrame(
+            columns=["prediction_id", "score", "label", "model_version", "correct", "outcome"]
+        )
+
+    available = [column for column in PREDICTION_COLUMNS if column in predictions_df.columns]
+    predictions = predictions_df[available].drop_duplicates("id")
+    joined = feedback_df.merge(
+        predictions.rename(columns={"id": "prediction_id"}),
+        on="prediction_id",
+        how="inner",
+        suffixes=("", "_prediction"),
+    )
+    joined["score"] = pd.to_numeric(joined["score"], errors="coerce").astype(float)
+    correct = joined["correct"] if "correct" in joined else pd.Series(False, index=joined.index)
+    joined["correct"] = correct.fillna(False).astype(bool)
+    joined["outcome"] = joined["correct"].astype(float)
+    return joined
+
+
+def brier_score(joined: pd.DataFrame) -> float:
+    """Mean squared difference between score and outcome (lower is better)"""
+    if joined.empty:
+        return float("nan")
+    return float(np.mean((joined["score"].to_numpy() - joined["outcome"].to_numpy()) ** 2))
+
+
+def log_loss(joined: pd.DataFrame) -> float:
+    """Mean negative log-likelihood of the outcomes under the scores"""
+    if joined.empty:
+        return float("nan")
+    p = np.clip(joined["score"].to_numpy(), LOG_LOSS_EPS, 1 - LOG_LOSS_EPS)
+    y = joined["outcome"].to_numpy()
+    return float(-np.mean(y * np.log(p) + (1 - y) * np.log1p(-p)))
+
+
+def accuracy_by_label(joined: pd.DataFrame) -> pd.DataFrame:
+    """Feedback count and share marked correct for each predicted ``label``"""
+    return _grouped_metrics(joined, "label")[["label", "n", "accuracy"]]
+
+
+def metrics_by_model_version(joined: pd.DataFrame) -> pd.DataFrame:
+    """Count, accuracy, Brier score and log loss for each ``model_version``"""
+    return _grouped_metrics(joined, "model_version")
+
+
+def reliability_curve(joined: pd.DataFrame, n_bins: int = 10) -> pd.DataFrame:
+    """Mean score against observed outcome rate in equal-width score bins"""
+    edges = np.linspace(0.0, 1.0, n_bins + 1)
+    scores = joined["score"].to_numpy() if not joined.empty else np.empty(0)
+    outcomes = joined["outcome"].to_numpy() if not joined.empty else np.empty(0)
+
+    bins = np.clip(np.searchsorted(edges, scores, side="right") - 1, 0, n_bins - 1)
+    counts = np.bincount(bins, minlength=n_bins)
+    score_sums = np.bincount(bins, weights=scores, minlength=n_bins)
+    outcome_sums = np.bincount(bins, weights=outcomes, minlength=n_bins)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return pd.DataFrame(
+            {
+                "bin_lower": edges[:-1],
+                "bin_upper": edges[1:],
+                "count": counts,
+                "mean_score": score_sums / counts,
+                "observed_rate": outcome_sums / counts,
+            }
+        )
+
+
+def evaluate(
+    predictions_df: pd.DataFrame, feedback_df: pd.DataFrame, n_bins: int = 10
+) -> Dict:
+    """All calibration metrics from a single feedback-to-prediction join"""
+    joined = join_feedback(predictions_df, feedback_df)
+    return {
+        "n_matched": len(joined),
+        "brier": brier_score(joined),
+        "log_loss": log_loss(joined),
+        "accuracy": float(joined["correct"].mean()) if len(joined) else float("nan"),
+        "by_label": accuracy_by_label(joined),
+        "by_model_version": metrics_by_model_version(joined),
+        "reliability": reliability_curve(joined, n_bins),
+    }
+
+
+def _grouped_metrics(joined: pd.DataFrame, key: str) -> pd.DataFrame:
+    columns = [key, "n", "accuracy", "brier", "log_loss"]
+    if joined.empty or key not in joined:
+        return pd.DataFrame(columns=columns)
+
+    p = np.clip(joined["score"].to_numpy(), LOG_LOSS_EPS, 1 - LOG_LOSS_EPS)
+    y = joined["outcome"].to_numpy()
+    terms = pd.DataFrame(
+        {
+            key: joined[key].fillna("—").to_numpy(),
+            "n": 1,
+            "accuracy": y,
+            "brier": (joined["score"].to_numpy() - y) ** 2,
+            "log_loss": -(y * np.log(p) + (1 - y) * np.log1p(-p)),
+        }
+    )
+    grouped = terms.groupby(key, sort=True).agg(
+        n=("n", "sum"),
+        accuracy=("accuracy", "mean"),
+        brier=("brier", "mean"),
+        log_loss=("log_loss", "mean"),
+    )
+    return grouped.reset_index()[columns]
@@ -0,0 +1,323 @@
+"""
+ABACO Model Monitoring
+Streaming, time-windowed accuracy, Brier score and label mix for ML predictions
+
+Prediction and feedback events are counted into fixed time buckets (hourly by
+default). Every sliding window (1d/7d/30d, plus any added later) keeps running
+totals: an event adds to the totals of each window that covers it, and a
+bucket leaving a window is subtracted once, so the work per event is constant.
+History is derived from the retained buckets on request, which keeps it
+correct when feedback arrives out of order.
+
+A feedback event contributes to accuracy immediately. It adds to the Brier
+score once its prediction's score is known: immediately if the prediction has
+already been seen, otherwise as soon as the prediction arrives. The observed
+outcome follows ``model_evaluation``: 1.0 when feedback is ``correct``, else 0.0.
+"""
+
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Deque, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_WINDOWS = {
+    "1d": timedelta(days=1),
+    "7d": timedelta(days=7),
+    "30d": timedelta(days=30),
+}
+
+Timestamp = Union[str, datetime, pd.Timestamp]
+Totals = Dict[str, float]
+
+
+@dataclass
+class _Window:
+    buckets: int
+    totals: Totals = field(default_factory=dict)
+    cursor: Optional[int] = None  # oldest bucket still counted
+
+
+class ModelMonitor:
+    """Sliding-window model quality metrics, updated per event"""
+
+    def __init__(
+        self,
+        windows: Optional[Dict[str, timedelta]] = None,
+        resolution: timedelta = timedelta(hours=1),
+        retention: timedelta = timedelta(days=90),
+    ):
+        self.resolution = resolution
+        self._resolution_ns = pd.Timedelta(resolution).value
+        self._retention = self._n_buckets(retention)
+        self._buckets: Dict[int, Totals] = {}
+        self._windows: Dict[str, _Window] = {}
+        self._head: Optional[int] = None
+        self._oldest: Optional[int] = None
+        # prediction_id -> score, plus insertion order for retention
+        self._scores: Dict[Any, float] = {}
+        self._score_order: Deque[Tuple[int, Any]] = deque()
+        # prediction_id -> [(bucket, outcome)] for feedback awaiting its prediction
+        self._pending: Dict[Any, List[Tuple[int, float]]] = {}
+        self._pending_order: Deque[Tuple[int, Any]] = deque()
+        self.dropped = 0
+        self._lock = threading.RLock()
+        for name, length in (windows or DEFAULT_WINDOWS).items():
+            self.add_window(name, length)
+
+    def add_window(self, name: str, length: timedelta) -> None:
+        """Track another window; it is filled from the retained buckets"""
+        with self._lock:
+            if name in self._windows:
+                return
+            n_buckets = min(self._n_buckets(length), self._retention)
+            window = _Window(buckets=n_buckets)
+            if self._head is not None:
+                window.cursor = self._head - n_buckets + 1
+                for bucket, totals in self._buckets.items():
+                    if bucket >= window.cursor:
+                        _accumulate(window.totals, totals, 1)
+            self._windows[name] = window
+
+    def add_prediction(
+        self, prediction_id, score: float, label: str, created_at: Timestamp
+    ) -> None:
+        bucket = self._bucket(pd.Timestamp(created_at))
+        with self._lock:
+            self._add(bucket, {"predictions": 1, f"label:{label}": 1})
+            self._remember_score(bucket, prediction_id, float(score))
+
+    def add_feedback(self, prediction_id, correct: Optional[bool], created_at: Timestamp) -> None:
+        bucket = self._bucket(pd.Timestamp(created_at))
+        outcome = 1.0 if correct else 0.0
+        with self._lock:
+            self._add(bucket, {"feedback": 1, "correct": outcome})
+            score = self._scores.get(prediction_id)
+            if score is None:
+                self._defer(bucket, prediction_id, outcome)
+            else:
+                self._add(bucket, {"scored": 1, "brier_sum": (score - outcome) ** 2})
+
+    def ingest_predictions(self, df: pd.DataFrame) -> None:
+        """Add a frame of ``ml.predictions`` rows (id, score, label, created_at)"""
+        if df.empty:
+            return
+        buckets = self._buckets_of(df["created_at"])
+        labels = df["label"].fillna("—").astype(str).to_numpy()
+        ids = df["id"].to_numpy()
+        scores = pd.to_numeric(df["score"], errors="coerce").to_numpy(dtype=float)
+
+        with self._lock:
+            counts = pd.DataFrame({"bucket": buckets, "label": labels}).value_counts()
+            for bucket, per_label in _by_bucket(counts):
+                delta = {f"label:{label}": float(n) for label, n in per_label.items()}
+                delta["predictions"] = float(sum(per_label.values()))
+                self._add(bucket, delta)
+            for bucket, prediction_id, score in zip(buckets, ids, scores):
+                self._remember_score(int(bucket), prediction_id, score)
+
+    def ingest_feedback(self, df: pd.DataFrame) -> None:
+        """Add a frame of ``ml.feedback`` rows (prediction_id, correct, created_at)"""
+        if df.empty:
+            return
+        buckets = self._buckets_of(df["created_at"])
+        outcomes = df["correct"].fillna(False).astype(bool).to_numpy(dtype=float)
+        ids = df["prediction_id"].to_numpy()
+
+        with self._lock:
+            scores = pd.Series(ids).map(self._scores).to_numpy(dtype=float)
+            matched = ~np.isnan(scores)
+            terms = pd.DataFrame(
+                {
+                    "bucket": buckets,
+                    "feedback": 1.0,
+                    "correct": outcomes,
+                    "scored": matched.astype(float),
+                    "brier_sum": np.where(matched, (scores - outcomes) ** 2, 0.0),
+                }
+            )
+            for bucket, row in terms.groupby("bucket", sort=True).sum().iterrows():
+                self._add(int(bucket), {k: float(v) for k, v in row.items() if v})
+            for bucket, prediction_id, outcome in zip(
+                buckets[~matched], ids[~matched], outcomes[~matched]
+            ):
+                self._defer(int(bucket), prediction_id, outcome)
+
+    def advance(self, now: Optional[Timestamp] = None) -> None:
+        """Move the clock to ``now`` (default: current time) so idle windows expire"""
+        now = pd.Timestamp.now(tz="UTC") if now is None else pd.Timestamp(now)
+        with self._lock:
+            bucket = self._bucket(now)
+            if self._head is None or bucket > self._head:
+                self._advance_to(bucket)
+
+    def current(self, name: str) -> Dict:
+        """Current metrics of one window"""
+        with self._lock:
+            return _metrics(self._windows[name].totals)
+
+    def metrics_over(self, length: timedelta) -> Dict:
+        """Metrics of an ad-hoc window, summed from the retained buckets.
+
+        For lengths that change often, such as a dashboard slider. Nothing is
+        registered, so repeated calls with different lengths add no upkeep to
+        later events.
+        """
+        with self._lock:
+            if self._head is None:
+                return _metrics({})
+            start = self._head - min(self._n_buckets(length), self._retention) + 1
+            totals: Totals = {}
+            for bucket, bucket_totals in self._buckets.items():
+                if bucket >= start:
+                    _accumulate(totals, bucket_totals, 1)
+            return _metrics(totals)
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Current metrics of every window"""
+        with self._lock:
+            return {name: _metrics(window.totals) for name, window in self._windows.items()}
+
+    def history(self, name: str) -> pd.DataFrame:
+        """Window metrics at the end of every retained bucket.
+
+        Columns: ``timestamp``, ``predictions``, ``feedback``, ``accuracy``,
+        ``brier`` and one ``label_<LABEL>`` share column per label.
+        """
+        with self._lock:
+            if self._head is None:
+                return pd.DataFrame(
+                    columns=["timestamp", "predictions", "feedback", "accuracy", "brier"]
+                )
+            span = range(self._oldest, self._head + 1)
+            dense = (
+                pd.DataFrame.from_dict(self._buckets, orient="index")
+                .reindex(span)
+                .fillna(0.0)
+            )
+            rolled = dense.rolling(self._windows[name].buckets, min_periods=1).sum()
+
+        for column in ["predictions", "feedback", "correct", "scored", "brier_sum"]:
+            if column not in rolled:
+                rolled[column] = 0.0
+        with np.errstate(invalid="ignore", divide="ignore"):
+            history = pd.DataFrame(
+                {
+                    "timestamp": pd.to_datetime(
+                        (rolled.index.to_numpy() + 1) * self._resolution_ns, utc=True
+                    ),
+                    "predictions": rolled["predictions"].to_numpy(),
+                    "feedback": rolled["feedback"].to_numpy(),
+                    "accuracy": (rolled["correct"] / rolled["feedback"]).to_numpy(),
+                    "brier": (rolled["brier_sum"] / rolled["scored"]).to_numpy(),
+                }
+            )
+            for column in sorted(c for c in rolled.columns if c.startswith("label:")):
+                history[f"label_{column[6:]}"] = (rolled[column] / rolled["predictions"]).to_numpy()
+        return history
+
+    def _add(self, bucket: int, delta: Totals) -> None:
+        if self._head is None or bucket > self._head:
+            self._advance_to(bucket)
+        if bucket < self._oldest:
+            self.dropped += int(delta.get("predictions", 0) + delta.get("feedback", 0))
+            return
+        _accumulate(self._buckets.setdefault(bucket, {}), delta, 1)
+        for window in self._windows.values():
+            if bucket >= window.cursor:
+                _accumulate(window.totals, delta, 1)
+
+    def _advance_to(self, head: int) -> None:
+        if self._head is None:
+            self._head = head
+            self._oldest = head - self._retention + 1
+            for window in self._windows.values():
+                window.cursor = head - window.buckets + 1
+            return
+
+        self._head = head
+        for window in self._windows.values():
+            start = head - window.buckets + 1
+            if start - window.cursor >= window.buckets:
+                # Every counted bucket has left the window
+                window.totals = {}
+            else:
+                for bucket in range(window.cursor, start):
+                    if bucket in self._buckets:
+                        _accumulate(window.totals, self._buckets[bucket], -1)
+            window.cursor = max(window.cursor, start)
+
+        oldest = head - self._retention + 1
+        if oldest - self._oldest >= self._retention:
+            self._buckets.clear()
+        else:
+            for bucket in range(self._oldest, oldest):
+                self._buckets.pop(bucket, None)
+        self._oldest = max(self._oldest, oldest)
+        _expire(self._score_order, self._scores, self._oldest)
+        _expire(self._pending_order, self._pending, self._oldest)
+
+    def _remember_score(self, bucket: int, prediction_id, score: float) -> None:
+        if np.isnan(score):
+            return
+        self._scores[prediction_id] = score
+        self._score_order.append((bucket, prediction_id))
+        for feedback_bucket, outcome in self._pending.pop(prediction_id, []):
+            self._add(feedback_bucket, {"scored": 1, "brier_sum": (score - outcome) ** 2})
+
+    def _defer(self, bucket: int, prediction_id, outcome: float) -> None:
+        self._pending.setdefault(prediction_id, []).append((bucket, outcome))
+        self._pending_order.append((bucket, prediction_id))
+
+    def _n_buckets(self, length: timedelta) -> int:
+        return max(1, int(np.ceil(pd.Timedelta(length).value / self._resolution_ns)))
+
+    def _bucket(self, timestamp: pd.Timestamp) -> int:
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.tz_localize("UTC")
+        return int(timestamp.value // self._resolution_ns)
+
+    def _buckets_of(self, created_at: pd.Series) -> np.ndarray:
+        stamps = pd.to_datetime(created_at, utc=True, format="ISO8601").dt.as_unit("ns")
+        return stamps.astype("int64").to_numpy() // self._resolution_ns
+
+
+def _accumulate(totals: Totals, delta: Totals, sign: int) -> None:
+    for key, value in delta.items():
+        totals[key] = totals.get(key, 0.0) + sign * value
+
+
+def _expire(order: Deque[Tuple[int, Any]], entries: Dict, oldest: int) -> None:
+    """Drop entries first recorded in buckets that are no longer retained"""
+    while order and order[0][0] < oldest:
+        _, key = order.popleft()
+        entries.pop(key, None)
+
+
+def _by_bucket(counts: pd.Series):
+    """Yield ``(bucket, {label: count})`` from a (bucket, label) count series, oldest first"""
+    per_bucket: Dict[int, Dict[str, int]] = {}
+    for (bucket, label), n in counts.items():
+        per_bucket.setdefault(int(bucket), {})[label] = int(n)
+    return sorted(per_bucket.items())
+
+
+def _metrics(totals: Totals) -> Dict:
+    predictions = totals.get("predictions", 0.0)
+    feedback = totals.get("feedback", 0.0)
+    scored = totals.get("scored", 0.0)
+    label_mix = {
+        key[6:]: value / predictions
+        for key, value in sorted(totals.items())
+        if key.startswith("label:") and predictions > 0 and value > 0
+    }
+    return {
+        "predictions": int(round(predictions)),
+        "feedback": int(round(feedback)),
+        "accuracy": float(totals.get("correct", 0.0) / feedback) if feedback > 0 else float("nan"),
+        "brier": float(totals.get("brier_sum", 0.0) / scored) if scored > 0 else float("nan"),
+        "label_mix": label_mix,
+    }
@@ -0,0 +1,451 @@
+"""
+ABACO Portfolio Aggregates
+Mergeable partial-aggregate states for out-of-core and multi-process analytics
+
+Every state here can be updated from a DataFrame chunk and merged with a state
+built from another chunk, shard or worker process. Merging is associative, so
+the order in which partial states are combined does not matter beyond
+floating-point rounding. States can also ``subtract`` a part that was merged
+earlier, which is how deleted and updated customers are backed out.
+"""
+
+import math
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Columns summarised by count/sum/M2/min/max moments
+MOMENT_COLUMNS = [
+    "account_balance",
+    "credit_limit",
+    "loan_amount",
+    "credit_score",
+    "utilization_ratio",
+    "risk_score",
+    "profit_potential",
+    "lifetime_value",
+]
+
+# Columns whose quantiles (median, top decile) need a sketch
+SKETCH_COLUMNS = ["account_balance", "risk_score", "lifetime_value"]
+
+CATEGORY_COLUMNS = ["risk_category", "account_type"]
+
+# Threshold screens from FinancialAnalyzer.risk_analysis: (column, op, threshold)
+INDICATORS = {
+    "high_utilization_count": ("utilization_ratio", ">", 0.8),
+    "high_debt_income_count": ("debt_to_income", ">", 0.4),
+    "low_credit_score_count": ("credit_score", "<", 600),
+}
+
+
+class ColumnMoments:
+    """Count, sum, centred sum of squares (M2), min and max of one column.
+
+    M2 is merged with Chan's parallel formula, which stays numerically stable
+    where a raw sum of squares would cancel.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.m2 = 0.0
+        self.minimum = math.inf
+        self.maximum = -math.inf
+
+    def update(self, values: np.ndarray) -> "ColumnMoments":
+        """Fold a batch of values into the state"""
+        if len(values) == 0:
+            return self
+        values = np.asarray(values, dtype=np.float64)
+        batch = ColumnMoments()
+        batch.count = len(values)
+        batch.total = float(values.sum())
+        deviations = values - batch.total / batch.count
+        batch.m2 = float(np.dot(deviations, deviations))
+        batch.minimum = float(values.min())
+        batch.maximum = float(values.max())
+        return self.merge(batch)
+
+    def merge(self, other: "ColumnMoments") -> "ColumnMoments":
+        """Combine with another state in place"""
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self.count, self.total, self.m2 = other.count, other.total, other.m2
+            self.minimum, self.maximum = other.minimum, other.maximum
+            return self
+
+        count = self.count + other.count
+        delta = other.total / other.count - self.total / self.count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.total += other.total
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+        return self
+
+    def subtract(self, other: "ColumnMoments") -> "ColumnMoments":
+        """Remove a previously merged part in place (inverse of ``merge``).
+
+        Min and max cannot be inverted and are left unchanged; callers that
+        remove an extreme value must recompute them.
+        """
+        if other.count == 0:
+            return self
+        count = self.count - other.count
+        if count < 0:
+            raise ValueError("Cannot subtract more values than the state holds")
+        if count == 0:
+            self.count, self.total, self.m2 = 0, 0.0, 0.0
+            self.minimum, self.maximum = math.inf, -math.inf
+            return self
+
+        total = self.total - other.total
+        delta = other.total / other.count - total / count
+        self.m2 = max(self.m2 - other.m2 - delta * delta * count * other.count / self.count, 0.0)
+        self.count = count
+        self.total = total
+        return self
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else float("nan")
+
+    @property
+    def std(self) -> float:
+        """Sample standard deviation (ddof=1), matching ``Series.std``"""
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else float("nan")
+
+
+class _BucketStore:
+    """Dense bucket counts indexed by integer key, with an offset"""
+
+    def __init__(self, max_buckets: int):
+        self.max_buckets = max_buckets
+        self.offset = 0
+        self.counts = np.zeros(0, dtype=np.int64)
+
+    @property
+    def total(self) -> int:
+        return int(self.counts.sum())
+
+    def add(self, keys: np.ndarray, counts: Optional[np.ndarray] = None) -> None:
+        if len(keys) == 0:
+            return
+        lo, hi = int(keys.min()), int(keys.max())
+        self._extend(lo, hi)
+        self.counts += np.bincount(
+            keys - self.offset, weights=counts, minlength=len(self.counts)
+        ).astype(np.int64)
+        self._collapse()
+
+    def merge(self, other: "_BucketStore") -> None:
+        nonzero = np.flatnonzero(other.counts)
+        self.add(nonzero + other.offset, other.counts[nonzero])
+
+    def subtract(self, other: "_BucketStore") -> None:
+        nonzero = np.flatnonzero(other.counts)
+        if len(nonzero) == 0:
+            return
+        # Keys below the offset were folded into the lowest bucket when collapsing
+        positions = np.maximum(nonzero + other.offset - self.offset, 0)
+        if len(self.counts) == 0 or positions.max() >= len(self.counts):
+            raise ValueError("Cannot subtract buckets the store does not hold")
+        self.counts -= np.bincount(
+            positions, weights=other.counts[nonzero], minlength=len(self.counts)
+        ).astype(np.int64)
+        if (self.counts < 0).any():
+            raise ValueError("Cannot subtract more values than the store holds")
+
+    def keys(self) -> np.ndarray:
+        return np.arange(self.offset, self.offset + len(self.counts))
+
+    def _extend(self, lo: int, hi: int) -> None:
+        if len(self.counts) == 0:
+            self.offset = lo
+            self.counts = np.zeros(hi - lo + 1, dtype=np.int64)
+            return
+        new_lo = min(lo, self.offset)
+        new_hi = max(hi, self.offset + len(self.counts) - 1)
+        if new_lo == self.offset and new_hi == self.offset + len(self.counts) - 1:
+            return
+        counts = np.zeros(new_hi - new_lo + 1, dtype=np.int64)
+        start = self.offset - new_lo
+        counts[start : start + len(self.counts)] = self.counts
+        self.offset, self.counts = new_lo, counts
+
+    def _collapse(self) -> None:
+        """Fold the lowest keys into one bucket once the width exceeds the cap"""
+        excess = len(self.counts) - self.max_buckets
+        if excess <= 0:
+            return
+        self.counts[excess] += self.counts[:excess].sum()
+        self.counts = self.counts[excess:].copy()
+        self.offset += excess
+
+
+class QuantileSketch:
+    """Mergeable quantile sketch with a relative-error guarantee (DDSketch).
+
+    Values are counted in logarithmic buckets of ratio
+    ``gamma = (1 + a) / (1 - a)`` where ``a`` is ``relative_accuracy``. Any
+    quantile estimate ``v`` of a true value ``x`` satisfies
+    ``|v - x| <= a * |x|``, and ``top_sum`` is within the same relative error
+    of the exact sum. Memory is at most ``max_buckets`` counters per sign; if
+    the value range needs more, the smallest magnitudes are merged together
+    and lose the guarantee first (the default cap covers ~40 orders of
+    magnitude at 0.5% accuracy). Merging two sketches is exact.
+    """
+
+    def __init__(
+        self,
+        relative_accuracy: float = 0.005,
+        max_buckets: int = 4096,
+        min_indexable: float = 1e-9,
+    ):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1")
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.min_indexable = min_indexable
+        self.positive = _BucketStore(max_buckets)
+        self.negative = _BucketStore(max_buckets)
+        self.zero_count = 0
+        self.minimum = math.inf
+        self.maximum = -math.inf
+
+    @property
+    def count(self) -> int:
+        return self.positive.total + self.negative.total + self.zero_count
+
+    def update(self, values: np.ndarray) -> "QuantileSketch":
+        """Add a batch of values"""
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) == 0:
+            return self
+        self.minimum = min(self.minimum, float(values.min()))
+        self.maximum = max(self.maximum, float(values.max()))
+
+        magnitude = np.abs(values)
+        indexable = magnitude > self.min_indexable
+        self.zero_count += int(len(values) - np.count_nonzero(indexable))
+        keys = self._key(magnitude[indexable])
+        positive = values[indexable] > 0
+        self.positive.add(keys[positive])
+        self.negative.add(keys[~positive])
+        return self
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        """Combine with a sketch built with the same relative accuracy"""
+        if not math.isclose(self.gamma, other.gamma):
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        self.positive.merge(other.positive)
+        self.negative.merge(other.negative)
+        self.zero_count += other.zero_count
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+        return self
+
+    def subtract(self, other: "QuantileSketch") -> "QuantileSketch":
+        """Remove a previously merged sketch in place (inverse of ``merge``).
+
+        Counts are exact after subtraction; ``minimum``/``maximum`` stay as
+        outer bounds and only loosen the final clamp on estimates.
+        """
+        if not math.isclose(self.gamma, other.gamma):
+            raise ValueError("Cannot subtract sketches with different relative accuracy")
+        self.positive.subtract(other.positive)
+        self.negative.subtract(other.negative)
+        self.zero_count -= other.zero_count
+        return self
+
+    def quantile(self, q: float) -> float:
+        """Estimate the ``q`` quantile, interpolating ranks like ``np.median`` does"""
+        n = self.count
+        if n == 0:
+            return float("nan")
+        values, counts = self._ascending()
+        cumulative = np.cumsum(counts)
+
+        rank = q * (n - 1)
+        lower, upper = math.floor(rank), math.ceil(rank)
+        low_value = values[np.searchsorted(cumulative, lower, side="right")]
+        high_value = values[np.searchsorted(cumulative, upper, side="right")]
+        estimate = low_value + (high_value - low_value) * (rank - lower)
+        return float(min(max(estimate, self.minimum), self.maximum))
+
+    def top_sum(self, k: int) -> float:
+        """Estimate the sum of the ``k`` largest values"""
+        if k <= 0 or self.count == 0:
+            return 0.0
+        values, counts = self._ascending()
+        values, counts = values[::-1], counts[::-1]
+        taken = np.minimum(counts, np.maximum(k - (np.cumsum(counts) - counts), 0))
+        return float(np.dot(values, taken))
+
+    def _key(self, magnitude: np.ndarray) -> np.ndarray:
+        return np.ceil(np.log(magnitude) / self._log_gamma).astype(np.int64)
+
+    def _value(self, keys: np.ndarray) -> np.ndarray:
+        """Bucket representative: the point with equal relative error to both edges"""
+        return 2 * np.power(self.gamma, keys.astype(np.float64)) / (self.gamma + 1)
+
+    def _ascending(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Representative values and counts of all non-empty buckets, ascending"""
+        parts_values: List[np.ndarray] = []
+        parts_counts: List[np.ndarray] = []
+
+        negative_keys = self.negative.keys()[::-1]
+        parts_values.append(-self._value(negative_keys))
+        parts_counts.append(self.negative.counts[::-1])
+        parts_values.append(np.zeros(1))
+        parts_counts.append(np.array([self.zero_count]))
+        parts_values.append(self._value(self.positive.keys()))
+        parts_counts.append(self.positive.counts)
+
+        values = np.concatenate(parts_values)
+        counts = np.concatenate(parts_counts)
+        nonzero = counts > 0
+        return values[nonzero], counts[nonzero]
+
+
+class PortfolioAggregate:
+    """Partial-aggregate state behind the ``FinancialAnalyzer`` metrics.
+
+    Build one per chunk or shard with ``update``, combine with ``merge`` (also
+    across processes, the state pickles cleanly) and call ``result`` for the
+    ``analyze_all`` dict shape. Medians and the top-10% lifetime value come
+    from ``QuantileSketch`` and are accurate to ``relative_accuracy``; all
+    other figures are exact.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.005):
+        self.relative_accuracy = relative_accuracy
+        self.moments = {column: ColumnMoments() for column in MOMENT_COLUMNS}
+        self.sketches = {column: QuantileSketch(relative_accuracy) for column in SKETCH_COLUMNS}
+        self.category_counts: Dict[str, Dict[str, int]] = {c: {} for c in CATEGORY_COLUMNS}
+        self.category_profit: Dict[str, Dict[str, float]] = {c: {} for c in CATEGORY_COLUMNS}
+        self.indicator_counts = {name: 0 for name in INDICATORS}
+
+    @property
+    def count(self) -> int:
+        return self.moments["account_balance"].count
+
+    def update(self, df: pd.DataFrame) -> "PortfolioAggregate":
+        """Fold a chunk of customer rows into the state"""
+        for column, moments in self.moments.items():
+            moments.update(df[column].to_numpy())
+        for column, sketch in self.sketches.items():
+            sketch.update(df[column].to_numpy())
+
+        profit = df["profit_potential"].to_numpy()
+        for column in CATEGORY_COLUMNS:
+            codes, labels = pd.factorize(df[column])
+            counts = np.bincount(codes, minlength=len(labels))
+            sums = np.bincount(codes, weights=profit, minlength=len(labels))
+            for label, count, total in zip(labels, counts, sums):
+                if count:
+                    _add(self.category_counts[column], label, int(count))
+                    _add(self.category_profit[column], label, float(total))
+
+        for name, (column, op, threshold) in INDICATORS.items():
+            values = df[column].to_numpy()
+            hits = values > threshold if op == ">" else values < threshold
+            self.indicator_counts[name] += int(np.count_nonzero(hits))
+        return self
+
+    def merge(self, other: "PortfolioAggregate") -> "PortfolioAggregate":
+        """Combine with the state of another chunk or shard in place"""
+        for column, moments in self.moments.items():
+            moments.merge(other.moments[column])
+        for column, sketch in self.sketches.items():
+            sketch.merge(other.sketches[column])
+        for column in CATEGORY_COLUMNS:
+            for label, count in other.category_counts[column].items():
+                _add(self.category_counts[column], label, count)
+            for label, total in other.category_profit[column].items():
+                _add(self.category_profit[column], label, total)
+        for name, count in other.indicator_counts.items():
+            self.indicator_counts[name] += count
+        return self
+
+    def subtract(self, other: "PortfolioAggregate") -> "PortfolioAggregate":
+        """Remove the state of rows that were merged earlier (inverse of ``merge``)"""
+        for column, moments in self.moments.items():
+            moments.subtract(other.moments[column])
+        for column, sketch in self.sketches.items():
+            sketch.subtract(other.sketches[column])
+        for column in CATEGORY_COLUMNS:
+            counts = self.category_counts[column]
+            profit = self.category_profit[column]
+            for label, count in other.category_counts[column].items():
+                counts[label] -= count
+                profit[label] -= other.category_profit[column][label]
+                if counts[label] == 0:
+                    del counts[label], profit[label]
+        for name, count in other.indicator_counts.items():
+            self.indicator_counts[name] -= count
+        return self
+
+    def result(self) -> Dict:
+        """Metrics in the shape returned by ``FinancialAnalyzer.analyze_all``"""
+        n = self.count
+        m = self.moments
+        risk_counts = self.category_counts["risk_category"]
+        profit = m["profit_potential"]
+        return {
+            "portfolio_metrics": {
+                "total_customers": n,
+                "total_assets": m["account_balance"].total,
+                "average_balance": m["account_balance"].mean,
+                "median_balance": self.sketches["account_balance"].quantile(0.5),
+                "total_credit_exposure": m["credit_limit"].total,
+                "total_outstanding_loans": m["loan_amount"].total,
+                "average_credit_score": m["credit_score"].mean,
+                "high_risk_customers": risk_counts.get("High", 0),
+                "average_utilization": m["utilization_ratio"].mean,
+                "total_lifetime_value": m["lifetime_value"].total,
+            },
+            "risk_analysis": {
+                "risk_distribution": {
+                    label: count / n
+                    for label, count in sorted(risk_counts.items(), key=lambda item: -item[1])
+                },
+                "high_risk_indicators": dict(self.indicator_counts),
+                "risk_score_stats": {
+                    "mean": m["risk_score"].mean,
+                    "median": self.sketches["risk_score"].quantile(0.5),
+                    "std": m["risk_score"].std,
+                    "min": m["risk_score"].minimum if n else float("nan"),
+                    "max": m["risk_score"].maximum if n else float("nan"),
+                },
+            },
+            "profitability_analysis": {
+                "total_profit_potential": profit.total,
+                "average_profit_per_customer": profit.mean,
+                "top_10_percent_customers": self.sketches["lifetime_value"].top_sum(int(n * 0.1)),
+                "profit_by_account_type": dict(
+                    sorted(self.category_profit["account_type"].items())
+                ),
+                "profit_by_risk_category": dict(
+                    sorted(self.category_profit["risk_category"].items())
+                ),
+            },
+        }
+
+    @classmethod
+    def from_chunks(
+        cls, chunks: Iterable[pd.DataFrame], relative_accuracy: float = 0.005
+    ) -> "PortfolioAggregate":
+        """Build one state from an iterable of chunks (e.g. ``iter_customer_data``)"""
+        state = cls(relative_accuracy)
+        for chunk in chunks:
+            state.update(chunk)
+        return state
+
+
+def _add(tally: Dict, key, amount) -> None:
+    tally[key] = tally.get(key, 0) + amount
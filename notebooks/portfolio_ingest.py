@@ -0,0 +1,460 @@
+"""
+ABACO Portfolio Ingestion
+Typed, chunked loading of client portfolio files into the compact analyzer schema
+
+CSV (optionally compressed), Excel and Parquet files are read in chunks and
+every declared column in ``PORTFOLIO_SCHEMA`` is coerced straight to its
+``COMPACT_DTYPES`` type, so a chunk never exists as a full-width object frame.
+CSV parsing uses PyArrow's multi-threaded streaming reader, Parquet is read
+batch by batch from a memory map, and chunks are coerced on a thread pool
+while the next ones are read. Numeric columns take a vectorized Arrow cast
+and only fall back to element-wise parsing when a chunk holds bad values.
+
+Rows with a missing required value, an unparsable number, an out-of-range
+integer or an unknown category go to a reject CSV with their 0-based data
+row and the reason, instead of failing the load. Derived metrics absent
+from the file (``lifetime_value`` in ``financial_analysis_results.csv``,
+for example) are filled through ``_calculate_financial_metrics``; derived
+columns the file does carry are kept as exported.
+"""
+
+import csv
+import gzip
+import logging
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from financial_utils import COMPACT_DTYPES, FinancialDataGenerator
+from instrumentation import instrumented
+
+logger = logging.getLogger(__name__)
+
+# Declared file schema: the analyzer's compact columns plus known export extras
+PORTFOLIO_SCHEMA = {
+    **COMPACT_DTYPES,
+    "profit_margin": np.float32,
+}
+
+# Columns a row cannot be analyzed without
+REQUIRED_COLUMNS = [
+    "customer_id",
+    "account_balance",
+    "credit_limit",
+    "monthly_spending",
+    "credit_score",
+    "account_type",
+    "risk_category",
+    "years_with_bank",
+    "monthly_income",
+    "loan_amount",
+    "payment_history_score",
+]
+
+# Columns produced by FinancialDataGenerator._calculate_financial_metrics
+DERIVED_COLUMNS = [
+    "utilization_ratio",
+    "debt_to_income",
+    "risk_score",
+    "profit_potential",
+    "lifetime_value",
+]
+
+CUSTOMER_ID_PREFIX = "CUST_"
+
+CSV_SUFFIXES = {".csv", ".txt"}
+EXCEL_SUFFIXES = {".xlsx", ".xlsm"}
+PARQUET_SUFFIXES = {".parquet", ".pq"}
+
+
+@instrumented("load_portfolio")
+def load_portfolio(
+    path: Union[str, Path],
+    reject_path: Optional[Union[str, Path]] = None,
+    chunk_rows: int = 250_000,
+    max_workers: Optional[int] = None,
+) -> pd.DataFrame:
+    """Load a portfolio file into one compact, analyzer-ready DataFrame.
+
+    The result is indexed by 0-based data row, so rejected rows leave gaps.
+    ``df.attrs["ingest"]`` records the source, row counts and reject file.
+    Chunks are held as Arrow tables and converted once at the end, releasing
+    each column as it is converted, so the whole portfolio is never held
+    twice. Use ``iter_portfolio`` to process files larger than memory.
+    """
+    import pyarrow as pa
+
+    try:
+        stats: Dict = {}
+        tables, rows = [], []
+        for chunk in iter_portfolio(path, reject_path, chunk_rows, max_workers, stats):
+            tables.append(pa.Table.from_pandas(chunk, preserve_index=False))
+            rows.append(chunk.index.to_numpy())
+        if tables:
+            table = pa.concat_tables(tables)
+            tables.clear()
+            df = table.to_pandas(split_blocks=True, self_destruct=True)
+            del table
+            if stats["rows_rejected"]:
+                df.index = pd.Index(np.concatenate(rows))
+        else:
+            df = _empty_frame()
+        df.attrs["ingest"] = stats
+
+        logger.info(
+            f"✅ Loaded {stats['rows_loaded']:,} of {stats['rows_read']:,} rows from {path}"
+        )
+        if stats["rows_rejected"]:
+            logger.warning(
+                f"⚠️ {stats['rows_rejected']:,} rows rejected, see {stats['reject_path']}"
+            )
+        return df
+
+    except Exception as e:
+        logger.error(f"❌ Error loading portfolio file {path}: {e}")
+        raise
+
+
+def iter_portfolio(
+    path: Union[str, Path],
+    reject_path: Optional[Union[str, Path]] = None,
+    chunk_rows: int = 250_000,
+    max_workers: Optional[int] = None,
+    stats: Optional[Dict] = None,
+) -> Iterator[pd.DataFrame]:
+    """Stream a portfolio file as coerced chunks, in file order.
+
+    Rejected rows are appended to ``reject_path`` (default: ``<file>.rejects.csv``
+    next to the source), which is only created when there is something to
+    reject. Pass a dict as ``stats`` to receive the row counts when the
+    iterator is exhausted.
+    """
+    path = Path(path)
+    reject_path = Path(reject_path) if reject_path else _default_reject_path(path)
+    stats = {} if stats is None else stats
+    stats.update(
+        source=str(path), rows_read=0, rows_loaded=0, rows_rejected=0, reject_path=None
+    )
+    rejects = _RejectWriter(reject_path)
+    if reject_path.exists():
+        reject_path.unlink()
+
+    reader = _reader_for(path)
+    max_workers = max_workers or min(8, os.cpu_count() or 1)
+    generator = FinancialDataGenerator()
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            # Bounded read-ahead keeps at most a few raw chunks in memory
+            pending = deque()
+            for rows, table in reader(path, chunk_rows, rejects):
+                pending.append(pool.submit(_coerce, table, rows, generator))
+                if len(pending) > max_workers:
+                    yield _collect(pending.popleft().result(), stats, rejects)
+            while pending:
+                yield _collect(pending.popleft().result(), stats, rejects)
+    finally:
+        rejects.close()
+        stats["rows_rejected"] += rejects.malformed
+        stats["rows_read"] += rejects.malformed
+        stats["reject_path"] = str(reject_path) if rejects.rows else None
+
+
+def _collect(
+    coerced: Tuple[pd.DataFrame, pd.DataFrame], stats: Dict, rejects: "_RejectWriter"
+) -> pd.DataFrame:
+    good, bad = coerced
+    stats["rows_read"] += len(good) + len(bad)
+    stats["rows_loaded"] += len(good)
+    stats["rows_rejected"] += len(bad)
+    rejects.write(bad)
+    return good
+
+
+def _reader_for(path: Path):
+    suffixes = {s.lower() for s in path.suffixes}
+    if suffixes & CSV_SUFFIXES:
+        return _read_csv
+    if suffixes & EXCEL_SUFFIXES:
+        return _read_excel
+    if suffixes & PARQUET_SUFFIXES:
+        return _read_parquet
+    raise ValueError(f"Unsupported portfolio file type: {path.name}")
+
+
+def _read_csv(path: Path, chunk_rows: int, rejects: "_RejectWriter"):
+    """Yield ``(data rows, pyarrow.Table)`` string chunks from a CSV file"""
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+
+    opener = gzip.open if path.suffix.lower() == ".gz" else open
+    with opener(path, "rt", newline="", encoding="utf-8-sig") as f:
+        header = next(csv.reader(f), [])
+    names = [_normalize_name(name) for name in header]
+    _check_required(names, path)
+
+    # Everything is read as strings and coerced per chunk, so one bad value
+    # rejects its row instead of aborting the parse
+    read_options = pacsv.ReadOptions(
+        column_names=names, skip_rows=1, block_size=1 << 24, use_threads=True
+    )
+    convert_options = pacsv.ConvertOptions(
+        column_types={name: pa.string() for name in names},
+        include_columns=[name for name in names if name in PORTFOLIO_SCHEMA],
+        strings_can_be_null=True,
+    )
+    parse_options = pacsv.ParseOptions(invalid_row_handler=rejects.malformed_row)
+
+    first_row = 0
+    buffered: List = []
+    rows = 0
+    with pacsv.open_csv(str(path), read_options, parse_options, convert_options) as reader:
+        for batch in reader:
+            buffered.append(batch)
+            rows += batch.num_rows
+            if rows >= chunk_rows:
+                yield rejects.data_rows(first_row, rows), pa.Table.from_batches(buffered)
+                first_row += rows
+                buffered, rows = [], 0
+    if rows:
+        yield rejects.data_rows(first_row, rows), pa.Table.from_batches(buffered)
+
+
+def _read_excel(path: Path, chunk_rows: int, rejects: "_RejectWriter"):
+    """Yield ``(data rows, pyarrow.Table)`` string chunks from the first worksheet"""
+    import openpyxl
+    import pyarrow as pa
+
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        names = [_normalize_name(str(name)) for name in next(rows, ())]
+        _check_required(names, path)
+        keep = [i for i, name in enumerate(names) if name in PORTFOLIO_SCHEMA]
+
+        first_row = 0
+        buffered: List[tuple] = []
+        for row in rows:
+            buffered.append(row)
+            if len(buffered) >= chunk_rows:
+                yield _row_range(first_row, len(buffered)), _excel_table(pa, names, keep, buffered)
+                first_row += len(buffered)
+                buffered = []
+        if buffered:
+            yield _row_range(first_row, len(buffered)), _excel_table(pa, names, keep, buffered)
+    finally:
+        workbook.close()
+
+
+def _excel_table(pa, names: List[str], keep: List[int], rows: List[tuple]):
+    columns = {}
+    for i in keep:
+        values = [row[i] if i < len(row) else None for row in rows]
+        columns[names[i]] = pa.array(
+            [None if v is None or v == "" else str(v) for v in values], type=pa.string()
+        )
+    return pa.table(columns)
+
+
+def _read_parquet(path: Path, chunk_rows: int, rejects: "_RejectWriter"):
+    """Yield ``(data rows, pyarrow.Table)`` typed chunks from a Parquet file"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    parquet = pq.ParquetFile(path, memory_map=True)
+    names = parquet.schema_arrow.names
+    _check_required([_normalize_name(name) for name in names], path)
+    columns = [name for name in names if _normalize_name(name) in PORTFOLIO_SCHEMA]
+
+    first_row = 0
+    for batch in parquet.iter_batches(batch_size=chunk_rows, columns=columns, use_threads=True):
+        table = pa.Table.from_batches([batch])
+        table = table.rename_columns([_normalize_name(name) for name in table.column_names])
+        yield _row_range(first_row, batch.num_rows), table
+        first_row += batch.num_rows
+
+
+def _coerce(table, rows: np.ndarray, generator: FinancialDataGenerator):
+    """Split one raw chunk into compact rows and reject rows with reasons.
+
+    ``rows`` holds the 0-based data row of each table row in the source file.
+    """
+    import pyarrow as pa
+
+    n = table.num_rows
+    reasons = np.full(n, "", dtype=object)
+    values: Dict[str, np.ndarray] = {}
+
+    for name, dtype in PORTFOLIO_SCHEMA.items():
+        if name not in table.column_names:
+            continue
+        column, invalid, missing = _coerce_column(name, table.column(name), dtype)
+        if name in REQUIRED_COLUMNS:
+            reasons[(reasons == "") & missing] = f"missing {name}"
+        reasons[(reasons == "") & invalid] = f"invalid {name}"
+        values[name] = column
+
+    keep = reasons == ""
+    good = pd.DataFrame(
+        {name: _take(column, keep, PORTFOLIO_SCHEMA[name]) for name, column in values.items()},
+        index=pd.Index(rows[keep]),
+    )
+    if any(name not in good.columns for name in DERIVED_COLUMNS):
+        good = _fill_derived(good, generator)
+
+    bad = pd.DataFrame()
+    if not keep.all():
+        bad = table.filter(pa.array(~keep)).to_pandas()
+        bad.insert(0, "row", rows[~keep])
+        bad.insert(1, "reject_reason", reasons[~keep])
+    return good, bad
+
+
+def _coerce_column(name: str, column, dtype) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Values (codes for categoricals), invalid-value mask and null mask of one column"""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    missing = column.is_null().to_numpy(zero_copy_only=False)
+    if isinstance(dtype, pd.CategoricalDtype):
+        labels = pc.utf8_trim_whitespace(column.cast(pa.string())).to_pandas()
+        codes = pd.Categorical(labels, dtype=dtype).codes
+        return codes, (codes < 0) & ~missing, missing
+
+    try:
+        numbers = pc.cast(column, pa.float64()).to_numpy(zero_copy_only=False)
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+        text = column.cast(pa.string()).to_pandas().str.strip()
+        if name == "customer_id":
+            text = text.str.removeprefix(CUSTOMER_ID_PREFIX)
+        numbers = pd.to_numeric(text, errors="coerce").to_numpy(dtype=np.float64)
+    numbers = np.where(missing, np.nan, numbers)
+    invalid = np.isnan(numbers) & ~missing
+
+    if np.issubdtype(np.dtype(dtype), np.integer):
+        info = np.iinfo(dtype)
+        with np.errstate(invalid="ignore"):
+            invalid |= ~missing & (
+                (numbers != np.round(numbers)) | (numbers < info.min) | (numbers > info.max)
+            )
+        # Ints cannot hold NaN; rows with missing or invalid ints are rejected
+        invalid |= missing
+        numbers = np.where(invalid, 0, numbers)
+    return numbers.astype(dtype), invalid, missing
+
+
+def _take(column: np.ndarray, keep: np.ndarray, dtype):
+    if isinstance(dtype, pd.CategoricalDtype):
+        return pd.Categorical.from_codes(column[keep], dtype=dtype)
+    return column[keep]
+
+
+def _fill_derived(df: pd.DataFrame, generator: FinancialDataGenerator) -> pd.DataFrame:
+    """Add missing derived columns, computed from the base columns only"""
+    inputs = [
+        "monthly_spending",
+        "credit_limit",
+        "loan_amount",
+        "monthly_income",
+        "payment_history_score",
+        "account_balance",
+        "years_with_bank",
+    ]
+    derived = generator._calculate_financial_metrics(df[inputs].astype(np.float64))
+    for name in DERIVED_COLUMNS:
+        if name not in df.columns:
+            df[name] = derived[name].astype(COMPACT_DTYPES[name])
+    return df
+
+
+class _RejectWriter:
+    """Appends rejected rows to a CSV, created on first use; thread-safe"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.rows = 0
+        self.malformed = 0
+        self._columns: Optional[List[str]] = None
+        self._lock = threading.Lock()
+        self._pending_malformed: List[Dict] = []
+        self._malformed_rows: List[int] = []
+
+    def write(self, rows: pd.DataFrame) -> None:
+        if rows.empty:
+            return
+        with self._lock:
+            if self._columns is None:
+                self._columns = list(rows.columns)
+                rows.to_csv(self.path, index=False)
+            else:
+                rows.reindex(columns=self._columns).to_csv(
+                    self.path, mode="a", header=False, index=False
+                )
+            self.rows += len(rows)
+
+    def malformed_row(self, row) -> str:
+        """PyArrow ``invalid_row_handler``: record a row with the wrong field count"""
+        with self._lock:
+            self.malformed += 1
+            # row.number is the 1-based file line (header included) when known
+            line = row.number if row.number is not None and row.number > 0 else None
+            if line is not None:
+                self._malformed_rows.append(line - 2)
+            self._pending_malformed.append(
+                {
+                    "row": line - 2 if line is not None else None,
+                    "reject_reason": f"malformed row: {row.text[:200]}",
+                }
+            )
+        return "skip"
+
+    def data_rows(self, first: int, n: int) -> np.ndarray:
+        """0-based data rows of ``n`` parsed rows, starting at parsed row ``first``.
+
+        PyArrow drops malformed rows from its batches, so each parsed row is
+        shifted by the number of malformed rows before it. The parser has seen
+        every malformed row up to the end of a batch before yielding the batch.
+        """
+        parsed = _row_range(first, n)
+        with self._lock:
+            skipped = np.sort(np.array(self._malformed_rows, dtype=np.int64))
+        if len(skipped) == 0:
+            return parsed
+        # Number of parsed rows that come before each malformed row
+        before = skipped - np.arange(len(skipped))
+        return parsed + np.searchsorted(before, parsed, side="right")
+
+    def close(self) -> None:
+        if self._pending_malformed:
+            self.write(pd.DataFrame(self._pending_malformed))
+            self._pending_malformed = []
+
+
+def _row_range(first: int, n: int) -> np.ndarray:
+    return np.arange(first, first + n, dtype=np.int64)
+
+
+def _check_required(names: List[str], path: Path) -> None:
+    missing = [name for name in REQUIRED_COLUMNS if name not in names]
+    if missing:
+        raise ValueError(f"{path.name} is missing required columns: {missing}")
+
+
+def _normalize_name(name: str) -> str:
+    return name.strip().lower().replace(" ", "_")
+
+
+def _default_reject_path(path: Path) -> Path:
+    stem = path.name
+    for suffix in reversed(path.suffixes):
+        stem = stem[: -len(suffix)]
+    return path.with_name(f"{stem}.rejects.csv")
+
+
+def _empty_frame() -> pd.DataFrame:
+    return pd.DataFrame({name: pd.Series(dtype=dtype) for name, dtype in COMPACT_DTYPES.items()})
@@ -0,0 +1,304 @@
+"""
+ABACO Score Drift
+Prediction score drift detection from mergeable fixed-bin histograms
+
+``ScoreHistogram`` counts prediction scores into fixed equal-width bins on
+[0, 1], one count vector per ``model_version`` and time bucket. Updating is a
+single ``np.bincount`` per batch, two histograms merge by adding counts, and
+memory depends only on versions x retained buckets x bins, never on the number
+of predictions.
+
+``drift_report`` and ``drift_timeline`` compare a window against a baseline
+window using PSI, the Kolmogorov-Smirnov statistic and the Jensen-Shannon
+distance, all computed on the binned distributions and vectorized over rows.
+KS on binned data only sees differences at bin edges, so it is a lower bound on
+the KS statistic of the raw scores.
+
+A histogram is shared across dashboard sessions and fed from data-access worker
+threads, so updates and reads hold its ``RLock``; the report functions hold it
+across all their reads to see one consistent state.
+"""
+
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+Timestamp = Union[str, datetime, pd.Timestamp]
+Window = Tuple[Optional[Timestamp], Optional[Timestamp]]
+
+# Added to every bin share before PSI so empty bins stay finite
+PSI_EPS = 1e-4
+
+
+@dataclass(frozen=True)
+class DriftThresholds:
+    """Distances above which a window is flagged; windows with fewer scores are not judged"""
+
+    psi: float = 0.2
+    ks: float = 0.1
+    js: float = 0.1
+    min_count: int = 500
+
+
+class ScoreHistogram:
+    """Fixed-bin score counts per model version and time bucket"""
+
+    def __init__(
+        self,
+        n_bins: int = 20,
+        resolution: timedelta = timedelta(hours=1),
+        retention: Optional[timedelta] = timedelta(days=90),
+    ):
+        self.n_bins = n_bins
+        self.edges = np.linspace(0.0, 1.0, n_bins + 1)
+        self.resolution = resolution
+        self._resolution_ns = pd.Timedelta(resolution).value
+        self._retention = None
+        if retention is not None:
+            self._retention = int(np.ceil(pd.Timedelta(retention).value / self._resolution_ns))
+        self._counts: Dict[Tuple[str, int], np.ndarray] = {}
+        self._head: Optional[int] = None
+        self._lock = threading.RLock()
+
+    def update(
+        self,
+        df: pd.DataFrame,
+        score_column: str = "score",
+        version_column: str = "model_version",
+        time_column: str = "created_at",
+    ) -> None:
+        """Add a frame of predictions; rows without a score are skipped"""
+        if df.empty:
+            return
+        scores = pd.to_numeric(df[score_column], errors="coerce").to_numpy(dtype=float)
+        valid = ~np.isnan(scores)
+        if not valid.any():
+            return
+
+        bins = np.clip((scores[valid] * self.n_bins).astype(np.int64), 0, self.n_bins - 1)
+        stamps = pd.to_datetime(df[time_column], utc=True, format="ISO8601").dt.as_unit("ns")
+        buckets = stamps.astype("int64").to_numpy()[valid] // self._resolution_ns
+        versions = df[version_column].fillna("—").astype(str).to_numpy()[valid]
+
+        # One flat key per (version, bucket) pair, then one bincount for all bins
+        codes, labels = pd.factorize(versions)
+        first = int(buckets.min())
+        span = int(buckets.max()) - first + 1
+        keys, key_index = np.unique(codes * span + (buckets - first), return_inverse=True)
+        counts = np.bincount(
+            key_index.reshape(-1) * self.n_bins + bins, minlength=len(keys) * self.n_bins
+        ).reshape(len(keys), self.n_bins)
+
+        with self._lock:
+            for key, row in zip(keys, counts):
+                code, offset = divmod(int(key), span)
+                self._add((labels[code], first + offset), row)
+            self._head = max(int(buckets.max()), self._head if self._head is not None else 0)
+            self._evict()
+
+    def merge(self, other: "ScoreHistogram") -> "ScoreHistogram":
+        """Add another histogram's counts into this one (same bins and resolution)"""
+        if other.n_bins != self.n_bins or other._resolution_ns != self._resolution_ns:
+            raise ValueError("Cannot merge score histograms with different bins or resolution")
+        with other._lock:
+            rows = [(key, row.copy()) for key, row in other._counts.items()]
+            head = other._head
+        with self._lock:
+            for key, row in rows:
+                self._add(key, row)
+            if head is not None:
+                self._head = max(head, self._head if self._head is not None else head)
+            self._evict()
+        return self
+
+    @property
+    def model_versions(self) -> List[str]:
+        with self._lock:
+            return sorted({version for version, _ in self._counts})
+
+    def counts(
+        self, model_version: Optional[str] = None, window: Window = (None, None)
+    ) -> np.ndarray:
+        """Summed bin counts over ``window`` (start inclusive, end exclusive)"""
+        total = np.zeros(self.n_bins, dtype=np.int64)
+        start, end = self._bucket_range(window)
+        with self._lock:
+            for (version, bucket), row in self._counts.items():
+                if model_version is not None and version != model_version:
+                    continue
+                if start <= bucket < end:
+                    total += row
+        return total
+
+    def matrix(self, model_version: Optional[str] = None) -> Tuple[pd.DatetimeIndex, np.ndarray]:
+        """Bucket start times and a dense (buckets x bins) count matrix"""
+        with self._lock:
+            buckets = sorted(
+                {b for v, b in self._counts if model_version is None or v == model_version}
+            )
+            if not buckets:
+                return pd.DatetimeIndex([], tz="UTC"), np.zeros((0, self.n_bins), dtype=np.int64)
+            first = buckets[0]
+            dense = np.zeros((buckets[-1] - first + 1, self.n_bins), dtype=np.int64)
+            for (version, bucket), row in self._counts.items():
+                if model_version is None or version == model_version:
+                    dense[bucket - first] += row
+        index = pd.to_datetime(
+            (np.arange(first, buckets[-1] + 1) * self._resolution_ns), utc=True
+        )
+        return pd.DatetimeIndex(index), dense
+
+    def _add(self, key: Tuple[str, int], row: np.ndarray) -> None:
+        if key in self._counts:
+            self._counts[key] += row
+        else:
+            self._counts[key] = row.astype(np.int64, copy=True)
+
+    def _evict(self) -> None:
+        if self._retention is None or self._head is None:
+            return
+        oldest = self._head - self._retention + 1
+        for key in [key for key in self._counts if key[1] < oldest]:
+            del self._counts[key]
+
+    def _bucket_range(self, window: Window) -> Tuple[float, float]:
+        start, end = window
+        return (
+            -np.inf if start is None else self._bucket_of(start),
+            np.inf if end is None else self._bucket_of(end),
+        )
+
+    def _bucket_of(self, timestamp: Timestamp) -> int:
+        timestamp = pd.Timestamp(timestamp)
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.tz_localize("UTC")
+        return int(-(-timestamp.value // self._resolution_ns))
+
+
+def psi(expected: np.ndarray, actual: np.ndarray) -> np.ndarray:
+    """Population stability index between bin counts, along the last axis"""
+    p = _shares(expected) + PSI_EPS
+    q = _shares(actual) + PSI_EPS
+    return np.sum((q - p) * np.log(q / p), axis=-1)
+
+
+def ks_statistic(expected: np.ndarray, actual: np.ndarray) -> np.ndarray:
+    """Largest gap between the binned cumulative distributions"""
+    gaps = np.cumsum(_shares(expected), axis=-1) - np.cumsum(_shares(actual), axis=-1)
+    return np.max(np.abs(gaps), axis=-1)
+
+
+def js_distance(expected: np.ndarray, actual: np.ndarray) -> np.ndarray:
+    """Jensen-Shannon distance (base 2, so within [0, 1]) between bin counts"""
+    p = _shares(expected)
+    q = _shares(actual)
+    m = (p + q) / 2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        kl_p = np.where(p > 0, p * np.log2(p / m), 0.0).sum(axis=-1)
+        kl_q = np.where(q > 0, q * np.log2(q / m), 0.0).sum(axis=-1)
+    return np.sqrt(np.maximum((kl_p + kl_q) / 2, 0.0))
+
+
+def drift_report(
+    histogram: ScoreHistogram,
+    baseline: Window,
+    current: Window,
+    thresholds: DriftThresholds = DriftThresholds(),
+) -> pd.DataFrame:
+    """PSI/KS/JS of ``current`` against ``baseline`` for every model version.
+
+    A version without ``min_count`` baseline scores of its own (for example a
+    newly deployed model) is compared against the baseline of all versions.
+    """
+    with histogram._lock:
+        versions = histogram.model_versions
+        if not versions:
+            return pd.DataFrame(
+                columns=[
+                    "model_version",
+                    "n_baseline",
+                    "n_current",
+                    "psi",
+                    "ks",
+                    "js",
+                    "drift",
+                    "reasons",
+                    "own_baseline",
+                ]
+            )
+
+        pooled = histogram.counts(window=baseline)
+        expected = np.stack([histogram.counts(v, baseline) for v in versions])
+        actual = np.stack([histogram.counts(v, current) for v in versions])
+    own_baseline = expected.sum(axis=1) >= thresholds.min_count
+    expected[~own_baseline] = pooled
+
+    report = _judge(expected, actual, thresholds)
+    report.insert(0, "model_version", versions)
+    report["own_baseline"] = own_baseline
+    return report
+
+
+def drift_timeline(
+    histogram: ScoreHistogram,
+    baseline: Window,
+    window: timedelta = timedelta(days=1),
+    model_version: Optional[str] = None,
+    thresholds: DriftThresholds = DriftThresholds(),
+) -> pd.DataFrame:
+    """Distances of each trailing ``window`` (one row per bucket) against ``baseline``"""
+    with histogram._lock:
+        index, dense = histogram.matrix(model_version)
+        baseline_counts = histogram.counts(model_version, baseline)
+    if len(index) == 0:
+        return pd.DataFrame(
+            columns=["timestamp", "n_baseline", "n_current", "psi", "ks", "js", "drift", "reasons"]
+        )
+
+    n = max(1, int(np.ceil(pd.Timedelta(window).value / histogram._resolution_ns)))
+    cumulative = np.vstack(
+        [np.zeros((1, histogram.n_bins), dtype=np.int64), np.cumsum(dense, axis=0)]
+    )
+    trailing = cumulative[1:] - cumulative[np.maximum(np.arange(1, len(dense) + 1) - n, 0)]
+    expected = np.broadcast_to(baseline_counts, trailing.shape)
+
+    timeline = _judge(expected, trailing, thresholds)
+    timeline.insert(0, "timestamp", index + histogram.resolution)
+    return timeline
+
+
+def _judge(expected: np.ndarray, actual: np.ndarray, thresholds: DriftThresholds) -> pd.DataFrame:
+    n_expected = expected.sum(axis=-1)
+    n_actual = actual.sum(axis=-1)
+    distances = {
+        "psi": psi(expected, actual),
+        "ks": ks_statistic(expected, actual),
+        "js": js_distance(expected, actual),
+    }
+    judged = (n_expected >= thresholds.min_count) & (n_actual >= thresholds.min_count)
+    exceeded = {
+        name: judged & (values > getattr(thresholds, name)) for name, values in distances.items()
+    }
+    reasons = [
+        ", ".join(name for name in distances if exceeded[name][i]) for i in range(len(n_actual))
+    ]
+    return pd.DataFrame(
+        {
+            "n_baseline": n_expected,
+            "n_current": n_actual,
+            **distances,
+            "drift": np.logical_or.reduce(list(exceeded.values())),
+            "reasons": reasons,
+        }
+    )
+
+
+def _shares(counts: np.ndarray) -> np.ndarray:
+    counts = np.asarray(counts, dtype=float)
+    totals = counts.sum(axis=-1, keepdims=True)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(totals > 0, counts / totals, 0.0)
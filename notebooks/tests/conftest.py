@@ -0,0 +1,25 @@
+"""
+ABACO Test Configuration
+Puts the notebooks directory on ``sys.path`` so tests import modules the way
+the notebooks do (``from financial_utils import ...``)
+"""
+
+import math
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+
+def assert_nested_close(actual, expected, rel: float = 1e-9, path: str = "result") -> None:
+    """Compare nested metric dicts, floats to ``rel`` and NaN equal to NaN"""
+    if isinstance(expected, dict):
+        assert set(actual) == set(expected), f"{path}: keys differ"
+        for key in expected:
+            assert_nested_close(actual[key], expected[key], rel, f"{path}[{key!r}]")
+    elif isinstance(expected, float) and math.isnan(expected):
+        assert math.isnan(actual), f"{path}: {actual} is not NaN"
+    else:
+        assert actual == pytest.approx(expected, rel=rel, abs=1e-9), path
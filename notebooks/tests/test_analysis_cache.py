@@ -0,0 +1,75 @@
+"""
+ABACO Analysis Cache Tests
+Hits, invalidation on changed input and what is never cached
+"""
+
+import pandas as pd
+import pytest
+
+from analysis_cache import AnalysisCache, CachedAnalyzer, fingerprint
+from financial_utils import FinancialAnalyzer, FinancialDataGenerator
+
+
+@pytest.fixture
+def book() -> pd.DataFrame:
+    return FinancialDataGenerator(seed=3).generate_customer_data(2_000)
+
+
+@pytest.fixture
+def analyzer(tmp_path) -> CachedAnalyzer:
+    return CachedAnalyzer(AnalysisCache(tmp_path / "cache"))
+
+
+def test_hit_returns_a_fresh_copy(analyzer, book):
+    first = analyzer.analyze_all(book)
+    first["portfolio_metrics"]["total_assets"] = -1
+    second = analyzer.analyze_all(book)
+
+    assert second == FinancialAnalyzer.analyze_all(book)
+    assert analyzer.cache.stats()["memory_hits"] == 1
+
+
+@pytest.mark.parametrize(
+    "mutate",
+    [
+        lambda df: df.loc.__setitem__((0, "account_balance"), 1e9),
+        lambda df: df.iloc.__setitem__((3, df.columns.get_loc("risk_category")), "High"),
+        lambda df: df.__setitem__("credit_limit", df["credit_limit"] * 2),
+    ],
+)
+def test_in_place_changes_are_seen(analyzer, book, mutate):
+    analyzer.analyze_all(book)
+    mutate(book)
+
+    assert analyzer.analyze_all(book) == FinancialAnalyzer.analyze_all(book)
+    assert analyzer.cache.stats()["misses"] == 2
+
+
+def test_equal_frames_share_entries(analyzer, book):
+    analyzer.analyze_all(book)
+    analyzer.analyze_all(book.copy())
+    assert analyzer.cache.stats()["misses"] == 1
+
+
+def test_fingerprint_tells_string_boundaries_and_nulls_apart():
+    assert fingerprint(pd.DataFrame({"s": ["ab", "c"]})) != fingerprint(
+        pd.DataFrame({"s": ["a", "bc"]})
+    )
+    assert fingerprint(pd.DataFrame({"s": ["a", None]})) != fingerprint(
+        pd.DataFrame({"s": ["a", ""]})
+    )
+
+
+def test_error_results_are_not_cached(analyzer, book):
+    broken = book.drop(columns="lifetime_value").assign(lifetime_value="n/a")
+    assert analyzer.calculate_portfolio_metrics(broken) == {}
+    analyzer.calculate_portfolio_metrics(broken)
+
+    stats = analyzer.cache.stats()
+    assert stats["misses"] == 2 and stats["memory_entries"] == 0
+
+
+def test_version_salts_the_key(tmp_path, book):
+    old = AnalysisCache(tmp_path, version="a").key("analyze_all", book)
+    new = AnalysisCache(tmp_path, version="b").key("analyze_all", book)
+    assert old != new
@@ -0,0 +1,139 @@
+"""
+ABACO Batch Runner Tests
+Manifest validation, resume from the state file and streamed exports
+"""
+
+import json
+
+import pandas as pd
+import pytest
+
+from batch_runner import STATE_FILE, PortfolioJob, discover_jobs, run_batch
+from financial_utils import FinancialDataGenerator
+
+
+@pytest.fixture
+def client_file(tmp_path):
+    path = tmp_path / "client_a.csv"
+    FinancialDataGenerator(seed=21).generate_customer_data(400).to_csv(path, index=False)
+    return path
+
+
+@pytest.fixture
+def jobs(client_file):
+    return [
+        PortfolioJob(name="client_a", path=str(client_file)),
+        PortfolioJob(name="load_test", customers=700, seed=4),
+    ]
+
+
+def _batch(jobs, output_dir, **kwargs):
+    return run_batch(jobs, output_dir, max_workers=1, chunk_rows=250, **kwargs)
+
+
+def _state_lines(output_dir):
+    return (output_dir / STATE_FILE).read_text(encoding="utf-8").splitlines()
+
+
+def test_manifest_entries_become_jobs(tmp_path, client_file):
+    manifest = tmp_path / "nightly.jsonl"
+    manifest.write_text(
+        "# nightly books\n"
+        "client_a.csv\n"
+        "\n"
+        '{"name": "load_test", "customers": 700, "seed": 4}\n',
+        encoding="utf-8",
+    )
+
+    assert discover_jobs(manifest=manifest) == [
+        PortfolioJob(name="client_a", path=str(client_file)),
+        PortfolioJob(name="load_test", customers=700, seed=4),
+    ]
+
+
+@pytest.mark.parametrize(
+    "entry, message",
+    [
+        ('{"name": "x"}', "needs a 'path' or 'customers'"),
+        ('{"customers": 10}', "needs a 'name'"),
+        ('{"name": "x", "customers": -1}', "invalid 'customers'"),
+        ('{"name": "x", "customers": "10"}', "invalid 'customers'"),
+        ('{"name": "x", "customers": true}', "invalid 'customers'"),
+        ('{"name": "x", "customers": 10', "Invalid manifest entry"),
+    ],
+)
+def test_invalid_manifest_entries_name_their_line(tmp_path, entry, message):
+    manifest = tmp_path / "nightly.jsonl"
+    manifest.write_text(f'{{"name": "ok", "customers": 5}}\n{entry}\n', encoding="utf-8")
+
+    with pytest.raises(ValueError, match=message) as raised:
+        discover_jobs(manifest=manifest)
+    assert f"{manifest}:2" in str(raised.value)
+
+
+def test_duplicate_names_are_rejected(tmp_path):
+    manifest = tmp_path / "nightly.jsonl"
+    manifest.write_text(
+        '{"name": "x", "customers": 5}\n{"name": "x", "customers": 6}\n', encoding="utf-8"
+    )
+
+    with pytest.raises(ValueError, match="unique"):
+        discover_jobs(manifest=manifest)
+
+
+def test_rerun_skips_done_portfolios_and_reruns_changed_sources(tmp_path, jobs, client_file):
+    output_dir = tmp_path / "nightly"
+    first = _batch(jobs, output_dir)
+    assert first["run"]["portfolios_run"] == 2
+    assert first["totals"]["total_customers"] == 1_100
+
+    second = _batch(jobs, output_dir)
+    assert second["run"]["portfolios_run"] == 0
+    assert second["run"]["portfolios_skipped"] == 2
+    assert second["totals"] == first["totals"]
+
+    FinancialDataGenerator(seed=22).generate_customer_data(300).to_csv(client_file, index=False)
+    third = _batch(jobs, output_dir)
+    assert third["run"]["portfolios_run"] == 1
+    assert third["totals"]["total_customers"] == 1_000
+    assert len(_state_lines(output_dir)) == 3
+
+
+def test_no_resume_reruns_everything(tmp_path, jobs):
+    output_dir = tmp_path / "nightly"
+    _batch(jobs, output_dir)
+
+    assert _batch(jobs, output_dir, resume=False)["run"]["portfolios_run"] == 2
+
+
+def test_torn_state_line_reruns_only_that_portfolio(tmp_path, jobs):
+    output_dir = tmp_path / "nightly"
+    _batch(jobs, output_dir)
+
+    # A crash while appending the second record leaves half a line behind
+    state_path = output_dir / STATE_FILE
+    lines = _state_lines(output_dir)
+    torn = json.loads(lines[1])["name"]
+    state_path.write_text(lines[0] + "\n" + lines[1][: len(lines[1]) // 2], encoding="utf-8")
+
+    resumed = _batch(jobs, output_dir)
+    assert resumed["run"]["portfolios_run"] == 1
+    assert resumed["portfolios"] == 2
+    assert json.loads(_state_lines(output_dir)[-1])["name"] == torn
+
+    # The record written after the torn line must itself be readable
+    assert _batch(jobs, output_dir)["run"]["portfolios_run"] == 0
+
+
+def test_csv_export_streams_every_chunk(tmp_path):
+    job = PortfolioJob(name="load_test", customers=1_234, seed=9)
+    output_dir = tmp_path / "nightly"
+    _batch([job], output_dir, file_format="csv")
+
+    record = json.loads(_state_lines(output_dir)[0])
+    exported = pd.read_csv(record["data_path"])
+    expected = FinancialDataGenerator(seed=9).generate_customer_data(1_234, compact=True)
+
+    assert record["rows_loaded"] == 1_234
+    assert list(exported.columns) == list(expected.columns)
+    assert exported["customer_id"].tolist() == expected["customer_id"].tolist()
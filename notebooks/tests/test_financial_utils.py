@@ -0,0 +1,79 @@
+"""
+ABACO Financial Utils Tests
+Streamed, sharded and fused paths against the single-shot generator and analyzer
+"""
+
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from conftest import assert_nested_close
+from financial_utils import FinancialAnalyzer, FinancialDataGenerator
+
+SEED = 5
+AS_OF = datetime(2026, 1, 1, 9, 30)
+# Spans three generator blocks, the last one partial
+N_CUSTOMERS = 2 * FinancialDataGenerator.BLOCK_SIZE + 1_234
+
+
+@pytest.fixture(scope="module")
+def single_shot() -> pd.DataFrame:
+    return FinancialDataGenerator(SEED).generate_customer_data(N_CUSTOMERS, as_of=AS_OF)
+
+
+@pytest.mark.parametrize("chunk_size", [50_000, FinancialDataGenerator.BLOCK_SIZE, 200_000])
+def test_chunked_concat_matches_single_shot(single_shot, chunk_size):
+    chunks = list(
+        FinancialDataGenerator(SEED).iter_customer_data(N_CUSTOMERS, chunk_size, as_of=AS_OF)
+    )
+
+    assert all(len(chunk) <= chunk_size for chunk in chunks)
+    pd.testing.assert_frame_equal(pd.concat(chunks), single_shot)
+
+
+@pytest.mark.parametrize("n_shards, max_workers", [(1, 1), (3, 1), (2, 2)])
+def test_parallel_shards_match_single_shot(single_shot, n_shards, max_workers):
+    df = FinancialDataGenerator(SEED).generate_customer_data_parallel(
+        N_CUSTOMERS, n_shards=n_shards, max_workers=max_workers, as_of=AS_OF
+    )
+
+    pd.testing.assert_frame_equal(df, single_shot)
+
+
+def test_repeated_calls_draw_new_portfolios():
+    generator = FinancialDataGenerator(SEED)
+    first = generator.generate_customer_data(1_000, as_of=AS_OF)
+    second = generator.generate_customer_data(1_000, as_of=AS_OF)
+
+    assert not first["account_balance"].equals(second["account_balance"])
+    pd.testing.assert_frame_equal(
+        first, FinancialDataGenerator(SEED).generate_customer_data(1_000, as_of=AS_OF)
+    )
+
+    # The n-th call matches across modes, whatever the earlier calls were
+    replay = FinancialDataGenerator(SEED)
+    replay.generate_customer_data_parallel(10, max_workers=1, as_of=AS_OF)
+    streamed = pd.concat(list(replay.iter_customer_data(1_000, 300, as_of=AS_OF)))
+    pd.testing.assert_frame_equal(streamed, second)
+
+
+def test_analyze_all_matches_separate_methods(single_shot):
+    result = FinancialAnalyzer.analyze_all(single_shot)
+
+    assert_nested_close(
+        result["portfolio_metrics"], FinancialAnalyzer.calculate_portfolio_metrics(single_shot)
+    )
+    assert_nested_close(result["risk_analysis"], FinancialAnalyzer.risk_analysis(single_shot))
+    assert_nested_close(
+        result["profitability_analysis"], FinancialAnalyzer.profitability_analysis(single_shot)
+    )
+
+
+def test_analyzed_chunks_match_single_shot(single_shot):
+    chunks = FinancialDataGenerator(SEED).iter_customer_data(N_CUSTOMERS, 40_000, as_of=AS_OF)
+
+    streamed = FinancialAnalyzer.analyze_chunks(chunks)
+    expected = FinancialAnalyzer.analyze_chunks([single_shot])
+
+    assert_nested_close(streamed, expected)
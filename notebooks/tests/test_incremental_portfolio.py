@@ -0,0 +1,128 @@
+"""
+ABACO Incremental Portfolio Tests
+Metrics and book after insert, update and delete batches against a full recompute
+"""
+
+import pandas as pd
+import pytest
+
+from conftest import assert_nested_close
+from financial_utils import FinancialDataGenerator, IncrementalPortfolio
+from portfolio_aggregates import PortfolioAggregate
+
+DERIVED_COLUMNS = [
+    "utilization_ratio",
+    "debt_to_income",
+    "risk_score",
+    "profit_potential",
+    "lifetime_value",
+]
+COMPARED_COLUMNS = ["account_balance", "monthly_spending", "risk_category"] + DERIVED_COLUMNS
+
+
+def _recomputed(book: pd.DataFrame) -> pd.DataFrame:
+    """The book with every derived column recomputed from its base columns"""
+    return FinancialDataGenerator()._calculate_financial_metrics(book.copy())
+
+
+def _assert_matches_full_recompute(portfolio: IncrementalPortfolio, expected: pd.DataFrame):
+    expected = _recomputed(expected)
+    book = portfolio.book.loc[expected.index]
+    assert len(portfolio) == len(expected)
+    pd.testing.assert_frame_equal(
+        book[COMPARED_COLUMNS], expected[COMPARED_COLUMNS], check_dtype=False
+    )
+    assert_nested_close(
+        portfolio.result(), PortfolioAggregate().update(expected).result(), rel=1e-6
+    )
+
+
+@pytest.fixture
+def book() -> pd.DataFrame:
+    return FinancialDataGenerator(seed=11).generate_customer_data(2_000)
+
+
+@pytest.fixture
+def new_customers() -> pd.DataFrame:
+    rows = FinancialDataGenerator(seed=12).generate_customer_data(300)
+    rows["customer_id"] = [f"NEW_{i:06d}" for i in range(len(rows))]
+    return rows.drop(columns=DERIVED_COLUMNS)
+
+
+@pytest.mark.parametrize("compaction_ratio", [0.01, 10.0])
+def test_batches_match_full_recompute(book, new_customers, compaction_ratio):
+    portfolio = IncrementalPortfolio(book, compaction_ratio=compaction_ratio)
+    expected = book.set_index("customer_id")
+
+    portfolio.insert(new_customers)
+    inserted = new_customers.set_index("customer_id")
+    expected = pd.concat([expected, inserted.assign(**{c: 0.0 for c in DERIVED_COLUMNS})])
+    _assert_matches_full_recompute(portfolio, expected)
+
+    # Update customers in the main book and among the inserted rows
+    ids = list(expected.index[:50:5]) + list(inserted.index[:20:4])
+    changes = pd.DataFrame(
+        {
+            "customer_id": ids,
+            "account_balance": expected.loc[ids, "account_balance"].to_numpy() * 1.5,
+            "monthly_spending": expected.loc[ids, "monthly_spending"].to_numpy() + 250.0,
+        }
+    )
+    portfolio.update(changes)
+    expected.loc[ids, "account_balance"] = changes["account_balance"].to_numpy()
+    expected.loc[ids, "monthly_spending"] = changes["monthly_spending"].to_numpy()
+    _assert_matches_full_recompute(portfolio, expected)
+
+    # Delete the customer with the highest risk score, so the max must be recomputed
+    riskiest = _recomputed(expected)["risk_score"].idxmax()
+    removed = [riskiest] + list(expected.index[100:140]) + list(inserted.index[-10:])
+    portfolio.delete(removed)
+    expected = expected.drop(removed)
+    _assert_matches_full_recompute(portfolio, expected)
+
+
+def test_update_leaves_unchanged_cells_alone(book):
+    portfolio = IncrementalPortfolio(book)
+    before = portfolio.book.copy()
+    target = before.index[7]
+
+    portfolio.update(pd.DataFrame({"customer_id": [target], "account_balance": [123_456.0]}))
+
+    after = portfolio.book
+    assert after.loc[target, "account_balance"] == 123_456.0
+    unchanged = after.drop(index=target).drop(columns="last_updated")
+    pd.testing.assert_frame_equal(unchanged, before.drop(index=target).drop(columns="last_updated"))
+
+
+def test_unknown_and_duplicate_ids_are_rejected(book, new_customers):
+    portfolio = IncrementalPortfolio(book)
+    with pytest.raises(KeyError):
+        portfolio.update(pd.DataFrame({"customer_id": ["MISSING"], "account_balance": [1.0]}))
+    with pytest.raises(ValueError):
+        portfolio.insert(book.iloc[:1].drop(columns=DERIVED_COLUMNS))
+    with pytest.raises(ValueError):
+        portfolio.insert(pd.concat([new_customers.iloc[:1]] * 2))
+
+
+@pytest.mark.parametrize("indexed", [False, True])
+def test_caller_frames_are_never_written(book, indexed):
+    source = book.set_index("customer_id") if indexed else book
+    before = source.copy()
+    portfolio = IncrementalPortfolio(source, compaction_ratio=0.0)
+    target = portfolio.book.index[3]
+
+    portfolio.update(pd.DataFrame({"customer_id": [target], "account_balance": [123_456.0]}))
+    portfolio.delete([portfolio.book.index[5]])
+
+    pd.testing.assert_frame_equal(source, before)
+
+
+def test_book_is_a_copy(book):
+    portfolio = IncrementalPortfolio(book)
+    target = portfolio.book.index[0]
+    balance = portfolio.book.loc[target, "account_balance"]
+
+    handed_out = portfolio.book
+    handed_out.loc[target, "account_balance"] = balance + 1
+
+    assert portfolio.book.loc[target, "account_balance"] == balance
@@ -0,0 +1,25 @@
+"""
+ABACO Instrumentation Tests
+Peak-RSS fallback units where ``/proc`` is unavailable
+"""
+
+from types import SimpleNamespace
+
+import pytest
+
+import instrumentation
+
+
+@pytest.mark.parametrize("platform, expected", [("darwin", 5_000), ("freebsd14", 5_120_000)])
+def test_rss_fallback_units(monkeypatch, platform, expected):
+    def no_proc(*args, **kwargs):
+        raise OSError("no /proc")
+
+    fake_resource = SimpleNamespace(
+        RUSAGE_SELF=0, getrusage=lambda who: SimpleNamespace(ru_maxrss=5_000)
+    )
+    monkeypatch.setattr(instrumentation, "open", no_proc, raising=False)
+    monkeypatch.setattr(instrumentation, "resource", fake_resource)
+    monkeypatch.setattr(instrumentation.sys, "platform", platform)
+
+    assert instrumentation._rss_bytes() == expected
@@ -0,0 +1,109 @@
+"""
+ABACO ML Data Access Tests
+Incremental mirror behaviour against ``InMemorySupabaseClient``
+"""
+
+from datetime import timedelta
+
+import pandas as pd
+import pytest
+
+from ml_data_access import PREDICTIONS, IncrementalTable, InMemorySupabaseClient, MLDataAccess
+
+NOW = pd.Timestamp.now(tz="UTC").floor("s")
+
+
+def _row(i, seconds_ago, score=0.5):
+    return {
+        "id": i,
+        "loan_id": f"L{i}",
+        "score": score,
+        "label": "approve",
+        "model_version": "v1",
+        "created_at": (NOW - pd.Timedelta(seconds=seconds_ago)).isoformat(),
+    }
+
+
+@pytest.fixture
+def client():
+    return InMemorySupabaseClient({"ml.predictions": [_row(i, 100 - i) for i in range(10)]})
+
+
+def test_refresh_fetches_only_from_watermark_minus_lookback(client):
+    table = IncrementalTable(client, PREDICTIONS, page_size=4, lookback=timedelta(seconds=5))
+    assert table.refresh() == 10
+    assert table.watermark == NOW - pd.Timedelta(seconds=91)
+
+    client.calls.clear()
+    client.insert("ml.predictions", [_row(10, 50)])
+    assert table.refresh() == 1
+
+    ((column, op, since),) = client.calls[0]["filters"]
+    assert (column, op) == ("created_at", ">=")
+    assert pd.Timestamp(since) == NOW - pd.Timedelta(seconds=96)
+    # Only the lookback overlap (ids 4-9) and the new row come back, not the history
+    assert sum(call["rows"] for call in client.calls) == 7
+
+
+def test_redelivered_rows_are_dropped_and_late_rows_kept(client):
+    table = IncrementalTable(client, PREDICTIONS, lookback=timedelta(seconds=5))
+    table.refresh()
+
+    # Committed late but stamped inside the lookback, plus re-deliveries
+    client.insert("ml.predictions", [_row(20, 93), _row(21, 40)])
+    assert table.refresh() == 2
+    assert table.refresh() == 0
+
+    frame = table.frame
+    assert len(frame) == 12
+    assert frame["id"].is_unique
+    stamps = list(zip(frame["created_at"], frame["id"]))
+    assert stamps == sorted(stamps, reverse=True)
+
+
+def test_listeners_get_cached_rows_then_each_new_page(client):
+    table = IncrementalTable(client, PREDICTIONS, page_size=4)
+    table.refresh()
+    pages = []
+    table.subscribe(pages.append)
+    assert [len(page) for page in pages] == [10]
+
+    client.insert("ml.predictions", [_row(i, 30 - i) for i in range(10, 15)])
+    table.refresh()
+    # Pages holding only re-fetched overlap rows are not passed on
+    assert all(len(page) for page in pages[1:])
+    assert sorted(pd.concat(pages[1:])["id"]) == list(range(10, 15))
+
+
+def test_retention_bounds_first_fetch_and_mirror():
+    client = InMemorySupabaseClient(
+        {"ml.predictions": [_row(i, 3600 * (48 - i)) for i in range(48)]}
+    )
+    table = IncrementalTable(client, PREDICTIONS, retention=timedelta(hours=12, minutes=30))
+    assert table.refresh() == 12
+    assert table.frame["created_at"].min() >= NOW - pd.Timedelta(hours=12)
+
+    capped = IncrementalTable(client, PREDICTIONS, max_rows=5)
+    capped.refresh()
+    assert list(capped.frame["id"]) == [47, 46, 45, 44, 43]
+
+
+def test_cache_round_trip_resumes_from_watermark(client, tmp_path):
+    path = tmp_path / "predictions.pkl"
+    IncrementalTable(client, PREDICTIONS, cache_path=path).refresh()
+
+    client.calls.clear()
+    restored = IncrementalTable(client, PREDICTIONS, cache_path=path)
+    assert len(restored.frame) == 10
+    assert restored.refresh() == 0
+    assert client.calls[0]["filters"]
+
+
+def test_load_windows_and_limits_are_private_copies(client):
+    access = MLDataAccess(client)
+    data = access.load(window_days=1, limits={"predictions": 3})
+    assert list(data["predictions"]["id"]) == [9, 8, 7]
+
+    data["predictions"].loc[:, "score"] = -1.0
+    again = access.load(window_days=1, limits={"predictions": 3})
+    assert (again["predictions"]["score"] >= 0).all()
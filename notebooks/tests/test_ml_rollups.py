@@ -0,0 +1,164 @@
+"""
+ABACO ML Rollup Tests
+Folding stays idempotent under re-delivered, late-committed and replayed rows
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ml_rollups import MLRollups, SQLiteRollupBackend
+
+START = pd.Timestamp("2025-11-01 09:00", tz="UTC")
+
+
+def _predictions(ids, seconds, label="approve", version="v1"):
+    rng = np.random.default_rng(len(ids))
+    return pd.DataFrame(
+        {
+            "id": [f"p{i}" for i in ids],
+            "created_at": [(START + pd.Timedelta(seconds=s)).isoformat() for s in seconds],
+            "model_version": version,
+            "label": label,
+            "score": rng.uniform(0, 1, len(ids)),
+        }
+    )
+
+
+def _feedback(ids, prediction_ids, seconds, correct=True):
+    return pd.DataFrame(
+        {
+            "id": [f"f{i}" for i in ids],
+            "prediction_id": [f"p{i}" for i in prediction_ids],
+            "created_at": [(START + pd.Timedelta(seconds=s)).isoformat() for s in seconds],
+            "correct": correct,
+        }
+    )
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return tmp_path / "rollups.db"
+
+
+def _open(db_path) -> MLRollups:
+    return MLRollups(SQLiteRollupBackend(db_path))
+
+
+def test_redelivered_predictions_fold_once(db_path):
+    rollups = _open(db_path)
+    batch = _predictions(range(10), range(10))
+
+    assert rollups.fold_predictions(batch) == 10
+    assert rollups.fold_predictions(batch) == 0
+    # Overlapping re-fetch plus duplicates inside one batch
+    assert rollups.fold_predictions(pd.concat([batch.iloc[5:], batch.iloc[5:]])) == 0
+    assert rollups.totals()["predictions"] == 10
+    assert rollups.score_histogram()["count"].sum() == 10
+
+
+def test_late_commit_inside_lookback_is_folded(db_path):
+    rollups = _open(db_path)
+    rollups.fold_predictions(_predictions([1, 2, 3], [0, 1, 10]))
+
+    # Committed after p3 but stamped earlier, re-fetched by the mirror's overlap
+    late = _predictions([1, 2, 3, 4], [0, 1, 10, 8])
+    assert rollups.fold_predictions(late) == 1
+    assert rollups.totals()["predictions"] == 4
+
+
+def test_restart_replay_does_not_double_count(db_path):
+    first = _open(db_path)
+    first.fold_predictions(_predictions(range(20), range(20)))
+    first.fold_feedback(_feedback(range(10), range(10), range(20, 30)))
+    first.backend.close()
+
+    restarted = _open(db_path)
+    restarted.fold_predictions(_predictions(range(25), range(25)))
+    restarted.fold_feedback(_feedback(range(15), range(15), range(20, 35)))
+
+    totals = restarted.totals()
+    assert totals["predictions"] == 25
+    assert totals["feedback"] == 15
+    assert totals["accuracy"] == 1.0
+
+
+def test_parked_feedback_survives_restart(db_path):
+    first = _open(db_path)
+    first.fold_predictions(_predictions([1], [0]))
+    # f2 arrives before its prediction, then f3 moves the stream past it
+    first.fold_feedback(_feedback([1, 2, 3], [1, 2, 1], [1, 2, 30]))
+    assert first.totals()["feedback"] == 2
+    first.backend.close()
+
+    # The watermark stopped short of f2, so the replay parks it again
+    restarted = _open(db_path)
+    restarted.fold_feedback(_feedback([1, 2, 3], [1, 2, 1], [1, 2, 30]))
+    assert restarted.totals()["feedback"] == 2
+    restarted.fold_predictions(_predictions([1, 2], [0, 3]))
+
+    totals = restarted.totals()
+    assert totals["predictions"] == 2
+    assert totals["feedback"] == 3
+
+
+def test_two_processes_share_one_database(db_path):
+    one, two = _open(db_path), _open(db_path)
+    batch = _predictions(range(40), range(40))
+    for start in range(0, 40, 10):
+        one.fold_predictions(batch.iloc[: start + 10])
+        two.fold_predictions(batch.iloc[max(start - 5, 0) : start + 10])
+
+    assert one.totals()["predictions"] == 40
+    assert two.totals()["predictions"] == 40
+
+
+def test_hour_and_day_rollups_agree(db_path):
+    rollups = _open(db_path)
+    seconds = np.arange(0, 3 * 3600, 90)
+    rollups.fold_predictions(_predictions(range(len(seconds)), seconds))
+    rollups.fold_predictions(_predictions(range(len(seconds)), seconds))
+
+    hourly = rollups.label_counts("hour")
+    daily = rollups.label_counts("day")
+    assert hourly["approve"] == daily["approve"] == len(seconds)
+
+
+def test_feedback_resolves_evicted_prediction_from_database(db_path):
+    first = _open(db_path)
+    first.fold_predictions(_predictions([1, 2], [0, 1], label="decline"))
+    first.backend.close()
+
+    # A new process that never saw p1 in memory, and evicts aggressively
+    restarted = MLRollups(SQLiteRollupBackend(db_path), max_tracked_predictions=1)
+    restarted.fold_predictions(_predictions([3], [2]))
+    restarted.fold_feedback(_feedback([1, 2], [1, 2], [86_400 * 40, 86_400 * 40 + 1]))
+
+    assert restarted.totals()["feedback"] == 2
+    feedback = restarted.backend.query("feedback_rollups", "day")
+    assert set(feedback["label"]) == {"decline"}
+    assert feedback["scored"].sum() == 2
+
+
+def test_orphaned_feedback_is_folded_unscored_and_releases_watermark(db_path):
+    rollups = _open(db_path)
+    rollups.fold_predictions(_predictions([1], [0]))
+    # f2's prediction is never mirrored
+    rollups.fold_feedback(_feedback([1, 2], [1, 99], [10, 20]))
+    assert rollups.totals()["feedback"] == 1
+
+    # Two hours of newer feedback later, f2 stops waiting
+    rollups.fold_feedback(_feedback([3], [1], [20 + 7_200]))
+    totals = rollups.totals()
+    assert totals["feedback"] == 3
+    assert rollups.orphaned_feedback == 1
+    assert rollups._pending_feedback.empty
+
+    feedback = rollups.backend.query("feedback_rollups", "day")
+    orphan = feedback[feedback["model_version"] == "—"]
+    assert orphan["feedback"].sum() == 1 and orphan["scored"].sum() == 0
+    assert rollups.backend.get_watermark("feedback") == START + pd.Timedelta(seconds=7_220)
+    # Folded ids behind the released watermark are pruned
+    cursor = rollups.backend.connection.cursor()
+    cursor.execute("SELECT row_id FROM rollup_folded WHERE source = 'feedback'")
+    assert [row[0] for row in cursor.fetchall()] == ["f3"]
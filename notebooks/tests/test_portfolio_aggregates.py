@@ -0,0 +1,98 @@
+"""
+ABACO Portfolio Aggregate Tests
+Merged and subtracted partial aggregates against one pass over the same rows
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import assert_nested_close
+from financial_utils import FinancialAnalyzer, FinancialDataGenerator
+from portfolio_aggregates import ColumnMoments, PortfolioAggregate, QuantileSketch
+
+
+@pytest.fixture(scope="module")
+def book() -> pd.DataFrame:
+    return FinancialDataGenerator(seed=7).generate_customer_data(5_000)
+
+
+def _chunks(df: pd.DataFrame, sizes):
+    start = 0
+    for size in sizes:
+        yield df.iloc[start : start + size]
+        start += size
+
+
+def test_merged_chunks_match_one_pass(book):
+    whole = PortfolioAggregate().update(book)
+    merged = PortfolioAggregate()
+    for chunk in _chunks(book, [1, 999, 2_500, 1_500]):
+        merged.merge(PortfolioAggregate().update(chunk))
+
+    assert_nested_close(merged.result(), whole.result())
+
+
+def test_subtract_undoes_merge(book):
+    kept, removed = book.iloc[:3_000], book.iloc[3_000:]
+    state = PortfolioAggregate().update(kept).merge(PortfolioAggregate().update(removed))
+    state.subtract(PortfolioAggregate().update(removed))
+    expected = PortfolioAggregate().update(kept).result()
+
+    # Min and max cannot be inverted; callers recompute them
+    result = state.result()
+    for stats in (result, expected):
+        del stats["risk_analysis"]["risk_score_stats"]["min"]
+        del stats["risk_analysis"]["risk_score_stats"]["max"]
+    assert_nested_close(result, expected, rel=1e-6)
+
+
+def test_subtract_everything_leaves_empty_state(book):
+    state = PortfolioAggregate().update(book)
+    state.subtract(PortfolioAggregate().update(book))
+
+    assert state.count == 0
+    assert state.category_counts == {column: {} for column in state.category_counts}
+    assert all(sketch.count == 0 for sketch in state.sketches.values())
+
+
+def test_exact_figures_match_analyzer(book):
+    result = PortfolioAggregate().update(book).result()
+    expected = FinancialAnalyzer.analyze_all(book)
+
+    portfolio, reference = result["portfolio_metrics"], expected["portfolio_metrics"]
+    for key in ("total_customers", "total_assets", "high_risk_customers", "average_utilization"):
+        assert portfolio[key] == pytest.approx(reference[key], rel=1e-9)
+    assert result["risk_analysis"]["high_risk_indicators"] == (
+        expected["risk_analysis"]["high_risk_indicators"]
+    )
+    assert result["risk_analysis"]["risk_score_stats"]["std"] == pytest.approx(
+        expected["risk_analysis"]["risk_score_stats"]["std"], rel=1e-9
+    )
+    # Medians come from the sketch, accurate to its relative accuracy
+    assert portfolio["median_balance"] == pytest.approx(reference["median_balance"], rel=0.01)
+
+
+def test_column_moments_merge_and_subtract():
+    values = np.random.default_rng(3).lognormal(8, 2, 10_001)
+    left, right = values[:4_000], values[4_000:]
+    merged = ColumnMoments().update(left).merge(ColumnMoments().update(right))
+
+    assert merged.count == len(values)
+    assert merged.mean == pytest.approx(values.mean(), rel=1e-12)
+    assert merged.std == pytest.approx(values.std(ddof=1), rel=1e-9)
+
+    merged.subtract(ColumnMoments().update(right))
+    assert merged.mean == pytest.approx(left.mean(), rel=1e-9)
+    assert merged.std == pytest.approx(left.std(ddof=1), rel=1e-9)
+
+
+def test_quantile_sketch_subtract_restores_quantiles():
+    rng = np.random.default_rng(5)
+    kept, removed = rng.lognormal(9, 1, 20_000), rng.lognormal(12, 1, 5_000)
+    sketch = QuantileSketch(0.01).update(kept).merge(QuantileSketch(0.01).update(removed))
+    sketch.subtract(QuantileSketch(0.01).update(removed))
+
+    assert sketch.count == len(kept)
+    for q in (0.1, 0.5, 0.9):
+        assert sketch.quantile(q) == pytest.approx(np.quantile(kept, q), rel=0.02)
@@ -0,0 +1,81 @@
+"""
+ABACO Score Drift Tests
+Report shapes and concurrent use of a shared ``ScoreHistogram``
+"""
+
+import threading
+
+import numpy as np
+import pandas as pd
+
+from score_drift import ScoreHistogram, drift_report
+
+NOW = pd.Timestamp("2026-01-01T12:00:00Z")
+
+
+def _predictions(n, version="v1", offset_hours=0, seed=0):
+    rng = np.random.default_rng(seed)
+    stamps = NOW - pd.to_timedelta(rng.integers(0, 48, n) + offset_hours, unit="h")
+    return pd.DataFrame(
+        {
+            "score": rng.random(n),
+            "model_version": version,
+            "created_at": stamps.strftime("%Y-%m-%dT%H:%M:%S+00:00"),
+        }
+    )
+
+
+def test_empty_report_has_the_same_columns():
+    windows = ((None, NOW - pd.Timedelta(hours=24)), (NOW - pd.Timedelta(hours=24), None))
+    histogram = ScoreHistogram()
+    empty = drift_report(histogram, *windows)
+    histogram.update(_predictions(1_000))
+    full = drift_report(histogram, *windows)
+
+    assert empty.empty
+    assert list(empty.columns) == list(full.columns)
+
+
+def test_concurrent_updates_and_reports():
+    histogram = ScoreHistogram(retention=None)
+    windows = ((None, NOW - pd.Timedelta(hours=24)), (NOW - pd.Timedelta(hours=24), None))
+    errors = []
+
+    def feed(worker):
+        try:
+            for batch in range(50):
+                # A new model version per batch keeps adding dictionary keys
+                histogram.update(_predictions(100, f"v{worker}-{batch}", batch, worker * batch))
+        except Exception as e:
+            errors.append(e)
+
+    def read():
+        try:
+            for _ in range(50):
+                drift_report(histogram, *windows)
+                histogram.matrix()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=feed, args=(w,)) for w in range(3)]
+    threads += [threading.Thread(target=read) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert histogram.counts().sum() == 3 * 50 * 100
+    assert len(histogram.model_versions) == 3 * 50
+
+
+def test_merge_adds_counts():
+    left, right = ScoreHistogram(), ScoreHistogram()
+    left.update(_predictions(300, "v1"))
+    right.update(_predictions(200, "v2", seed=1))
+
+    left.merge(right)
+
+    assert left.model_versions == ["v1", "v2"]
+    assert left.counts().sum() == 500
+    assert left.counts("v2").tolist() == right.counts("v2").tolist()
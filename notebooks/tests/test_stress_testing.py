@@ -0,0 +1,67 @@
+"""
+ABACO Stress Testing Tests
+Risk-category grouping and migrations against the book's own ``risk_category``
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from financial_utils import RISK_CATEGORIES, FinancialDataGenerator
+from stress_testing import StressScenario, run_stress_test
+
+SCENARIOS = [
+    StressScenario("baseline"),
+    StressScenario("recession", income_shock=-0.3, spending_shock=0.2, rate_shock=0.03),
+    StressScenario("boom", income_shock=0.3, spending_shock=-0.3),
+]
+
+
+@pytest.fixture(scope="module")
+def book() -> pd.DataFrame:
+    return FinancialDataGenerator(seed=17).generate_customer_data(3_000)
+
+
+def _category_counts(book: pd.DataFrame) -> np.ndarray:
+    return book["risk_category"].value_counts().reindex(RISK_CATEGORIES).to_numpy()
+
+
+def test_unshocked_book_is_grouped_by_risk_category(book):
+    result = run_stress_test(book, SCENARIOS, chunk_elements=1_000)
+    baseline = result.summary.iloc[0]
+
+    counts = [baseline[f"{category.lower()}_risk_customers"] for category in RISK_CATEGORIES]
+    assert counts == _category_counts(book).tolist()
+    assert baseline["high_risk_exposure"] == pytest.approx(
+        book.loc[book["risk_category"] == "High", "loan_amount"].sum()
+    )
+    assert baseline["downgraded_customers"] == baseline["upgraded_customers"] == 0
+
+
+def test_migrations_start_from_risk_category(book):
+    result = run_stress_test(book, SCENARIOS)
+
+    for scenario in result.scenario_names:
+        matrix = result.migration_matrix(scenario)
+        assert matrix.sum(axis=1).tolist() == _category_counts(book).tolist()
+
+    recession = result.summary.set_index("scenario").loc["recession"]
+    boom = result.summary.set_index("scenario").loc["boom"]
+    assert recession["downgraded_customers"] > 0 and recession["upgraded_customers"] == 0
+    assert boom["upgraded_customers"] > 0 and boom["downgraded_customers"] == 0
+
+
+def test_categorical_and_string_categories_agree(book):
+    compact = book.astype({"risk_category": pd.CategoricalDtype(RISK_CATEGORIES)})
+
+    expected = run_stress_test(book, SCENARIOS)
+    result = run_stress_test(compact, SCENARIOS)
+
+    np.testing.assert_array_equal(result.migrations, expected.migrations)
+
+
+def test_unknown_risk_category_is_rejected(book):
+    broken = book.head(10).assign(risk_category="Severe")
+
+    with pytest.raises(ValueError, match="risk_category"):
+        run_stress_test(broken, SCENARIOS)
@@ -0,0 +1,83 @@
+-- Hourly/daily rollups of ML predictions and feedback (see notebooks/ml_rollups.py)
+-- Every measure is additive; writers upsert with "measure = measure + excluded.measure".
+
+create table if not exists ml.rollup_state (
+  source text primary key,          -- 'predictions' | 'feedback'
+  watermark text not null           -- created_at of the newest folded row (ISO 8601)
+);
+
+-- Ids of rows folded within the lookback before the watermark, so rows the
+-- mirror re-delivers (late commits, replays, other dashboard processes) are
+-- folded exactly once. Pruned as the watermark advances.
+create table if not exists ml.rollup_folded (
+  source text not null,
+  row_id text not null,
+  created_at text not null,         -- fixed-width UTC ISO 8601
+  primary key (source, row_id)
+);
+
+-- model_version, label and score of recently folded predictions, so feedback
+-- arriving weeks later (or in another process) is attributed to its prediction.
+-- Rows older than the attribution retention are pruned by the folding process.
+create table if not exists ml.rollup_predictions (
+  prediction_id text primary key,
+  created_at text not null,         -- fixed-width UTC ISO 8601
+  model_version text not null,
+  label text not null,
+  score double precision not null
+);
+create index if not exists rollup_predictions_created_at on ml.rollup_predictions (created_at);
+
+create table if not exists ml.prediction_rollups (
+  granularity text not null,        -- 'hour' | 'day'
+  bucket_start timestamptz not null,
+  model_version text not null,
+  label text not null,
+  predictions bigint not null default 0,
+  score_sum double precision not null default 0,
+  bin_00 bigint not null default 0,
+  bin_01 bigint not null default 0,
+  bin_02 bigint not null default 0,
+  bin_03 bigint not null default 0,
+  bin_04 bigint not null default 0,
+  bin_05 bigint not null default 0,
+  bin_06 bigint not null default 0,
+  bin_07 bigint not null default 0,
+  bin_08 bigint not null default 0,
+  bin_09 bigint not null default 0,
+  bin_10 bigint not null default 0,
+  bin_11 bigint not null default 0,
+  bin_12 bigint not null default 0,
+  bin_13 bigint not null default 0,
+  bin_14 bigint not null default 0,
+  bin_15 bigint not null default 0,
+  bin_16 bigint not null default 0,
+  bin_17 bigint not null default 0,
+  bin_18 bigint not null default 0,
+  bin_19 bigint not null default 0,
+  primary key (granularity, bucket_start, model_version, label)
+);
+
+create table if not exists ml.feedback_rollups (
+  granularity text not null,
+  bucket_start timestamptz not null,
+  model_version text not null,
+  label text not null,              -- label of the prediction the feedback refers to
+  feedback bigint not null default 0,
+  correct bigint not null default 0,
+  scored bigint not null default 0,
+  brier_sum double precision not null default 0,
+  primary key (granularity, bucket_start, model_version, label)
+);
+
+-- RLS (service role writes; authenticated can read)
+alter table ml.rollup_state enable row level security;
+alter table ml.rollup_folded enable row level security;
+alter table ml.rollup_predictions enable row level security;
+alter table ml.prediction_rollups enable row level security;
+alter table ml.feedback_rollups enable row level security;
+
+do $$ begin
+  create policy "pred_rollup_read" on ml.prediction_rollups for select to authenticated using (true);
+  create policy "fb_rollup_read"   on ml.feedback_rollups   for select to authenticated using (true);
+exception when duplicate_object then null; end $$;